@@ -1,27 +1,29 @@
 # ----------------- Checker Agent -----------------
-from typing import TypedDict, List
+from typing import TypedDict, List, Tuple, Optional
+from langchain_core.runnables.config import ContextThreadPoolExecutor
+from functools import lru_cache
 from langgraph.graph import StateGraph, END
 from langchain_core.prompts import ChatPromptTemplate
-from langchain_groq import ChatGroq
-from langchain.agents import AgentExecutor, create_tool_calling_agent
 from langchain_core.tools import tool
-from dataclasses import dataclass
-import os, json
+from langchain_core.runnables import RunnableLambda
+from dataclasses import dataclass, field
+import os, re, json
 
-# Make sure GROQ_API_KEY is set
-GROQ_API_KEY = os.getenv("GROQ_API_KEY")
-if not GROQ_API_KEY:
-    raise ValueError("GROQ_API_KEY is not set in the environment.")
+from cache import content_key
+from precheck import precheck, is_decisive, combine_checks
+from llm_router import get_cached_llm, get_routed_llm
+from scratchpad import estimate_tokens
+from dedup import jaccard, query_words
 
-# Initialize ChatGroq LLM
-llm_model = "meta-llama/llama-4-scout-17b-16e-instruct"
-chat_groq_llm = ChatGroq(model_name=llm_model, groq_api_key=GROQ_API_KEY)
+# Returned when the checker response cannot be parsed as JSON
+FALLBACK_CHECK = {"overall_score": 0.5, "verdict": "questionable", "reasons": [{"type":"llm_failure","message":"Could not parse JSON","severity":"medium"}], "suggested_fixes": [], "evidence_snippets": [], "checks_performed":["basic_check"]}
 
 @tool
-def check_agent_output(agent_input: str, agent_output: str) -> str:
+def check_agent_output(agent_input: str, agent_output: str, context: str = "") -> str:
     """
     Evaluates whether the agent_output is realistic, reliable, and well-supported
-    based on the original agent_input.
+    based on the original agent_input. The optional context (the text just before
+    agent_output) is shown read-only and is not evaluated.
     Returns a JSON string containing:
       - overall_score
       - verdict (reliable/questionable/unreliable)
@@ -29,13 +31,18 @@ def check_agent_output(agent_input: str, agent_output: str) -> str:
       - suggested_fixes
       - evidence_snippets
     """
+    if context:
+        context = f"""
+PRECEDING TEXT (read-only context, checked separately: do NOT evaluate it, quote it or suggest fixes for it):
+'''{context}'''
+"""
     prompt = f"""
 You are a fact-checker and historical-methods reviewer.
 Evaluate the following agent output for reliability and realism.
 
 AGENT INPUT:
 '''{agent_input}'''
-
+{context}
 AGENT OUTPUT:
 '''{agent_output}'''
 
@@ -49,7 +56,7 @@ Return ONLY JSON with this schema:
   "checks_performed": [str]
 }}
 """
-    response = chat_groq_llm.invoke(prompt)
+    response = get_cached_llm("checker").invoke(prompt)
     # Ensure JSON output
     text = response.content
     try:
@@ -63,7 +70,68 @@ Return ONLY JSON with this schema:
     except:
         pass
     # fallback
-    return json.dumps({"overall_score": 0.5, "verdict": "questionable", "reasons": [{"type":"llm_failure","message":"Could not parse JSON","severity":"medium"}], "suggested_fixes": [], "evidence_snippets": [], "checks_performed":["basic_check"]})
+    return json.dumps(FALLBACK_CHECK)
+
+def check_agent_outputs_packed(pairs: List[Tuple[str, str]]) -> List[str]:
+    """
+    Checks several short (agent_input, agent_output) pairs with a single LLM call.
+
+    Returns one JSON string per pair, in the same order and with the same schema as check_agent_output.
+    Falls back to checking each pair on its own if the combined answer cannot be parsed.
+    """
+    items_text = "\n\n".join(
+        f"ITEM {i}\nAGENT INPUT:\n'''{agent_input}'''\nAGENT OUTPUT:\n'''{agent_output}'''"
+        for i, (agent_input, agent_output) in enumerate(pairs)
+    )
+    prompt = f"""
+You are a fact-checker and historical-methods reviewer.
+Evaluate each of the following {len(pairs)} agent outputs for reliability and realism, independently of each other.
+
+{items_text}
+
+Return ONLY a JSON array with exactly {len(pairs)} objects, one per ITEM and in ITEM order, each with this schema:
+{{
+  "overall_score": float,
+  "verdict": "reliable"|"questionable"|"unreliable",
+  "reasons": [{{"type": str, "message": str, "severity": "low|medium|high"}}],
+  "suggested_fixes": [str],
+  "evidence_snippets": [{{"text": str, "why": str}}],
+  "checks_performed": [str]
+}}
+"""
+    response = get_cached_llm("checker").invoke(prompt)
+    text = response.content
+    try:
+        start = text.find("[")
+        end = text.rfind("]")
+        if start != -1 and end != -1:
+            parsed = json.loads(text[start:end+1])
+            if isinstance(parsed, list) and len(parsed) == len(pairs) and all(isinstance(p, dict) for p in parsed):
+                return [json.dumps(p) for p in parsed]
+    except:
+        pass
+    return [check_agent_output.invoke({"agent_input": agent_input, "agent_output": agent_output})
+            for agent_input, agent_output in pairs]
+
+# Run the rule-based pre-check (precheck.py) before the LLM check; a decisive result skips the LLM call
+CHECK_PRECHECK = os.getenv("CHECK_PRECHECK", "1") != "0"
+
+def check_with_precheck(agent_input: str, agent_output: str, context: str = "") -> str:
+    """
+    check_agent_output preceded by the rule-based date and citation pre-check.
+
+    If the pre-check finds a high severity problem its result is returned without calling the LLM;
+    otherwise its findings are added to the LLM check result. The read-only context is only passed
+    to the LLM check; the pre-check looks at agent_output alone.
+    """
+    llm_input = {"agent_input": agent_input, "agent_output": agent_output, "context": context}
+    if not CHECK_PRECHECK:
+        return check_agent_output.invoke(llm_input)
+    local = precheck(agent_output)
+    if is_decisive(local):
+        print("--- PRE-CHECK IS DECISIVE, SKIPPING LLM CHECK ---")
+        return json.dumps(local)
+    return combine_checks(local, check_agent_output.invoke(llm_input))
 
 @tool
 def rewrite_agent_output(agent_output: str, suggested_fixes: List[str]) -> str:
@@ -84,7 +152,7 @@ SUGGESTED FIXES:
 
 Return ONLY the rewritten paragraph text.
 """
-    response = chat_groq_llm.invoke(prompt)
+    response = get_cached_llm("rewriter").invoke(prompt)
     return response.content.strip()
 
 checker_prompt = ChatPromptTemplate.from_messages([
@@ -95,41 +163,289 @@ checker_prompt = ChatPromptTemplate.from_messages([
 
 checker_tools = [check_agent_output, rewrite_agent_output]
 
-checker_agent_runnable = create_tool_calling_agent(
-    llm=chat_groq_llm,
-    tools=checker_tools,
-    prompt=checker_prompt
-)
+@lru_cache(maxsize=None)
+def get_checker_executor():
+    from langchain.agents import AgentExecutor, create_tool_calling_agent
+
+    checker_agent_runnable = create_tool_calling_agent(
+        llm=get_routed_llm("checker"),
+        tools=checker_tools,
+        prompt=checker_prompt
+    )
+    return AgentExecutor(agent=checker_agent_runnable, tools=checker_tools, verbose=True, return_intermediate_steps=True)
+
+# Maximum number of sections checked or rewritten at the same time in "sections" mode
+CHECK_MAX_CONCURRENCY = int(os.getenv("CHECK_MAX_CONCURRENCY", "4"))
+
+# Checker mode of the pipeline (see CheckerAgent). "chunks" checks outputs that fit in one chunk exactly like "full"
+CHECK_MODE = os.getenv("CHECK_MODE", "chunks")
+
+# Token bound of each chunk in "chunks" mode, and tokens of the preceding text repeated at its start for context
+CHECK_CHUNK_TOKENS = int(os.getenv("CHECK_CHUNK_TOKENS", "1200"))
+CHECK_CHUNK_OVERLAP_TOKENS = int(os.getenv("CHECK_CHUNK_OVERLAP_TOKENS", "150"))
+
+SEVERITY_ORDER = {"reliable": 0, "questionable": 1, "unreliable": 2}
+
+def split_sections(text: str) -> List[str]:
+    """
+    Splits a text into independently checkable sections.
+
+    Markdown headings start a new section (the heading stays with its body); text without
+    headings is split into paragraphs on blank lines. Joining the result with a blank line
+    ("\n\n") gives back the text.
+    """
+    paragraphs = [p.strip() for p in re.split(r"\n\s*\n", text.strip()) if p.strip()]
+    if not any(p.startswith("#") for p in paragraphs):
+        return paragraphs
+
+    sections: List[str] = []
+    for paragraph in paragraphs:
+        if paragraph.startswith("#") or not sections:
+            sections.append(paragraph)
+        else:
+            sections[-1] += "\n\n" + paragraph
+    return sections
+
+def split_chunks(text: str, max_tokens: int = CHECK_CHUNK_TOKENS,
+                 overlap_tokens: int = CHECK_CHUNK_OVERLAP_TOKENS) -> List[Tuple[str, str]]:
+    """
+    Splits a text into token-bounded chunks on sentence and paragraph boundaries.
+
+    Returns (context, body) pairs: the bodies do not overlap and joining them gives back the text;
+    the context is the end of the previous body (about overlap_tokens), so a claim cut at a chunk
+    boundary is still seen whole. A single sentence longer than max_tokens becomes a chunk of its own.
+    """
+    parts = re.split(r"((?<=[.!?])\s+|\n\s*\n)", text)
+    pieces = ["".join(parts[i:i + 2]) for i in range(0, len(parts), 2)]
+    bodies: List[List[str]] = [[]]
+    for piece in pieces:
+        if bodies[-1] and estimate_tokens("".join(bodies[-1]) + piece) > max_tokens - overlap_tokens:
+            bodies.append([])
+        bodies[-1].append(piece)
+
+    chunks = []
+    for index, body in enumerate(bodies):
+        context = []
+        for piece in reversed(bodies[index - 1] if index else []):
+            if estimate_tokens("".join(context) + piece) > overlap_tokens:
+                break
+            context.insert(0, piece)
+        chunks.append(("".join(context), "".join(body)))
+    return [chunk for chunk in chunks if chunk[1].strip()]
 
-checker_executor = AgentExecutor(agent=checker_agent_runnable, tools=checker_tools, verbose=True, return_intermediate_steps=True)
+# Quoted text in a suggested fix, e.g. Replace 'in 1720' with ...
+QUOTED = re.compile(r"['\"“‘]([^'\"“”‘’]{8,})['\"”’]")
+
+def confine_to_body(check_json: str, context: str, body: str) -> str:
+    """
+    Drops the findings of a chunk check that are about its read-only context instead of its body:
+    evidence found only in the context, fixes quoting text found only in the context, and every fix
+    if all the evidence was about the context. Only the body is rewritten with the fixes.
+    """
+    if not context.strip():
+        return check_json
+    try:
+        parsed = json.loads(check_json)
+    except:
+        return check_json
+    normalize = lambda text: " ".join(str(text).split()).lower()
+    context, body = normalize(context), normalize(body)
+
+    def context_only(text: str) -> bool:
+        text = normalize(text)
+        return bool(text) and text in context and text not in body
+
+    evidence = parsed.get("evidence_snippets", [])
+    kept = [e for e in evidence if not context_only(e.get("text", "") if isinstance(e, dict) else e)]
+    fixes = [fix for fix in parsed.get("suggested_fixes", [])
+             if not any(context_only(quote) for quote in QUOTED.findall(str(fix)))]
+    if evidence and not kept:
+        fixes = []
+    return json.dumps({**parsed, "evidence_snippets": kept, "suggested_fixes": fixes})
+
+def _is_duplicate(text: str, seen: List[set]) -> bool:
+    words = query_words(text)
+    if any(jaccard(words, other) >= 0.8 for other in seen):
+        return True
+    seen.append(words)
+    return False
+
+def merge_check_results(check_jsons: List[str], weights: Optional[List[float]] = None, deduplicate: bool = False) -> str:
+    """
+    Combines the check results of several sections into one result with the check_agent_output schema.
+
+    The overall_score is the weighted mean of the section scores (weights default to 1), the verdict is the
+    worst section verdict, and reasons, fixes and evidence are concatenated. A "segments" list keeps the
+    score and verdict of each section. With deduplicate, reasons, fixes and evidence that (nearly) repeat
+    an earlier one are left out, e.g. findings of the overlap of two chunks.
+    """
+    weights = weights or [1.0] * len(check_jsons)
+    merged = {"overall_score": 0.0, "verdict": "reliable", "reasons": [], "suggested_fixes": [],
+              "evidence_snippets": [], "checks_performed": [], "segments": []}
+    total_weight = 0.0
+    seen = {"reasons": [], "suggested_fixes": [], "evidence_snippets": []}
+    def keep(kind: str, text) -> bool:
+        return not deduplicate or not _is_duplicate(str(text), seen[kind])
+    for index, (check_json, weight) in enumerate(zip(check_jsons, weights)):
+        try:
+            parsed = json.loads(check_json)
+        except:
+            parsed = dict(FALLBACK_CHECK)
+        try:
+            score = float(parsed.get("overall_score", 0.5))
+        except (TypeError, ValueError):
+            score = 0.5
+        verdict = parsed.get("verdict", "questionable")
+        merged["overall_score"] += score * weight
+        total_weight += weight
+        if SEVERITY_ORDER.get(verdict, 1) > SEVERITY_ORDER[merged["verdict"]]:
+            merged["verdict"] = verdict if verdict in SEVERITY_ORDER else "questionable"
+        for reason in parsed.get("reasons", []):
+            if isinstance(reason, dict) and keep("reasons", f"{reason.get('type')} {reason.get('message')}"):
+                merged["reasons"].append({**reason, "segment": index})
+        merged["suggested_fixes"].extend(fix for fix in parsed.get("suggested_fixes", []) if keep("suggested_fixes", fix))
+        merged["evidence_snippets"].extend(snippet for snippet in parsed.get("evidence_snippets", [])
+                                           if keep("evidence_snippets", snippet.get("text") if isinstance(snippet, dict) else snippet))
+        for check in parsed.get("checks_performed", []):
+            if check not in merged["checks_performed"]:
+                merged["checks_performed"].append(check)
+        merged["segments"].append({"index": index, "overall_score": score, "verdict": verdict})
+    if total_weight:
+        merged["overall_score"] = round(merged["overall_score"] / total_weight, 3)
+    return json.dumps(merged)
+
+# Graph node of each checker mode
+CHECKER_NODES = {"full": "checker_node", "sections": "section_checker_node", "chunks": "chunk_checker_node"}
 
 class CheckerState(TypedDict):
     agent_input: str
     agent_output: str
     check_result: str
     rewritten_output: str
+    changed_segments: List[int]
 
 @dataclass
 class CheckResult():
     check_result: str
     rewritten_output: str
+    # Indices of the sections that were rewritten (only filled in "sections" mode)
+    changed_segments: List[int] = field(default_factory=list)
 
 class CheckerAgent:
-    def __init__(self):
-        self.chat_groq_llm = chat_groq_llm
+    def __init__(self, mode: str = "full", checkpointer=None):
+        """
+        Parameters:
+            mode: "full" checks and rewrites the whole output at once; "sections" checks each section
+                (see split_sections) independently and rewrites only the flagged sections; "chunks" checks
+                overlapping token-bounded chunks (see split_chunks) in parallel, rewrites only the flagged
+                chunks and merges the results, so long outputs never exceed the model context.
+            checkpointer: Optional LangGraph checkpointer (see checkpoint.get_checkpointer). With one,
+                a finished check is stored per thread and evaluate() returns it without calling the LLM again.
+        """
+        if mode not in CHECKER_NODES:
+            raise ValueError(f"Unknown checker mode: {mode}")
+        self.mode = mode
         self.tools = [check_agent_output, rewrite_agent_output]
         self.workflow = StateGraph(CheckerState)
-        self.workflow.add_node("checker", CheckerAgent.checker_node)
+        self.workflow.add_node("checker", getattr(CheckerAgent, CHECKER_NODES[mode]))
         self.workflow.set_entry_point("checker")
         self.workflow.add_edge("checker", END)
-        self.compiled_graph = self.workflow.compile()
+        self.checkpointer = checkpointer
+        self.compiled_graph = self.workflow.compile(checkpointer=checkpointer)
+
+    @property
+    def chat_groq_llm(self):
+        return get_routed_llm("checker")
 
     @staticmethod
     def checker_node(state: CheckerState, *args, **kwargs) -> dict:
         print("--- 💬 EXECUTING CHECKER NODE ---")
-        check_json = check_agent_output({"agent_input": state["agent_input"], "agent_output": state["agent_output"]})
+        check_json = check_with_precheck(state["agent_input"], state["agent_output"])
         state["check_result"] = check_json
+        state["rewritten_output"] = CheckerAgent.apply_fixes(state["agent_output"], check_json)
+
+        return {"check_result": state["check_result"], "rewritten_output": state["rewritten_output"]}
+
+    @staticmethod
+    def section_checker_node(state: CheckerState, *args, **kwargs) -> dict:
+        print("--- 💬 EXECUTING SECTION CHECKER NODE ---")
+        sections = split_sections(state["agent_output"])
+        if len(sections) <= 1:
+            return {**CheckerAgent.checker_node(state), "changed_segments": []}
+
+        batch_config = {"max_concurrency": CHECK_MAX_CONCURRENCY}
+        # Only the sections the pre-check cannot decide go to the LLM
+        local = [precheck(section) if CHECK_PRECHECK else None for section in sections]
+        pending = [index for index, result in enumerate(local) if result is None or not is_decisive(result)]
+        llm_jsons = check_agent_output.batch(
+            [{"agent_input": state["agent_input"], "agent_output": sections[index]} for index in pending], config=batch_config)
+        check_jsons = [json.dumps(result) if result is not None else None for result in local]
+        for index, check_json in zip(pending, llm_jsons):
+            check_jsons[index] = combine_checks(local[index], check_json) if local[index] is not None else check_json
 
+        # Rewrite only the sections that came back with fixes
+        flagged = []
+        for index, check_json in enumerate(check_jsons):
+            try:
+                fixes = json.loads(check_json).get("suggested_fixes", [])
+            except:
+                fixes = []
+            if fixes:
+                flagged.append((index, fixes))
+        rewrites = rewrite_agent_output.batch(
+            [{"agent_output": sections[index], "suggested_fixes": fixes} for index, fixes in flagged], config=batch_config)
+
+        rewritten_sections = list(sections)
+        for (index, _), rewritten in zip(flagged, rewrites):
+            rewritten_sections[index] = rewritten
+
+        return {
+            "check_result": merge_check_results(check_jsons, [len(section) for section in sections]),
+            "rewritten_output": "\n\n".join(rewritten_sections),
+            "changed_segments": [index for index, _ in flagged],
+        }
+
+    @staticmethod
+    def chunk_checker_node(state: CheckerState, *args, **kwargs) -> dict:
+        print("--- 💬 EXECUTING CHUNK CHECKER NODE ---")
+        chunks = split_chunks(state["agent_output"])
+        if len(chunks) <= 1:
+            return {**CheckerAgent.checker_node(state), "changed_segments": []}
+
+        # Map: each chunk is checked with the end of the previous chunk as context
+        batch_config = {"max_concurrency": CHECK_MAX_CONCURRENCY}
+        check_jsons = RunnableLambda(
+            lambda chunk: confine_to_body(check_with_precheck(state["agent_input"], chunk[1], context=chunk[0]), *chunk)
+        ).batch(chunks, config=batch_config)
+
+        # Only the body of a flagged chunk is rewritten, so the overlap is not rewritten twice
+        flagged = []
+        for index, check_json in enumerate(check_jsons):
+            try:
+                fixes = json.loads(check_json).get("suggested_fixes", [])
+            except:
+                fixes = []
+            if fixes:
+                flagged.append((index, fixes))
+        rewrites = rewrite_agent_output.batch(
+            [{"agent_output": chunks[index][1], "suggested_fixes": fixes} for index, fixes in flagged], config=batch_config)
+
+        bodies = [body for _, body in chunks]
+        for (index, _), rewritten in zip(flagged, rewrites):
+            # Keep the whitespace around the body so the chunks still join up
+            body = bodies[index]
+            bodies[index] = body[:len(body) - len(body.lstrip())] + rewritten + body[len(body.rstrip()):]
+
+        # Reduce: one result, weighted by chunk length, without the findings repeated by the overlaps
+        return {
+            "check_result": merge_check_results(check_jsons, [len(body) for _, body in chunks], deduplicate=True),
+            "rewritten_output": "".join(bodies),
+            "changed_segments": [index for index, _ in flagged],
+        }
+
+    @staticmethod
+    def apply_fixes(agent_output: str, check_json: str) -> str:
+        """Rewrites agent_output with the suggested fixes of a check result, or returns it unchanged if there are none."""
         # Parse suggested fixes
         try:
             parsed = json.loads(check_json)
@@ -139,22 +455,81 @@ class CheckerAgent:
 
         # Rewrite only if fixes exist
         if fixes:
-            rewritten = rewrite_agent_output({"agent_output": state["agent_output"], "suggested_fixes": fixes})
-            state["rewritten_output"] = rewritten
-        else:
-            state["rewritten_output"] = state["agent_output"]
-
-        return {"check_result": state["check_result"], "rewritten_output": state["rewritten_output"]}
+            return rewrite_agent_output.invoke({"agent_output": agent_output, "suggested_fixes": fixes})
+        return agent_output
     
-    def evaluate(self, agent_input: str, agent_output: str) -> CheckResult:
+    def evaluate(self, agent_input: str, agent_output: str, config: Optional[dict] = None,
+                 thread_id: Optional[str] = None) -> CheckResult:
+        """
+        Checks agent_output and rewrites it where fixes are suggested.
+
+        With a checkpointer, the check runs on thread_id (by default derived from the mode, input and
+        output), so checking the same output again returns the stored result.
+        """
+        if self.checkpointer is not None:
+            thread_id = thread_id or content_key(f"check:{self.mode}", f"{agent_input}\x00{agent_output}")
+            config = {**(config or {}), "configurable": {**(config or {}).get("configurable", {}), "thread_id": thread_id}}
+            stored = self.compiled_graph.get_state(config)
+            if stored.values.get("check_result") and not stored.next:
+                return CheckResult(
+                    check_result=stored.values["check_result"],
+                    rewritten_output=stored.values["rewritten_output"],
+                    changed_segments=stored.values.get("changed_segments", [])
+                )
         state = {
             "agent_input": agent_input,
             "agent_output": agent_output,
             "check_result": "",
-            "rewritten_output": ""
+            "rewritten_output": "",
+            "changed_segments": []
         }
-        final_state = self.compiled_graph.invoke(state)
+        final_state = self.compiled_graph.invoke(state, config=config)
         return CheckResult(
             check_result=final_state["check_result"],
-            rewritten_output=final_state["rewritten_output"]
+            rewritten_output=final_state["rewritten_output"],
+            changed_segments=final_state.get("changed_segments", [])
         )
+
+    def evaluate_many(self, pairs: List[Tuple[str, str]], max_concurrency: int = 4,
+                      pack_short: bool = False, pack_max_chars: int = 800, pack_size: int = 5) -> List[CheckResult]:
+        """
+        Checks (and rewrites where needed) many (agent_input, agent_output) pairs concurrently.
+
+        Parameters:
+            pairs: The (agent_input, agent_output) pairs to check.
+            max_concurrency: Maximum number of checks in flight. All calls also share the Groq rate limiter.
+            pack_short: If True, outputs of at most pack_max_chars characters are checked pack_size at a time
+                in a single check prompt, which cuts the number of round-trips.
+
+        Returns:
+            List[CheckResult]: One result per pair, in input order.
+        """
+        results: List[Optional[CheckResult]] = [None] * len(pairs)
+        single = list(range(len(pairs)))
+        groups: List[List[int]] = []
+        if pack_short:
+            short = [i for i in single if len(pairs[i][1]) <= pack_max_chars]
+            groups = [short[i:i + pack_size] for i in range(0, len(short), pack_size)]
+            single = [i for i in single if len(pairs[i][1]) > pack_max_chars]
+
+        def run_single(index: int) -> None:
+            results[index] = self.evaluate(*pairs[index])
+
+        def run_group(indices: List[int]) -> None:
+            local = {i: precheck(pairs[i][1]) for i in indices} if CHECK_PRECHECK else {}
+            check_jsons = {i: json.dumps(result) for i, result in local.items() if is_decisive(result)}
+            pending = [i for i in indices if i not in check_jsons]
+            if pending:
+                for index, check_json in zip(pending, check_agent_outputs_packed([pairs[i] for i in pending])):
+                    check_jsons[index] = combine_checks(local[index], check_json) if index in local else check_json
+            for index in indices:
+                results[index] = CheckResult(check_result=check_jsons[index],
+                                             rewritten_output=CheckerAgent.apply_fixes(pairs[index][1], check_jsons[index]))
+
+        # The workers run in copies of the caller's context, so per-run callbacks (usage, instrumentation) see their calls
+        with ContextThreadPoolExecutor(max_workers=max(1, max_concurrency)) as pool:
+            futures = [pool.submit(run_group, group) for group in groups]
+            futures += [pool.submit(run_single, index) for index in single]
+            for future in futures:
+                future.result()
+        return results
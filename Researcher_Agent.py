@@ -1,30 +1,37 @@
-from typing import TypedDict
+from typing import TypedDict, List, Optional
+from functools import lru_cache
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextvars import ContextVar, copy_context
 from langgraph.graph import START, StateGraph, END
 from langchain_core.prompts import ChatPromptTemplate
 from langchain_core.tools import tool,Tool
-from langchain_groq import ChatGroq
-from langchain_community.utilities import SerpAPIWrapper,WikipediaAPIWrapper
-from langchain.agents import AgentExecutor, create_tool_calling_agent
-from langchain_community.tools import WikipediaQueryRun
-
-from IPython.display import display, Image
+from langchain_core.runnables import RunnableLambda
+from pydantic import BaseModel, Field
+
+from cache import cached_tool, get_llm_cache
+from rate_limits import get_rate_limiter, rate_limited
+from llm_router import get_cached_llm, get_routed_llm
+from dpla_client import DPLAClient, DPLA_PAGES, format_items, search_concurrently
+from source_store import get_source_store, recall_is_good
+from dedup import collapse_passages, dedup_run, dedup_scope, deduplicated, search_tool
+from events import PlanReady, QuestionResearched, emit, stream_graph
+from checkpoint import get_checkpointer, new_thread_id, thread_config
+from scratchpad import ScratchpadTrimmer, scratchpad_run
 import os
+import json
+import asyncio
+import re
 import requests
 
-GROQ_API_KEY = os.getenv("GROQ_API_KEY")
-if not GROQ_API_KEY:
-    raise ValueError("GROQ_API_KEY is not set in the environment.")
-
-SERP_API_KEY = os.getenv("SERP_API_KEY")
-if not SERP_API_KEY:
-    raise ValueError("SERP_API_KEY is not set in the environment.")
+def get_api_key(name: str) -> str:
+    """Returns an API key from the environment, raising if it is not set."""
+    api_key = os.getenv(name)
+    if not api_key:
+        raise ValueError(f"{name} is not set in the environment.")
+    return api_key
 
-DPLA_API_KEY = os.getenv("DPLA_API_KEY")
-if not DPLA_API_KEY:
-    raise ValueError("DPLA_API_KEY is not set in the environment.")
-
-llm = "meta-llama/llama-4-scout-17b-16e-instruct"
-chat_groq_llm = ChatGroq(model_name=llm, groq_api_key=GROQ_API_KEY)
+# Clients, executors and the graph are built on first use so importing this module has no side effects.
+# Heavy client libraries (langchain_groq, langchain.agents, langchain_community) are imported inside the factories
 
 research_planning_message = """
 You are a Research Planning Agent. Your goal is to create a structured plan to get the necessary information for a given research topic provided by the user.
@@ -37,7 +44,7 @@ Responsibilities:
 
 Behavior:
 - Analyze the input prompt carefully to grasp the core research need.
-- If the query mentions "primary source documents" or "letters", ensure the plan includes a step instructing the use of the `dpla_search` tool.
+- If the query mentions "primary source documents" or "letters", ensure the plan includes a step instructing the use of the `dpla_search` tool (or `dpla_search_keywords` with the suggested keywords).
 - Present the plan in a clear, organized, and easy-to-follow format.
 - Be concise and focused on the planning aspect, not the research execution itself.
 
@@ -49,16 +56,16 @@ Outputs:
 """
 
 researcher_agent_message = """
-You are a highly skilled Archival Researcher Agent. Your mission is to write a COMPREHENSIVE and DETAILED report based on the provided research plan.
+You are a highly skilled Archival Researcher Agent. Your mission is to write a COMPREHENSIVE and DETAILED answer to ONE research question.
+Other researchers answer the other questions of the plan at the same time.
 
 You MUST follow this workflow exactly:
-1.  Analyze the research plan you are given. It contains multiple research questions.
-2.  Address EACH research question ONE BY ONE, in sequence.
-3.  For EACH individual question, you MUST use your search tools to gather detailed information. Find specific facts, dates, names, and context.
-4.  After researching a question, write a thorough, multi-paragraph answer for that specific question.
-5.  Once you have answered ALL of the questions in the plan, compile all your answers into a single, final report.
-6.  The final report MUST be well-structured, using a clear heading for each research question from the original plan.
-7.  DO NOT stop after answering only one question.
+1.  Read the research question you are given. The full research plan is included for context only.
+2.  Research ONLY that question. DO NOT research or answer the other questions of the plan.
+3.  Use your search tools to gather detailed information for the question: specific facts, dates, names, and context.
+    Use any background provided with the question instead of searching for it again.
+4.  Write a thorough, multi-paragraph answer under a heading with the question.
+5.  If you are given a whole plan without a single question to answer, treat the plan as one question and answer it in one report.
 """
 
 @tool
@@ -83,10 +90,21 @@ def extract_info(query: str):
     Format the output as a single string like this:
     Topic: [Extracted Topic] | Time Period: [Extracted Time Period] | Location: [Extracted Location] | Group of People involved: [Extracted Group of People]
     """
-    response = chat_groq_llm.invoke(prompt)
+    response = get_cached_llm("extract_info").invoke(prompt)
+    start_prefetch(parse_info(response.content))
     return response.content
 
 
+def parse_info(info_string: str) -> dict:
+    """Parses the "Topic: [...] | Time Period: [...] | ..." string of extract_info into a dict."""
+    info = {}
+    for part in info_string.split(" | "):
+        if ":" in part:
+            key, value = part.split(":", 1)
+            info[key.strip()] = value.strip()
+    return info
+
+
 @tool
 def generate_plan(info_string: str):
     """
@@ -99,11 +117,7 @@ def generate_plan(info_string: str):
         str: A structured research plan based on the extracted information.
     """
     # Parse the information from the formatted string
-    info = {}
-    for part in info_string.split(" | "):
-        if ":" in part:
-            key, value = part.split(":", 1)
-            info[key.strip()] = value.strip()
+    info = parse_info(info_string)
 
     # Get the extracted information, defaulting to "N/A" if parsing fails or key is missing
     topic = info.get("Topic", "N/A")
@@ -146,7 +160,7 @@ def generate_plan(info_string: str):
       keyword10
     """
 
-    response = chat_groq_llm.invoke(prompt)
+    response = get_cached_llm("generate_plan").invoke(prompt)
     return response.content
 
 # prompt template for input handling
@@ -158,22 +172,81 @@ planning_prompt = ChatPromptTemplate.from_messages([
 
 planning_tools = [extract_info, generate_plan]
 
-planning_agent_runnable = create_tool_calling_agent(
-    llm=chat_groq_llm,
-    tools=planning_tools,
-    prompt=planning_prompt
-)
-
-planning_agent_executor = AgentExecutor(agent=planning_agent_runnable, tools=planning_tools, verbose=True,return_intermediate_steps=True)
-
-search = SerpAPIWrapper(serpapi_api_key=SERP_API_KEY)
-google_search_tool = Tool(
-    name="google_search",
-    description="Use this for general web searches, finding articles, and recent information.",
-    func=search.run,
-)
+@lru_cache(maxsize=None)
+def get_planning_agent_executor():
+    from langchain.agents import AgentExecutor, create_tool_calling_agent
+
+    planning_agent_runnable = create_tool_calling_agent(
+        llm=get_routed_llm("planner"),
+        tools=planning_tools,
+        prompt=planning_prompt
+    )
+    return AgentExecutor(agent=planning_agent_runnable, tools=planning_tools, verbose=True,return_intermediate_steps=True)
+
+# "agent" runs the tool-calling planning agent (extract_info, then generate_plan);
+# "structured" builds a ResearchPlan with a single structured-output call instead
+PLANNING_MODE = os.getenv("PLANNING_MODE", "agent")
+
+class ResearchPlan(BaseModel):
+    """A structured research plan for a historical query."""
+    topic: str = Field(description="The main historical topic")
+    time_period: str = Field(description="The specific time period")
+    location: str = Field(description="The location")
+    groups: List[str] = Field(description="The groups of people involved")
+    research_questions: List[str] = Field(description="Five specific research questions")
+    keywords: List[str] = Field(description="Ten suggested keywords for searching the topic")
+
+    def to_text(self) -> str:
+        """Renders the plan in the same layout as generate_plan, so parse_research_questions and parse_suggested_keywords read it."""
+        lines = [f"Topic: {self.topic} | Time Period: {self.time_period} | Location: {self.location} | "
+                 f"Group of People involved: {', '.join(self.groups)}", "", "Research Questions:"]
+        lines += [f"  {i + 1}. {question}" for i, question in enumerate(self.research_questions)]
+        lines += ["", "Suggested Keywords:"]
+        lines += [f"  {keyword}" for keyword in self.keywords]
+        return "\n".join(lines)
+
+structured_plan_prompt = """
+From the following historical research query, extract the main historical topic, the specific time period, location, and groups of people involved.
+If a value is not present in the query, use the general value linked to the topic.
+Then plan the research with five specific research questions based on the topic, time period, location and groups involved,
+and ten suggested keywords for searching the historical topic.
+If the query mentions primary source documents or letters, include a question about primary sources.
+
+Query: {query}
+"""
 
-wikipedia_tool = WikipediaQueryRun(api_wrapper=WikipediaAPIWrapper())
+def structured_plan(query: str) -> ResearchPlan:
+    """Plans the research for a query with one structured-output LLM call. Plans are kept in the LLM cache."""
+    prompt = structured_plan_prompt.format(query=query)
+    model = get_routed_llm("generate_plan")
+    cache, namespace = get_llm_cache(), f"{model.model_name}:ResearchPlan"
+    cached = cache.get(namespace, prompt)
+    if cached is not None:
+        return ResearchPlan.model_validate_json(cached)
+    plan = model.with_structured_output(ResearchPlan).invoke(prompt)
+    cache.set(namespace, prompt, plan.model_dump_json())
+    return plan
+
+@lru_cache(maxsize=None)
+def get_dpla_client() -> DPLAClient:
+    return DPLAClient(get_api_key("DPLA_API_KEY"), rate_limiter=get_rate_limiter("dpla"))
+
+def fetch_dpla_items(query: str) -> str:
+    """Queries the DPLA items API and returns the items as JSON. Raises on request errors so they are not cached."""
+    items = get_dpla_client().search(query, pages=DPLA_PAGES)
+    store = get_source_store()
+    if store is not None:
+        for item in items:
+            record = format_items([item]) + f"\nDate: {item['date']}\nDescription: {item['description']}"
+            store.ingest("dpla_search", query, record, source=item["link"])
+    return json.dumps(items)
+
+cached_fetch_dpla_items = cached_tool("dpla_items", fetch_dpla_items)
+
+def dpla_items(query: str) -> List[dict]:
+    return json.loads(cached_fetch_dpla_items(query))
+
+deduplicated_dpla_search = deduplicated("dpla_search", lambda query: format_items(dpla_items(query)))
 
 @tool
 def dpla_search(query: str) -> str:
@@ -181,87 +254,388 @@ def dpla_search(query: str) -> str:
     Searches the Digital Public Library of America (DPLA) for primary source historical documents, images, and records.
     Use this to find original materials related to US history.
     """
-    api_key = DPLA_API_KEY
-    base_url = "https://api.dp.la/v2/items"
-    params = {'q': query, 'api_key': api_key, 'page_size': 5}
-
     try:
-        response = requests.get(base_url, params=params)
-        response.raise_for_status()
-        data = response.json()
-
-        if not data.get('docs'):
-            return "No primary sources found in the DPLA for that query."
-
-        results = []
-        for item in data['docs']:
-            title = item.get('sourceResource', {}).get('title', 'No Title')
-            provider = item.get('provider', {}).get('name', 'Unknown Provider')
-            link = item.get('isShownAt', 'No Link')
-            results.append(f"Title: {title}\nProvider: {provider}\nLink: {link}\n---")
-
-        return "\n".join(results)
-
+        return deduplicated_dpla_search(query)
     except requests.exceptions.RequestException as e:
         return f"Error accessing DPLA API: {e}"
     except Exception as e:
         return f"An unexpected error occurred: {e}"
 
+@tool
+def dpla_search_keywords(queries: List[str]) -> str:
+    """
+    Searches the Digital Public Library of America (DPLA) for several keyword queries at once, for example the
+    suggested keywords of the research plan, and returns the combined primary sources without duplicates.
+    Prefer this over calling dpla_search once per keyword.
+    """
+    try:
+        return collapse_passages("dpla_search", format_items(search_concurrently(queries, dpla_items)))
+    except Exception as e:
+        return f"An unexpected error occurred: {e}"
+
+def parse_suggested_keywords(research_plan: str) -> List[str]:
+    """Extracts the "Suggested Keywords" list from the plan produced by generate_plan."""
+    keywords = []
+    in_keywords = False
+    for raw_line in research_plan.splitlines():
+        line = raw_line.strip().strip("*").strip()
+        if not line:
+            continue
+        if "keywords" in line.lower() and line.endswith(":"):
+            in_keywords = True
+            continue
+        if in_keywords and line.endswith(":"):
+            break
+        if in_keywords:
+            keyword = re.sub(r"^(\d+[.)]|[-*\u2022])\s*", "", line).strip().strip('"')
+            if keyword:
+                keywords.append(keyword)
+    return keywords
+
+@lru_cache(maxsize=None)
+def get_researcher_tools() -> list:
+    from langchain_community.utilities import SerpAPIWrapper, WikipediaAPIWrapper
+    from langchain_community.tools import WikipediaQueryRun
+
+    search = SerpAPIWrapper(serpapi_api_key=get_api_key("SERP_API_KEY"))
+    google_search_tool = Tool(
+        name="google_search",
+        description="Use this for general web searches, finding articles, and recent information.",
+        func=search_tool("google_search", rate_limited("serpapi", search.run)),
+    )
+
+    # Keep the stock wikipedia tool's name and description, but route the lookups through the cache
+    wikipedia_query_run = WikipediaQueryRun(api_wrapper=WikipediaAPIWrapper())
+    wikipedia_tool = Tool(
+        name=wikipedia_query_run.name,
+        description=wikipedia_query_run.description,
+        func=search_tool("wikipedia", wikipedia_query_run.api_wrapper.run),
+    )
+    return [google_search_tool, wikipedia_tool, dpla_search, dpla_search_keywords]
+
+# Background retrieval (a Wikipedia summary and the top DPLA hits for the topic) started as soon as
+# extract_info returns, while generate_plan is still running. PLANNING_PREFETCH=0 turns it off
+PLANNING_PREFETCH = os.getenv("PLANNING_PREFETCH", "1") != "0"
+
+# Characters of each prefetched result handed to the researcher
+PREFETCH_MAX_CHARS = int(os.getenv("PREFETCH_MAX_CHARS", "2000"))
+
+# Prefetches started by the planning node running in the current context (see planning_node)
+_prefetches: ContextVar[Optional[List[Future]]] = ContextVar("planning_prefetches", default=None)
+
+@lru_cache(maxsize=None)
+def get_prefetch_executor() -> ThreadPoolExecutor:
+    return ThreadPoolExecutor(max_workers=4, thread_name_prefix="prefetch")
+
+def prefetch_lookups(info: dict) -> List[tuple]:
+    """The (label, tool name, query) lookups prefetched for the topic extracted by extract_info."""
+    topic, location = info["Topic"], info.get("Location", "")
+    dpla_query = f"{topic} {location}" if location and location != "N/A" else topic
+    return [("Wikipedia", "wikipedia", topic), ("DPLA", "dpla_search", dpla_query)]
+
+def prefetch(label: str, tool_name: str, query: str) -> str:
+    """Runs one lookup with the researcher's own tool, so the result is cached and fed to the source store."""
+    tools = {t.name: t for t in get_researcher_tools()}
+    if tool_name not in tools:
+        return ""
+    result = str(tools[tool_name].invoke(query)).strip()
+    return f"{label} ({query}):\n{result[:PREFETCH_MAX_CHARS]}" if result else ""
+
+def start_prefetch(info: dict) -> None:
+    """Starts the prefetch lookups for the extracted topic if a planning node is collecting prefetches."""
+    prefetches = _prefetches.get()
+    topic = info.get("Topic")
+    if not PLANNING_PREFETCH or prefetches is None or not topic or topic == "N/A":
+        return
+    print(f"--- PREFETCHING BACKGROUND: {topic} ---")
+    for lookup in prefetch_lookups(info):
+        prefetches.append(get_prefetch_executor().submit(copy_context().run, prefetch, *lookup))
+
+def collect_prefetches(prefetches: List[Future]) -> str:
+    """Waits for the prefetches of a planning run and joins their results."""
+    results = []
+    for future in prefetches:
+        try:
+            results.append(future.result())
+        except Exception as e:
+            print(f"--- PREFETCH FAILED: {e} ---")
+    return "\n\n".join(r for r in results if r)
+
 researcher_prompt = ChatPromptTemplate.from_messages([
     ("system", researcher_agent_message),
     ("human", "{input}"),
     ("placeholder", "{agent_scratchpad}"),
 ])
 
-researcher_tools = [google_search_tool, wikipedia_tool, dpla_search]
+# Token budget for the researcher's scratchpad (tool calls and results re-sent on every LLM step).
+# 0 keeps the whole scratchpad; above 0, older tool results are compacted to citations to fit the budget
+RESEARCH_SCRATCHPAD_TOKENS = int(os.getenv("RESEARCH_SCRATCHPAD_TOKENS", "0"))
+
+@lru_cache(maxsize=None)
+def get_scratchpad_trimmer() -> Optional[ScratchpadTrimmer]:
+    return ScratchpadTrimmer(RESEARCH_SCRATCHPAD_TOKENS) if RESEARCH_SCRATCHPAD_TOKENS > 0 else None
 
-researcher_agent_runnable = create_tool_calling_agent(
-    llm=chat_groq_llm,
-    tools=researcher_tools,
-    prompt=researcher_prompt
-)
+@lru_cache(maxsize=None)
+def get_researcher_executor():
+    from langchain.agents import AgentExecutor, create_tool_calling_agent
 
-researcher_executor = AgentExecutor(agent=researcher_agent_runnable, tools=researcher_tools, verbose=True)
+    researcher_tools = get_researcher_tools()
+    researcher_agent_runnable = create_tool_calling_agent(
+        llm=get_routed_llm("researcher"),
+        tools=researcher_tools,
+        prompt=researcher_prompt
+    )
+    return AgentExecutor(agent=researcher_agent_runnable, tools=researcher_tools, verbose=True,
+                         trim_intermediate_steps=get_scratchpad_trimmer() or -1)
+
+# Maximum number of research questions worked on at the same time
+RESEARCH_MAX_CONCURRENCY = int(os.getenv("RESEARCH_MAX_CONCURRENCY", "5"))
+
+# A list item: indentation, marker ("1.", "2)", "-", "*" or "•") and text
+LIST_ITEM = re.compile(r"^(\s*)(\d+[.)]|[-*\u2022])\s+(.*)$")
+
+def strip_emphasis(text: str) -> str:
+    """Removes markdown bold and italic markers, e.g. "**Who signed it?**" -> "Who signed it?"."""
+    return re.sub(r"(\*\*|__)", "", text).strip().strip("*_").strip()
+
+def parse_research_questions(research_plan: str) -> List[str]:
+    """
+    Extracts the individual research questions from the plan produced by generate_plan.
+
+    Only top-level items count (the marker style and indentation of the first item); indented
+    sub-points such as "   - Focus on delegates from Virginia" stay with their question. Questions
+    may also be unmarked lines, as in the generate_plan template ("  question1").
+
+    Parameters:
+        str: The research plan text.
+
+    Returns:
+        List[str]: The research questions in their original order (empty if none were found).
+    """
+    questions = []
+    in_questions = False
+    top_level = None  # (indent, marker kind) of the first item; deeper or other items are sub-points
+    for raw_line in research_plan.splitlines():
+        line = raw_line.strip().strip("*#").strip()
+        if not line:
+            continue
+        header = line.rstrip(":").strip().lower()
+        if "research questions" in header and len(header) <= len("research questions") + 5:
+            in_questions = True
+            continue
+        if in_questions and (line.endswith(":") or "keywords" in header or "strateg" in header):
+            break
+        if not in_questions:
+            continue
+        item = LIST_ITEM.match(raw_line)
+        indent = len(raw_line.expandtabs(4)) - len(raw_line.expandtabs(4).lstrip())
+        if item:
+            kind = (indent, "numbered" if item.group(2)[0].isdigit() else "bullet")
+        else:
+            kind = (indent, "unmarked")
+        top_level = top_level or kind
+        if kind[1] != top_level[1] or kind[0] > top_level[0] or (not item and kind[0] != top_level[0]):
+            continue
+        question = strip_emphasis(item.group(3) if item else line)
+        if question:
+            questions.append(question)
+
+    # Fall back to anything that reads like a question if the plan did not use the expected format
+    if not questions:
+        for raw_line in research_plan.splitlines():
+            item = LIST_ITEM.match(raw_line)
+            line = strip_emphasis(item.group(3) if item else raw_line)
+            if line.endswith("?"):
+                questions.append(line)
+    return questions
+
+def research_question_input(research_plan: str, question: str, background: str = "") -> str:
+    """Builds the researcher input for a single question of the plan (with the prefetched background, if any)."""
+    if background:
+        background = (f"Background already retrieved for this topic (use it instead of searching for it again):\n"
+                      f"{background}\n\n")
+    return (
+        f"Full research plan (for context only):\n{research_plan}\n\n{background}"
+        f"Research and answer ONLY the following research question from the plan. "
+        f"Write a thorough, multi-paragraph answer without a heading (the question is added as the heading).\n"
+        f"Research question: {question}"
+    )
+
+def answer_from_local_sources(research_plan: str, question: str, passages: List[dict]) -> str:
+    """Answers a research question from passages of the local source store with a single LLM call."""
+    sources_text = "\n\n".join(
+        f"[{i + 1}] ({p['tool']}{', ' + p['source'] if p['source'] else ''})\n{p['text']}" for i, p in enumerate(passages))
+    prompt = f"""
+    You are a highly skilled Archival Researcher. Using ONLY the numbered sources below, write a thorough,
+    multi-paragraph answer to the research question. Cite the sources you use with their numbers, e.g. [2],
+    and state clearly when the sources do not support a detail.
+
+    Research plan (for context only):
+    {research_plan}
+
+    Research question: {question}
+
+    Sources:
+    {sources_text}
+    """
+    response = get_cached_llm("researcher").invoke(prompt)
+    return response.content
+
+def plan_scope(research_plan: str) -> str:
+    """The topic and location of a research plan ("Topic: [...] | ... | Location: [...]" line), or ""."""
+    for line in research_plan.splitlines():
+        if "Topic:" in line:
+            info = parse_info(line.strip().strip("*#").strip())
+            return " ".join(v.strip("[]*") for v in (info.get("Topic", ""), info.get("Location", "")) if v)
+    return ""
+
+def local_sources_for(question: str, scope: str = "") -> Optional[List[dict]]:
+    """
+    Returns the local passages for a question if the source store recalls it well enough, otherwise None.
+    The scope (the plan's topic and location) is part of the query, so a generic question is only answered
+    from passages about the same topic.
+    """
+    store = get_source_store()
+    if store is None:
+        return None
+    query = f"{question} {scope}".strip()
+    passages = store.search(query)
+    return passages if recall_is_good(query, passages) else None
+
+def research_question(research_plan: str, question: str, background: str = "") -> str:
+    """
+    Answers one research question. The local source store is queried first; the researcher agent (and the
+    network) is only used when local recall is poor.
+    """
+    passages = local_sources_for(question, plan_scope(research_plan))
+    if passages:
+        print(f"--- ANSWERING FROM LOCAL SOURCES: {question} ---")
+        return answer_from_local_sources(research_plan, question, passages)
+    # Each question's agent sees a result passage once (see dedup.RunDeduplicator)
+    with dedup_scope():
+        response = get_researcher_executor().invoke({"input": research_question_input(research_plan, question, background)})
+    return response["output"]
+
+async def aresearch_question(research_plan: str, question: str, background: str = "") -> str:
+    """Async version of research_question."""
+    passages = await asyncio.to_thread(local_sources_for, question, plan_scope(research_plan))
+    if passages:
+        print(f"--- ANSWERING FROM LOCAL SOURCES: {question} ---")
+        return await asyncio.to_thread(answer_from_local_sources, research_plan, question, passages)
+    with dedup_scope():
+        response = await get_researcher_executor().ainvoke({"input": research_question_input(research_plan, question, background)})
+    return response["output"]
+
+def format_research_section(question: str, answer: str) -> str:
+    """
+    Formats the answer to one research question as a report section with the question as heading.
+    A heading the answer starts with is dropped, so the section has one heading only.
+    """
+    answer = answer.strip()
+    if answer.startswith("#"):
+        answer = answer.split("\n", 1)[1].strip() if "\n" in answer else ""
+    return f"## {question}\n\n{answer}"
 
 class AgentState(TypedDict):
     query: str
     research_plan: str
+    research_questions: List[str]
+    background: str
     research_findings: str
 
 def planning_node(state: AgentState):
-    """Invokes the planning agent to create a research plan."""
+    """Creates the research plan, with the planning agent or (PLANNING_MODE=structured) a single structured call."""
     print("--- 💬 EXECUTING PLANNING NODE ---")
-    response = planning_agent_executor.invoke({"input": state["query"]})
+    # extract_info starts the background prefetch; it runs while the plan is still being generated
+    prefetches: List[Future] = []
+    token = _prefetches.set(prefetches)
+    try:
+        if PLANNING_MODE == "structured":
+            # There is no early topic here, so the prefetch starts on the query itself
+            start_prefetch({"Topic": state["query"]})
+            plan = structured_plan(state["query"])
+            # The plan is streamed before the prefetches are collected
+            emit(PlanReady(query=state["query"], research_plan=plan.to_text(), research_questions=plan.research_questions))
+            return {"research_plan": plan.to_text(), "research_questions": plan.research_questions,
+                    "background": collect_prefetches(prefetches)}
 
-    clean_plan = response['intermediate_steps'][-1][1]
+        response = get_planning_agent_executor().invoke({"input": state["query"]})
 
-    return {"research_plan": clean_plan}
+        clean_plan = response['intermediate_steps'][-1][1]
+
+        emit(PlanReady(query=state["query"], research_plan=clean_plan, research_questions=parse_research_questions(clean_plan)))
+        return {"research_plan": clean_plan, "background": collect_prefetches(prefetches)}
+    finally:
+        _prefetches.reset(token)
 
 def research_node(state: AgentState):
-    """Invokes the researcher agent to execute the research plan."""
+    """Invokes the researcher agent once per research question, running the questions in parallel."""
     print("--- EXECUTING RESEARCH NODE ---")
-    response = researcher_executor.invoke({"input": state["research_plan"]})
-    return {"research_findings": response["output"]}
+    questions = state.get("research_questions") or parse_research_questions(state["research_plan"])
+    if not questions:
+        # The plan could not be split, research it as a whole
+        response = get_researcher_executor().invoke({"input": state["research_plan"]})
+        return {"research_findings": response["output"]}
+
+    def answer(index: int) -> str:
+        text = research_question(state["research_plan"], questions[index], state.get("background", ""))
+        emit(QuestionResearched(index=index, question=questions[index], section=format_research_section(questions[index], text)))
+        return text
+
+    # batch() keeps the input order and researches at most RESEARCH_MAX_CONCURRENCY questions at once
+    with dedup_run() as run, scratchpad_run() as scratchpad:
+        answers = RunnableLambda(answer).batch(list(range(len(questions))), config={"max_concurrency": RESEARCH_MAX_CONCURRENCY})
+
+    sections = [format_research_section(question, text) for question, text in zip(questions, answers)]
+    if get_scratchpad_trimmer() is not None:
+        print(f"--- {scratchpad.report()} ---")
+    if run is not None:
+        print(f"--- {run.report()} ---")
+    return {"research_findings": "\n\n".join(sections)}
 
 # Build and Run the Graph
 
-workflow = StateGraph(AgentState)
-
-workflow.add_node("planner", planning_node)
-workflow.add_node("researcher", research_node)
+def build_workflow() -> StateGraph:
+    workflow = StateGraph(AgentState)
 
-workflow.set_entry_point("planner")
-workflow.add_edge("planner", "researcher")
-workflow.add_edge("researcher", END)
+    workflow.add_node("planner", planning_node)
+    workflow.add_node("researcher", research_node)
 
-app = workflow.compile()
+    workflow.set_entry_point("planner")
+    workflow.add_edge("planner", "researcher")
+    workflow.add_edge("researcher", END)
+    return workflow
 
-print("--- Agent Workflow Graph ---")
-display(Image(app.get_graph().draw_mermaid_png()))
-user_query = "Research the causes and consequences of the French Revolution."
-test_query = "Find primary source documents or letters related to the signing of the US Declaration of Independence."
-
-final_state = app.invoke({"query": test_query})
-
-print("\n\n--- FINAL GRAPH OUTPUT ---")
-print(final_state['research_findings'])
+@lru_cache(maxsize=None)
+def get_app(checkpointer=None):
+    """
+    The planner -> researcher graph. Pass a checkpointer (see checkpoint.py) to store its runs; it must
+    then be invoked with checkpoint.thread_config(thread_id).
+    """
+    return build_workflow().compile(checkpointer=checkpointer)
+
+if __name__ == "__main__":
+    from IPython.display import display, Image
+
+    app = get_app(get_checkpointer())
+    print("--- Agent Workflow Graph ---")
+    display(Image(app.get_graph().draw_mermaid_png()))
+    user_query = "Research the causes and consequences of the French Revolution."
+    test_query = "Find primary source documents or letters related to the signing of the US Declaration of Independence."
+
+    # Pass an earlier thread id as the first argument to resume that run instead of starting over
+    import sys
+    thread_id = sys.argv[1] if len(sys.argv) > 1 else new_thread_id()
+    config = thread_config(thread_id)
+    print(f"--- THREAD {thread_id} ---")
+    graph_input = None if app.get_state(config).next else {"query": test_query}
+    final_state = {}
+    # The plan and every researched question are shown as soon as they are ready
+    for event in stream_graph(app, graph_input, config, final_state):
+        if isinstance(event, PlanReady):
+            print(f"--- PLAN READY: {len(event.research_questions)} QUESTIONS ---")
+        elif isinstance(event, QuestionResearched):
+            print(f"--- RESEARCHED: {event.question} ---")
+
+    print("\n\n--- FINAL GRAPH OUTPUT ---")
+    print(final_state['research_findings'])
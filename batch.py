@@ -0,0 +1,178 @@
+'''Runs the pipeline for every query in a JSONL file
+
+    python batch.py queries.jsonl --output results.jsonl --workers 4
+
+Each input line is {"query": "...", "id": "..."} (id optional) or a bare JSON string. Every
+finished job is appended to the results file as soon as it is done, so an interrupted batch
+can be started again with the same arguments: jobs already in the results file are skipped
+and a job that failed half-way resumes from its checkpoint.
+'''
+
+import os
+import sys
+import json
+import time
+import asyncio
+import argparse
+from dataclasses import dataclass, asdict
+from typing import Dict, List, Optional
+
+import renderer
+from cache import content_key
+from main import Pipeline
+
+BATCH_WORKERS = int(os.getenv("BATCH_WORKERS", "4"))
+BATCH_MAX_RETRIES = int(os.getenv("BATCH_MAX_RETRIES", "2"))
+BATCH_RETRY_DELAY = float(os.getenv("BATCH_RETRY_DELAY", "30"))
+
+
+@dataclass
+class Job:
+    id: str
+    query: str
+
+
+@dataclass
+class JobResult:
+    id: str
+    query: str
+    status: str  # "ok" or "failed"
+    attempts: int
+    thread_id: str
+    seconds: float
+    pdf_path: Optional[str] = None
+    output_paths: Optional[dict] = None
+    input_tokens: int = 0
+    output_tokens: int = 0
+    error: Optional[str] = None
+    finished_at: str = ""
+
+
+def read_jobs(path: str) -> List[Job]:
+    """
+    Reads the jobs of a JSONL file. A job without an id gets one derived from its query; repeats of
+    the same query get "-2", "-3", ... so they do not share a checkpoint thread.
+    """
+    jobs = []
+    seen: Dict[str, int] = {}
+    with open(path) as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            record = json.loads(line)
+            if isinstance(record, str):
+                record = {"query": record}
+            query = record["query"]
+            job_id = record.get("id")
+            if not job_id:
+                job_id = content_key("job", query)[:16]
+                seen[job_id] = seen.get(job_id, 0) + 1
+                if seen[job_id] > 1:
+                    job_id = f"{job_id}-{seen[job_id]}"
+            jobs.append(Job(id=str(job_id), query=query))
+    return jobs
+
+
+def finished_job_ids(path: str) -> set:
+    """Ids of the jobs that already succeeded in an existing results file."""
+    if not os.path.exists(path):
+        return set()
+    with open(path) as f:
+        return {record["id"] for record in map(json.loads, filter(str.strip, f)) if record.get("status") == "ok"}
+
+
+class BatchRunner:
+    """
+    Runs many pipeline jobs on a bounded pool of workers.
+
+    All workers share one Pipeline, so every Groq, SerpAPI and DPLA call goes through the shared
+    token-bucket limiters in rate_limits.py; the worker count only bounds how many reports are in
+    progress at once. Failed jobs are retried with backoff on the same checkpoint thread, so a
+    retry starts from the last stage that finished.
+    """
+
+    def __init__(self, output_path: str, workers: int = BATCH_WORKERS, max_retries: int = BATCH_MAX_RETRIES,
+                 retry_delay: float = BATCH_RETRY_DELAY, pipeline: Optional[Pipeline] = None):
+        self.output_path = output_path
+        self.workers = workers
+        self.max_retries = max_retries
+        self.retry_delay = retry_delay
+        self.pipeline = pipeline or Pipeline()
+        self.done = self.failed = self.retries = 0
+
+    async def run_job(self, job: Job) -> JobResult:
+        thread_id = f"batch-{job.id}"
+        started = time.time()
+        error = None
+        for attempt in range(1, self.max_retries + 2):
+            try:
+                result = await self.pipeline.arun(job.query, thread_id=thread_id, report_filename=f"{job.id}.pdf")
+                tokens = {"input_tokens": sum(s.input_tokens for s in result.stages),
+                          "output_tokens": sum(s.output_tokens for s in result.stages)}
+                return JobResult(id=job.id, query=job.query, status="ok", attempts=attempt, thread_id=thread_id,
+                                 seconds=time.time() - started, pdf_path=result.pdf_path,
+                                 output_paths=result.output_paths, **tokens)
+            except Exception as e:
+                error = f"{type(e).__name__}: {e}"
+                if attempt <= self.max_retries:
+                    self.retries += 1
+                    print(f"--- JOB {job.id} FAILED ({error}), RETRY {attempt}/{self.max_retries} ---")
+                    await asyncio.sleep(self.retry_delay * 2 ** (attempt - 1))
+        return JobResult(id=job.id, query=job.query, status="failed", attempts=self.max_retries + 1,
+                         thread_id=thread_id, seconds=time.time() - started, error=error)
+
+    def progress(self, total: int, started: float) -> str:
+        elapsed = time.time() - started
+        per_hour = self.done / elapsed * 3600 if elapsed else 0.0
+        return (f"[{self.done + self.failed}/{total}] ok={self.done} failed={self.failed} "
+                f"retries={self.retries} {per_hour:.1f} reports/hour")
+
+    async def arun(self, jobs: List[Job]) -> dict:
+        skip = finished_job_ids(self.output_path)
+        pending = [job for job in jobs if job.id not in skip]
+        if skip:
+            print(f"--- SKIPPING {len(jobs) - len(pending)} JOBS ALREADY IN {self.output_path} ---")
+        slots = asyncio.Semaphore(max(1, self.workers))
+        write_lock = asyncio.Lock()
+        started = time.time()
+
+        async def worker(job: Job):
+            async with slots:
+                result = await self.run_job(job)
+            result.finished_at = time.strftime("%Y-%m-%dT%H:%M:%S")
+            async with write_lock:
+                if result.status == "ok":
+                    self.done += 1
+                else:
+                    self.failed += 1
+                with open(self.output_path, "a") as f:
+                    f.write(json.dumps(asdict(result)) + "\n")
+                print(f"--- {self.progress(len(pending), started)} ---", file=sys.stderr)
+
+        await asyncio.gather(*(worker(job) for job in pending))
+        elapsed = time.time() - started
+        return {"jobs": len(pending), "ok": self.done, "failed": self.failed, "retries": self.retries,
+                "skipped": len(jobs) - len(pending), "seconds": elapsed,
+                "reports_per_hour": self.done / elapsed * 3600 if elapsed else 0.0}
+
+    def run(self, jobs: List[Job]) -> dict:
+        return asyncio.run(self.arun(jobs))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("queries", help="JSONL file with one query per line")
+    parser.add_argument("--output", default="results.jsonl", help="JSONL file the job results are appended to")
+    parser.add_argument("--workers", type=int, default=BATCH_WORKERS, help="Reports in progress at once")
+    parser.add_argument("--max-retries", type=int, default=BATCH_MAX_RETRIES)
+    parser.add_argument("--retry-delay", type=float, default=BATCH_RETRY_DELAY, help="Seconds before the first retry")
+    parser.add_argument("--render-workers", type=int, default=renderer.RENDER_WORKERS or os.cpu_count(),
+                        help="Processes the reports are rendered in, so rendering scales across cores")
+    args = parser.parse_args()
+    renderer.RENDER_WORKERS = args.render_workers
+
+    runner = BatchRunner(args.output, workers=args.workers, max_retries=args.max_retries, retry_delay=args.retry_delay)
+    summary = runner.run(read_jobs(args.queries))
+    print("\n=== BATCH SUMMARY ===")
+    print(json.dumps(summary, indent=2))
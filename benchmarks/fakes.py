@@ -0,0 +1,175 @@
+'''Deterministic local stand-ins for ChatGroq and the search tools, used by the offline benchmarks.
+
+FakeChatModel answers every prompt the agents send (extract_info, generate_plan, the checker,
+the rewriter and the report formatter) from a script, after a configurable delay and with
+a configurable token count. Bound to tools (AgentExecutor), it calls each tool once in order
+and then gives its final answer, so the planning and research agents run their normal loops.
+'''
+
+import json
+import re
+import time
+from typing import Any, Iterator, List, Optional
+
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, HumanMessage, ToolMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+from langchain_core.tools import Tool, tool
+
+from dedup import search_tool
+
+
+def lorem(words: int, seed: int = 0) -> str:
+    vocabulary = ("the colonial assembly met in philadelphia during the summer of 1776 and delegates "
+                  "debated the resolution for independence while letters were exchanged").split()
+    return " ".join(vocabulary[(seed + i) % len(vocabulary)] for i in range(words))
+
+
+def scripted_plan(questions: int) -> str:
+    lines = ["Research Questions:"]
+    lines += [f"  {i + 1}. What is research question number {i + 1} about the topic?" for i in range(questions)]
+    lines += ["", "Suggested Keywords:"]
+    lines += [f"  keyword{i + 1}" for i in range(10)]
+    return "\n".join(lines)
+
+
+class FakeChatModel(BaseChatModel):
+    """Scripted chat model with a fixed latency and deterministic token counts."""
+
+    model_name: str = "fake-chat-model"
+    latency: float = 0.05
+    # Number of words in a research answer and in the formatted report, and number of plan questions
+    answer_words: int = 200
+    plan_questions: int = 5
+    paragraphs: int = 3
+    # Fraction of check results that come back with suggested fixes (deterministic by prompt hash)
+    fix_rate: float = 0.5
+    bound_tools: List[Any] = []
+    # Pydantic schema requested through with_structured_output
+    structured_schema: Optional[Any] = None
+    # Fraction of calls that fail like an overloaded provider (deterministic by prompt hash)
+    failure_rate: float = 0.0
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake-chat-model"
+
+    def bind_tools(self, tools, **kwargs):
+        tools = list(tools)
+        if kwargs.get("ls_structured_output_format") and isinstance(tools[0], type):
+            return self.model_copy(update={"structured_schema": tools[0]})
+        return self.model_copy(update={"bound_tools": tools})
+
+    def _structured(self) -> dict:
+        """Arguments for the requested schema: the scripted plan for a ResearchPlan."""
+        return {"topic": "Signing of the Declaration of Independence", "time_period": "1776",
+                "location": "Philadelphia", "groups": ["Continental Congress"],
+                "research_questions": [f"What is research question number {i + 1} about the topic?"
+                                       for i in range(self.plan_questions)],
+                "keywords": [f"keyword{i + 1}" for i in range(10)]}
+
+    def _script(self, prompt: str) -> str:
+        if "extract the main historical topic" in prompt:
+            return ("Topic: Signing of the Declaration of Independence | Time Period: 1776 | "
+                    "Location: Philadelphia | Group of People involved: Continental Congress")
+        if "Create a plan" in prompt:
+            return scripted_plan(self.plan_questions)
+        needs_fix = (sum(map(ord, prompt)) % 100) < self.fix_rate * 100
+        check = {"overall_score": 0.6 if needs_fix else 0.9,
+                 "verdict": "questionable" if needs_fix else "reliable",
+                 "reasons": [{"type": "date", "message": "Date is not supported by a source", "severity": "medium"}] if needs_fix else [],
+                 "suggested_fixes": ["State the uncertain date conservatively"] if needs_fix else [],
+                 "evidence_snippets": [],
+                 "checks_performed": ["fake_check"]}
+        if "JSON array" in prompt:
+            return json.dumps([check] * len(re.findall(r"^ITEM \d+", prompt, re.M)))
+        if "Return ONLY JSON" in prompt:
+            return json.dumps(check)
+        if "You are an editor" in prompt:
+            match = re.search(r"'''(.*?)'''", prompt, re.S)
+            return (match.group(1) if match else "") + " (dates stated conservatively)"
+        if "report formatter" in prompt:
+            return "\n\n".join(f"Section {i + 1}\n{lorem(self.answer_words // self.paragraphs, i)}"
+                               for i in range(self.paragraphs))
+        return "\n\n".join(lorem(self.answer_words // self.paragraphs, i) for i in range(self.paragraphs))
+
+    def _reply(self, messages) -> AIMessage:
+        time.sleep(self.latency)
+        prompt = "\n".join(str(m.content) for m in messages)
+        if (sum(map(ord, prompt)) * 7919 % 100) < self.failure_rate * 100:
+            raise RuntimeError(f"{self.model_name} is overloaded")
+        if self.structured_schema is not None:
+            return AIMessage(content="", tool_calls=[{"name": self.structured_schema.__name__,
+                                                      "args": self._structured(), "id": "call_structured"}],
+                             usage_metadata={"input_tokens": len(prompt) // 4, "output_tokens": 120,
+                                             "total_tokens": len(prompt) // 4 + 120})
+        if self.bound_tools:
+            tool_messages = [m for m in messages if isinstance(m, ToolMessage)]
+            step = len(tool_messages)
+            if step < len(self.bound_tools):
+                next_tool = self.bound_tools[step]
+                arg_name = next(iter(next_tool.args), "tool_input")
+                if tool_messages:
+                    arg = tool_messages[-1].content
+                else:
+                    arg = [m for m in messages if isinstance(m, HumanMessage)][-1].content
+                return AIMessage(content="", tool_calls=[{"name": next_tool.name, "args": {arg_name: arg},
+                                                          "id": f"call_{step}"}])
+        content = self._script(prompt)
+        input_tokens = len(prompt) // 4
+        output_tokens = len(content) // 4
+        return AIMessage(content=content,
+                         usage_metadata={"input_tokens": input_tokens, "output_tokens": output_tokens,
+                                         "total_tokens": input_tokens + output_tokens},
+                         response_metadata={"model_name": self.model_name})
+
+    def _generate(self, messages, stop: Optional[List[str]] = None, run_manager=None, **kwargs) -> ChatResult:
+        return ChatResult(generations=[ChatGeneration(message=self._reply(messages))])
+
+    def _stream(self, messages, stop: Optional[List[str]] = None, run_manager=None, **kwargs) -> Iterator[ChatGenerationChunk]:
+        message = self._reply(messages)
+        if message.tool_calls:
+            yield ChatGenerationChunk(message=AIMessageChunk(content="", tool_call_chunks=[
+                {"name": call["name"], "args": json.dumps(call["args"]), "id": call["id"], "index": i}
+                for i, call in enumerate(message.tool_calls)]))
+            return
+        pieces = re.findall(r"\S+\s*|\s+", message.content) or [""]
+        for i, piece in enumerate(pieces):
+            chunk = AIMessageChunk(content=piece)
+            if i == len(pieces) - 1:
+                chunk = AIMessageChunk(content=piece, usage_metadata=message.usage_metadata,
+                                       response_metadata=message.response_metadata)
+            yield ChatGenerationChunk(message=chunk)
+
+
+def fake_search_tools(latency: float = 0.02, snippet_words: int = 120) -> list:
+    """
+    Returns google_search, wikipedia and dpla_search stand-ins with the same names as the real tools.
+    Like the real tools, they go through the tool cache, feed the source store and are deduplicated.
+    """
+
+    def google(query: str) -> str:
+        time.sleep(latency)
+        return f"[google] {lorem(snippet_words, len(query))}"
+
+    def wikipedia(query: str) -> str:
+        time.sleep(latency)
+        return f"Page: {query[:40]}\nSummary: {lorem(snippet_words, len(query) + 1)}"
+
+    def dpla(query: str) -> str:
+        time.sleep(latency)
+        return "\n".join(f"Title: Letter {i} about {query[:30]}\nProvider: Fake Archive\n"
+                         f"Link: https://dp.la/item/fake-{i}\n---" for i in range(5))
+
+    cached_dpla = search_tool("dpla_search", dpla)
+
+    @tool
+    def dpla_search(query: str) -> str:
+        """Searches the Digital Public Library of America (DPLA) for primary source historical documents."""
+        return cached_dpla(query)
+
+    return [
+        Tool(name="google_search", description="Use this for general web searches.", func=search_tool("google_search", google)),
+        Tool(name="wikipedia", description="Look up a topic on Wikipedia.", func=search_tool("wikipedia", wikipedia)),
+        dpla_search,
+    ]
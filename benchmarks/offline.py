@@ -0,0 +1,292 @@
+'''Offline benchmark suite: runs the agents against a scripted fake LLM and fake search tools.
+
+No network access or API keys are needed. Measures per-node latency, throughput under
+concurrency, peak memory of a full pipeline run and PDF build time across report sizes,
+and writes everything to JSON so results can be compared between commits.
+
+    python benchmarks/offline.py --output bench.json
+    python benchmarks/offline.py --output new.json --compare bench.json
+'''
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from contextlib import ExitStack, contextmanager
+from unittest import mock
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_DIR)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+for key in ("GROQ_API_KEY", "SERP_API_KEY", "DPLA_API_KEY"):
+    os.environ.setdefault(key, "offline-benchmark")
+
+import cache
+import checkpoint
+import llm_router
+import source_store
+import Checker_Agent
+import Researcher_Agent
+import report_agent
+from fakes import FakeChatModel, fake_search_tools, lorem, scripted_plan
+from scratchpad import scratchpad_run
+
+# Factories whose cached objects hold on to an LLM or tools and must be rebuilt around a swap
+CACHED_FACTORIES = [
+    llm_router.get_cached_llm, Researcher_Agent.get_planning_agent_executor,
+    Researcher_Agent.get_researcher_tools, Researcher_Agent.get_researcher_executor, Researcher_Agent.get_app,
+    Researcher_Agent.get_scratchpad_trimmer,
+    Checker_Agent.get_checker_executor,
+]
+
+
+@contextmanager
+def offline_agents(llm: FakeChatModel, tools: list):
+    """Swaps the fake LLM and tools into every agent module and points caches and PDFs at a temp directory."""
+    with tempfile.TemporaryDirectory() as workdir, ExitStack() as stack:
+        # The agents import get_routed_llm by name, so it is swapped where they look it up too
+        for module in (llm_router, Researcher_Agent, Checker_Agent):
+            stack.enter_context(mock.patch.object(module, "get_routed_llm", lambda call_site: llm))
+        stack.enter_context(mock.patch.object(Researcher_Agent, "get_researcher_tools", lambda: tools))
+        stack.enter_context(mock.patch.object(cache, "CACHE_DIR", os.path.join(workdir, "cache")))
+        stack.enter_context(mock.patch.object(cache, "_tool_cache", None))
+        stack.enter_context(mock.patch.object(cache, "_llm_cache", None))
+        stack.enter_context(mock.patch.object(source_store, "_store", None))
+        stack.enter_context(mock.patch.object(checkpoint, "_checkpointer", None))
+        stack.enter_context(mock.patch.object(report_agent, "REPORT_OUTPUT_DIR", workdir))
+        for factory in CACHED_FACTORIES:
+            factory.cache_clear()
+        try:
+            yield workdir
+        finally:
+            for factory in CACHED_FACTORIES:
+                factory.cache_clear()
+
+
+def timed(func, repeat: int) -> dict:
+    runs = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        runs.append(time.perf_counter() - started)
+    return {"median_s": statistics.median(runs), "min_s": min(runs), "max_s": max(runs), "repeat": repeat}
+
+
+def fresh_llm(args, **overrides) -> FakeChatModel:
+    settings = {"latency": args.llm_latency, "answer_words": args.answer_words, "plan_questions": args.questions}
+    settings.update(overrides)
+    return FakeChatModel(**settings)
+
+
+def bench_nodes(args) -> dict:
+    """Latency of each graph node, with a cold cache for every repeat."""
+    results = {}
+    query = "Find primary source documents or letters related to the signing of the US Declaration of Independence."
+
+    def run(name, func):
+        runs = []
+        for _ in range(args.repeat):
+            with offline_agents(fresh_llm(args), fake_search_tools(args.tool_latency)):
+                started = time.perf_counter()
+                func()
+                runs.append(time.perf_counter() - started)
+        results[name] = {"median_s": statistics.median(runs), "min_s": min(runs), "max_s": max(runs),
+                         "repeat": args.repeat}
+
+    plan = scripted_plan(args.questions)
+    findings = "\n\n".join(f"## Question {i}\n\n{lorem(args.answer_words, i)}" for i in range(args.questions))
+
+    run("planner", lambda: Researcher_Agent.planning_node({"query": query}))
+    with mock.patch.object(Researcher_Agent, "PLANNING_MODE", "structured"):
+        run("planner_structured", lambda: Researcher_Agent.planning_node({"query": query}))
+    run("researcher", lambda: Researcher_Agent.research_node({"query": query, "research_plan": plan}))
+
+    savings = {}
+    def research_bounded():
+        with scratchpad_run() as scratchpad:
+            Researcher_Agent.research_node({"query": query, "research_plan": plan})
+        savings.update(scratchpad.savings())
+    with mock.patch.object(Researcher_Agent, "RESEARCH_SCRATCHPAD_TOKENS", args.scratchpad_tokens):
+        run("researcher_bounded", research_bounded)
+    results["researcher_bounded"]["scratchpad"] = savings
+
+    run("checker_full", lambda: Checker_Agent.CheckerAgent().evaluate(query, findings))
+    run("checker_sections", lambda: Checker_Agent.CheckerAgent(mode="sections").evaluate(query, findings))
+    run("checker_chunks", lambda: Checker_Agent.CheckerAgent(mode="chunks").evaluate(query, findings))
+    run("report_local", lambda: report_agent.generator_node({"rewritten_output": findings, "formatter": "local"}))
+    run("report_streaming", lambda: report_agent.generator_node({"rewritten_output": findings, "formatter": "llm",
+                                                                 "streaming": True}))
+    run("report_buffered", lambda: report_agent.generator_node({"rewritten_output": findings, "formatter": "llm",
+                                                                "streaming": False}))
+    return results
+
+
+def bench_concurrency(args) -> dict:
+    """Checker throughput with evaluate_many and research throughput at different concurrency limits."""
+    results = {"checker_evaluate_many": {}, "research_node": {}}
+    pairs = [("Write a paragraph about the Declaration.", f"Paragraph {i}. {lorem(80, i)}") for i in range(args.batch)]
+    for concurrency in args.concurrency:
+        with offline_agents(fresh_llm(args), fake_search_tools(args.tool_latency)):
+            agent = Checker_Agent.CheckerAgent()
+            started = time.perf_counter()
+            agent.evaluate_many(pairs, max_concurrency=concurrency)
+            elapsed = time.perf_counter() - started
+        results["checker_evaluate_many"][str(concurrency)] = {"seconds": elapsed, "items_per_s": len(pairs) / elapsed}
+
+    plan = scripted_plan(args.questions)
+    for concurrency in args.concurrency:
+        with offline_agents(fresh_llm(args), fake_search_tools(args.tool_latency)), \
+                mock.patch.object(Researcher_Agent, "RESEARCH_MAX_CONCURRENCY", concurrency):
+            started = time.perf_counter()
+            Researcher_Agent.research_node({"query": "q", "research_plan": plan})
+            elapsed = time.perf_counter() - started
+        results["research_node"][str(concurrency)] = {"seconds": elapsed, "questions_per_s": args.questions / elapsed}
+    return results
+
+
+def bench_pipeline(args) -> dict:
+    """Wall time, stage report and peak Python memory of one full Pipeline run."""
+    import main
+
+    with offline_agents(fresh_llm(args), fake_search_tools(args.tool_latency)):
+        pipeline = main.Pipeline()
+        tracemalloc.start()
+        started = time.perf_counter()
+        result = pipeline.run("Find letters related to the signing of the US Declaration of Independence.")
+        elapsed = time.perf_counter() - started
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+    return {"seconds": elapsed, "peak_memory_mb": peak / 2**20,
+            "stages": [vars(stage) for stage in result.stages]}
+
+
+def bench_pdf(args) -> dict:
+    """PDF build time and peak memory for buffered and streaming rendering across report sizes."""
+    results = {}
+    with offline_agents(fresh_llm(args, latency=0.0), fake_search_tools(0.0)):
+        for size in args.pdf_sizes:
+            content = "\n".join(lorem(60, i) for i in range(size))
+            for name in ("buffered", "streaming"):
+                def build():
+                    if name == "buffered":
+                        report_agent.formatted_pdf(content, f"bench_{size}.pdf")
+                    else:
+                        writer = report_agent.StreamingPDFWriter(f"bench_{size}_stream.pdf")
+                        for line in content.split("\n"):
+                            writer.add_line(line)
+                        writer.close()
+                tracemalloc.start()
+                timing = timed(build, args.repeat)
+                _, peak = tracemalloc.get_traced_memory()
+                tracemalloc.stop()
+                results[f"{name}_{size}"] = {**timing, "paragraphs": size, "peak_memory_mb": peak / 2**20}
+    return results
+
+
+def bench_router(args) -> dict:
+    """
+    Per-call latency through the LLM router when the preferred model degrades: slow (10x latency,
+    p95 above the threshold) or failing half of its calls, against using that model alone.
+    """
+    threshold = args.llm_latency * 5
+    slow = FakeChatModel(model_name="fake-slow", latency=args.llm_latency * 10)
+    fast = FakeChatModel(model_name="fake-fast", latency=args.llm_latency)
+    flaky = FakeChatModel(model_name="fake-flaky", latency=args.llm_latency, failure_rate=0.5)
+    scenarios = {
+        "slow_alone": ([("fake-slow", slow)], False),
+        "slow_fallback": ([("fake-slow", slow), ("fake-fast", fast)], False),
+        "slow_hedged": ([("fake-slow", slow), ("fake-fast", fast)], True),
+        "flaky_fallback": ([("fake-flaky", flaky), ("fake-fast", fast)], False),
+    }
+    results = {}
+    for name, (models, hedge) in scenarios.items():
+        router = llm_router.RoutedChatModel(models, hedge=hedge)
+        with mock.patch.object(llm_router, "_stats", {}), \
+                mock.patch.object(llm_router, "LLM_ROUTER_P95_SECONDS", threshold):
+            latencies = []
+            for i in range(args.router_calls):
+                started = time.perf_counter()
+                router.invoke(f"Router call {i}: {lorem(20, i)}")
+                latencies.append(time.perf_counter() - started)
+            health = llm_router.model_health()
+        latencies.sort()
+        results[name] = {"median_s": statistics.median(latencies),
+                         "p95_s": latencies[min(len(latencies) - 1, int(0.95 * len(latencies)))],
+                         "total_s": sum(latencies), "calls": len(latencies),
+                         "model_calls": {model: stats["calls"] for model, stats in health.items()},
+                         "model_errors": {model: stats["errors"] for model, stats in health.items()}}
+    return results
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=REPO_DIR,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except Exception:
+        return "unknown"
+
+
+def flatten(results: dict, prefix: str = "") -> dict:
+    flat = {}
+    for key, value in results.items():
+        name = f"{prefix}.{key}" if prefix else key
+        if isinstance(value, dict):
+            flat.update(flatten(value, name))
+        elif isinstance(value, (int, float)) and name.endswith(("_s", "seconds", "_mb")):
+            flat[name] = value
+    return flat
+
+
+def compare(new: dict, old: dict) -> None:
+    new_flat, old_flat = flatten(new["results"]), flatten(old["results"])
+    print(f"\n=== {old['commit']} -> {new['commit']} ===")
+    for name in sorted(new_flat):
+        if name in old_flat and old_flat[name]:
+            change = (new_flat[name] - old_flat[name]) / old_flat[name] * 100
+            print(f"{name:60s} {old_flat[name]:10.4f} {new_flat[name]:10.4f} {change:+7.1f}%")
+
+
+SUITES = {"nodes": bench_nodes, "concurrency": bench_concurrency, "pipeline": bench_pipeline, "pdf": bench_pdf,
+          "router": bench_router}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--suites", nargs="+", choices=sorted(SUITES), default=list(SUITES))
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--llm-latency", type=float, default=0.05, help="Seconds per fake LLM call")
+    parser.add_argument("--tool-latency", type=float, default=0.02, help="Seconds per fake tool call")
+    parser.add_argument("--answer-words", type=int, default=200)
+    parser.add_argument("--questions", type=int, default=5)
+    parser.add_argument("--scratchpad-tokens", type=int, default=200, help="Scratchpad budget of researcher_bounded")
+    parser.add_argument("--batch", type=int, default=16, help="Pairs checked in the concurrency suite")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4, 8])
+    parser.add_argument("--router-calls", type=int, default=30, help="Calls per scenario of the router suite")
+    parser.add_argument("--pdf-sizes", type=int, nargs="+", default=[10, 100, 1000])
+    parser.add_argument("--output", help="Write the results as JSON to this file")
+    parser.add_argument("--compare", help="Previous results JSON to compare against")
+    args = parser.parse_args()
+
+    report = {"commit": git_commit(), "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+              "config": {k: v for k, v in vars(args).items() if k not in ("output", "compare")}, "results": {}}
+    for suite in args.suites:
+        print(f"--- running {suite} ---", file=sys.stderr)
+        report["results"][suite] = SUITES[suite](args)
+
+    print(json.dumps(report, indent=2))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+    if args.compare:
+        with open(args.compare) as f:
+            compare(report, json.load(f))
+
+
+if __name__ == "__main__":
+    main()
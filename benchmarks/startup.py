@@ -0,0 +1,70 @@
+'''Measures import time and time to first usable agent for each agent module.
+
+Each measurement runs in a fresh interpreter so module caches do not hide the cost.
+
+    python benchmarks/startup.py --repeat 5 --output startup.json
+'''
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# module -> statement that produces a usable agent (no network calls are made)
+TARGETS = {
+    "Checker_Agent": "Checker_Agent.CheckerAgent()",
+    "Researcher_Agent": "Researcher_Agent.get_app(); Researcher_Agent.get_planning_agent_executor(); Researcher_Agent.get_researcher_executor()",
+    "report_agent": "report_agent.report_workflow(); report_agent.get_cached_llm('formatter')",
+    "main": "main.Pipeline()",
+}
+
+MEASURE = '''
+import json, sys, time
+sys.path.insert(0, {repo!r})
+start = time.perf_counter()
+import {module}
+imported = time.perf_counter()
+{first_use}
+ready = time.perf_counter()
+print(json.dumps({{"import_s": imported - start, "first_agent_s": ready - start}}))
+'''
+
+
+def measure(module: str, first_use: str) -> dict:
+    env = dict(os.environ)
+    # Clients only need a key to be constructed; nothing is sent over the network
+    for key in ("GROQ_API_KEY", "SERP_API_KEY", "DPLA_API_KEY"):
+        env.setdefault(key, "benchmark")
+    code = MEASURE.format(repo=REPO_DIR, module=module, first_use=first_use)
+    out = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, env=env, check=True)
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--output", help="Write the results as JSON to this file")
+    args = parser.parse_args()
+
+    results = {}
+    for module, first_use in TARGETS.items():
+        runs = [measure(module, first_use) for _ in range(args.repeat)]
+        results[module] = {
+            "import_s": statistics.median(r["import_s"] for r in runs),
+            "first_agent_s": statistics.median(r["first_agent_s"] for r in runs),
+            "repeat": args.repeat,
+        }
+        print(f"{module:18s} import {results[module]['import_s']:.3f}s  "
+              f"first agent {results[module]['first_agent_s']:.3f}s")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
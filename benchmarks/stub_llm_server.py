@@ -0,0 +1,157 @@
+'''OpenAI-compatible stub LLM server, for testing the router's local endpoint without a GPU or API key
+
+    python benchmarks/stub_llm_server.py --port 8011 --latency 0.2 --error-rate 0.1
+    LOCAL_LLM_BASE_URL=http://127.0.0.1:8011/v1 LLM_SMALL_MODELS= LLM_LARGE_MODELS= python main.py
+
+Answers POST /v1/chat/completions (plain, streamed, tool calls and structured output) with the
+scripted responses of FakeChatModel, after --latency seconds (plus up to --jitter), and fails
+--error-rate of the requests with --error-status (429 by default) like an overloaded provider.
+'''
+
+import argparse
+import json
+import os
+import random
+import sys
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from langchain_core.messages import convert_to_messages
+
+from fakes import FakeChatModel
+
+
+def openai_messages(messages: list) -> list:
+    """Converts OpenAI chat messages to LangChain messages (tool call arguments arrive as JSON strings)."""
+    converted = []
+    for message in messages:
+        message = dict(message)
+        if message.get("content") is None:
+            message["content"] = ""
+        if isinstance(message["content"], list):
+            message["content"] = "".join(part.get("text", "") for part in message["content"] if isinstance(part, dict))
+        converted.append(message)
+    return convert_to_messages(converted)
+
+
+def completion(request: dict, fake: FakeChatModel) -> dict:
+    """Answers one chat completion request with FakeChatModel and returns the OpenAI response message and usage."""
+    tools = [tool["function"] for tool in request.get("tools") or [] if tool.get("type") == "function"]
+    forced = request.get("tool_choice")
+    forced = forced.get("function", {}).get("name") if isinstance(forced, dict) else None
+    response_format = request.get("response_format") or {}
+    messages = openai_messages(request.get("messages") or [])
+    prompt_tokens = sum(len(str(m.content)) for m in messages) // 4
+
+    if response_format.get("type") == "json_schema" or forced:
+        # Structured output: with json_schema as content, with function calling as a forced tool call
+        time.sleep(fake.latency)
+        arguments = json.dumps(fake._structured())
+        if forced:
+            message = {"role": "assistant", "content": None, "tool_calls": [
+                {"id": f"call_{uuid.uuid4().hex[:8]}", "type": "function", "function": {"name": forced, "arguments": arguments}}]}
+        else:
+            message = {"role": "assistant", "content": arguments}
+        return {"message": message, "prompt_tokens": prompt_tokens, "completion_tokens": len(arguments) // 4}
+
+    bound = [SimpleNamespace(name=t["name"], args=(t.get("parameters") or {}).get("properties") or {"tool_input": {}})
+             for t in tools]
+    reply = fake.model_copy(update={"bound_tools": bound})._reply(messages)
+    message = {"role": "assistant", "content": reply.content or None}
+    if reply.tool_calls:
+        message["tool_calls"] = [{"id": call["id"], "type": "function",
+                                  "function": {"name": call["name"], "arguments": json.dumps(call["args"])}}
+                                 for call in reply.tool_calls]
+    return {"message": message, "prompt_tokens": prompt_tokens, "completion_tokens": len(reply.content or "") // 4}
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    server_version = "StubLLM/1.0"
+    options: argparse.Namespace
+
+    def log_message(self, format, *args):
+        if self.options.verbose:
+            super().log_message(format, *args)
+
+    def _json(self, status: int, body: dict):
+        payload = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def do_GET(self):
+        if self.path.rstrip("/").endswith("/models"):
+            return self._json(200, {"object": "list", "data": [{"id": self.options.model, "object": "model"}]})
+        self._json(404, {"error": {"message": "not found"}})
+
+    def do_POST(self):
+        if not self.path.rstrip("/").endswith("/chat/completions"):
+            return self._json(404, {"error": {"message": "not found"}})
+        request = json.loads(self.rfile.read(int(self.headers.get("Content-Length") or 0)) or b"{}")
+        options = self.options
+        if random.random() < options.error_rate:
+            time.sleep(options.latency / 2)
+            return self._json(options.error_status, {"error": {"message": "stub server overloaded", "type": "rate_limit_exceeded"
+                                                               if options.error_status == 429 else "server_error"}})
+
+        fake = FakeChatModel(model_name=options.model, latency=options.latency + random.random() * options.jitter)
+        result = completion(request, fake)
+        message = result["message"]
+        finish_reason = "tool_calls" if message.get("tool_calls") else "stop"
+        base = {"id": f"chatcmpl-{uuid.uuid4().hex[:12]}", "created": int(time.time()), "model": options.model}
+        usage = {"prompt_tokens": result["prompt_tokens"], "completion_tokens": result["completion_tokens"],
+                 "total_tokens": result["prompt_tokens"] + result["completion_tokens"]}
+
+        if not request.get("stream"):
+            return self._json(200, {**base, "object": "chat.completion", "usage": usage,
+                                    "choices": [{"index": 0, "message": message, "finish_reason": finish_reason}]})
+
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Cache-Control", "no-cache")
+        self.end_headers()
+        delta = {"role": "assistant", "content": message.get("content") or ""}
+        if message.get("tool_calls"):
+            delta["tool_calls"] = [{"index": i, **call} for i, call in enumerate(message["tool_calls"])]
+        chunks = [{"index": 0, "delta": delta, "finish_reason": None},
+                  {"index": 0, "delta": {}, "finish_reason": finish_reason}]
+        for choice in chunks:
+            self.wfile.write(f"data: {json.dumps({**base, 'object': 'chat.completion.chunk', 'choices': [choice]})}\n\n".encode())
+        self.wfile.write(b"data: [DONE]\n\n")
+        self.wfile.flush()
+
+
+def make_server(host: str = "127.0.0.1", port: int = 8011, **overrides) -> ThreadingHTTPServer:
+    """Creates (but does not start) a stub server; overrides set the command line options."""
+    options = argparse.Namespace(model="stub-llm", latency=0.05, jitter=0.0, error_rate=0.0, error_status=429, verbose=False)
+    vars(options).update(overrides)
+    handler = type("ConfiguredStubHandler", (StubHandler,), {"options": options})
+    return ThreadingHTTPServer((host, port), handler)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8011)
+    parser.add_argument("--model", default="stub-llm", help="Model name reported in the responses")
+    parser.add_argument("--latency", type=float, default=0.05, help="Seconds before every response")
+    parser.add_argument("--jitter", type=float, default=0.0, help="Up to this many extra seconds per response")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of requests that fail")
+    parser.add_argument("--error-status", type=int, default=429, help="HTTP status of the failed requests")
+    parser.add_argument("--verbose", action="store_true", help="Log every request")
+    args = parser.parse_args()
+
+    server = make_server(args.host, args.port, model=args.model, latency=args.latency, jitter=args.jitter,
+                         error_rate=args.error_rate, error_status=args.error_status, verbose=args.verbose)
+    print(f"Stub LLM server on http://{args.host}:{args.port}/v1 (model {args.model})")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.shutdown()
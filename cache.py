@@ -0,0 +1,258 @@
+# ----------------- Disk Cache -----------------
+import functools
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, Iterator, Optional
+
+from langchain_core.callbacks import CallbackManager
+from langchain_core.messages import AIMessage, AIMessageChunk
+from langchain_core.outputs import ChatGeneration, LLMResult
+from langchain_core.runnables.config import ensure_config
+
+# Where the cache databases live, shared by every agent module
+CACHE_DIR = os.getenv("HISTORY_REPORT_CACHE_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache"))
+
+# Tool results expire after a week and the tool cache is capped at 64 MB by default
+TOOL_CACHE_TTL = float(os.getenv("TOOL_CACHE_TTL", str(7 * 24 * 3600)))
+TOOL_CACHE_MAX_BYTES = int(os.getenv("TOOL_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+
+# LLM responses do not expire unless LLM_CACHE_TTL is set; the cache is capped at 128 MB by default
+LLM_CACHE_TTL = float(os.getenv("LLM_CACHE_TTL")) if os.getenv("LLM_CACHE_TTL") else None
+LLM_CACHE_MAX_BYTES = int(os.getenv("LLM_CACHE_MAX_BYTES", str(128 * 1024 * 1024)))
+
+
+def normalize_query(query: str) -> str:
+    """Lower-cases a query and collapses whitespace so trivially different queries share an entry."""
+    return " ".join(str(query).lower().split())
+
+
+def content_key(namespace: str, text: str) -> str:
+    """Returns the content address (sha256) of a text inside a namespace."""
+    return hashlib.sha256(f"{namespace}\x00{text}".encode("utf-8")).hexdigest()
+
+
+class DiskCache:
+    """
+    SQLite-backed key/value cache with a time-to-live and size-based LRU eviction.
+
+    Entries are addressed by (namespace, sha256 of the key). Hits and misses are counted per namespace.
+    """
+
+    def __init__(self, path: str, ttl_seconds: Optional[float] = None, max_bytes: Optional[int] = None):
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self.hits: Dict[str, int] = {}
+        self.misses: Dict[str, int] = {}
+
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS entries (
+                namespace TEXT NOT NULL,
+                key TEXT NOT NULL,
+                value TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                created_at REAL NOT NULL,
+                last_access REAL NOT NULL,
+                PRIMARY KEY (namespace, key)
+            )
+        """)
+        self._conn.execute("CREATE INDEX IF NOT EXISTS entries_last_access ON entries (last_access)")
+        self._conn.commit()
+
+    def get(self, namespace: str, key: str) -> Optional[str]:
+        """Returns the cached value, or None on a miss or an expired entry."""
+        digest = content_key(namespace, key)
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value, created_at FROM entries WHERE namespace = ? AND key = ?", (namespace, digest)
+            ).fetchone()
+            if row is not None and self.ttl_seconds is not None and now - row[1] > self.ttl_seconds:
+                self._conn.execute("DELETE FROM entries WHERE namespace = ? AND key = ?", (namespace, digest))
+                self._conn.commit()
+                row = None
+            if row is None:
+                self.misses[namespace] = self.misses.get(namespace, 0) + 1
+                return None
+            self._conn.execute(
+                "UPDATE entries SET last_access = ? WHERE namespace = ? AND key = ?", (now, namespace, digest)
+            )
+            self._conn.commit()
+            self.hits[namespace] = self.hits.get(namespace, 0) + 1
+            return row[0]
+
+    def set(self, namespace: str, key: str, value: str) -> None:
+        """Stores a value and evicts the least recently used entries if the cache grew past max_bytes."""
+        digest = content_key(namespace, key)
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO entries (namespace, key, value, size, created_at, last_access) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (namespace, digest, value, len(value.encode("utf-8")), now, now),
+            )
+            self._evict()
+            self._conn.commit()
+
+    def _evict(self) -> None:
+        if self.max_bytes is None:
+            return
+        total = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        rows = self._conn.execute("SELECT namespace, key, size FROM entries ORDER BY last_access ASC").fetchall()
+        for namespace, key, size in rows:
+            if total <= self.max_bytes:
+                break
+            self._conn.execute("DELETE FROM entries WHERE namespace = ? AND key = ?", (namespace, key))
+            total -= size
+
+    def stats(self) -> Dict[str, Dict[str, int]]:
+        """Returns the hit/miss counters per namespace."""
+        namespaces = set(self.hits) | set(self.misses)
+        return {ns: {"hits": self.hits.get(ns, 0), "misses": self.misses.get(ns, 0)} for ns in sorted(namespaces)}
+
+    def clear(self) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM entries")
+            self._conn.commit()
+
+
+_tool_cache: Optional[DiskCache] = None
+_llm_cache: Optional[DiskCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_tool_cache() -> DiskCache:
+    """Returns the shared cache used for search tool results, creating it on first use."""
+    global _tool_cache
+    with _cache_lock:
+        if _tool_cache is None:
+            _tool_cache = DiskCache(os.path.join(CACHE_DIR, "tools.sqlite"), TOOL_CACHE_TTL, TOOL_CACHE_MAX_BYTES)
+        return _tool_cache
+
+
+def cached_tool(tool_name: str, func: Callable[[str], str]) -> Callable[[str], str]:
+    """
+    Wraps a single-query tool function so its results are served from the tool cache.
+
+    The cache key is the tool name plus the normalized query. Exceptions are not cached.
+    """
+    @functools.wraps(func)
+    def wrapper(query: str) -> str:
+        cache = get_tool_cache()
+        normalized = normalize_query(query)
+        result = cache.get(tool_name, normalized)
+        if result is None:
+            result = func(query)
+            cache.set(tool_name, normalized, result)
+        return result
+
+    return wrapper
+
+
+def get_llm_cache() -> DiskCache:
+    """Returns the shared cache used for LLM responses, creating it on first use."""
+    global _llm_cache
+    with _cache_lock:
+        if _llm_cache is None:
+            _llm_cache = DiskCache(os.path.join(CACHE_DIR, "llm.sqlite"), LLM_CACHE_TTL, LLM_CACHE_MAX_BYTES)
+        return _llm_cache
+
+
+# Requests currently waiting on the network, shared by every CachedChatModel so that
+# identical prompts from different agents are coalesced too
+_inflight: Dict[str, Future] = {}
+_inflight_lock = threading.Lock()
+
+
+class CachedChatModel:
+    """
+    Wraps a chat model (e.g. ChatGroq) so that `invoke(prompt)` is served from a persistent cache.
+
+    Responses are keyed on the model name plus the sha256 of the prompt. Concurrent calls with the
+    same key are coalesced: only the first one goes to the network, the others wait for its result.
+    """
+
+    def __init__(self, llm: Any, cache: Optional[DiskCache] = None):
+        self.llm = llm
+        self._cache = cache
+
+    @property
+    def cache(self) -> DiskCache:
+        return self._cache if self._cache is not None else get_llm_cache()
+
+    @property
+    def model_name(self) -> str:
+        return getattr(self.llm, "model_name", None) or getattr(self.llm, "model", None) or type(self.llm).__name__
+
+    def _cache_hit(self, prompt_text: str, content: str) -> AIMessage:
+        """Reports a cache hit to the configured callbacks as a model call without tokens, and returns it."""
+        message = AIMessage(content=content, response_metadata={"cache_hit": True})
+        config = ensure_config()
+        manager = CallbackManager.configure(inheritable_callbacks=config.get("callbacks"),
+                                            inheritable_metadata=config.get("metadata"))
+        for run_manager in manager.on_llm_start({"name": self.model_name}, [prompt_text],
+                                                invocation_params={"model_name": self.model_name}):
+            run_manager.on_llm_end(LLMResult(generations=[[ChatGeneration(message=message)]],
+                                             llm_output={"model_name": self.model_name, "cache_hit": True}))
+        return message
+
+    def invoke(self, prompt: Any, **kwargs) -> AIMessage:
+        prompt_text = prompt if isinstance(prompt, str) else str(prompt)
+        cached = self.cache.get(self.model_name, prompt_text)
+        if cached is not None:
+            return self._cache_hit(prompt_text, cached)
+
+        digest = content_key(self.model_name, prompt_text)
+        with _inflight_lock:
+            future = _inflight.get(digest)
+            # The owner stores the response before it leaves _inflight, so looking at the cache again
+            # under the lock catches a call that finished since the first lookup
+            cached = self.cache.get(self.model_name, prompt_text) if future is None else None
+            owner = future is None and cached is None
+            if owner:
+                future = Future()
+                _inflight[digest] = future
+        if cached is not None:
+            return self._cache_hit(prompt_text, cached)
+        if not owner:
+            return future.result()
+
+        try:
+            response = self.llm.invoke(prompt, **kwargs)
+            if isinstance(response.content, str):
+                self.cache.set(self.model_name, prompt_text, response.content)
+            future.set_result(response)
+            return response
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with _inflight_lock:
+                _inflight.pop(digest, None)
+
+    def stream(self, prompt: Any, **kwargs) -> Iterator[AIMessageChunk]:
+        """Streams the response chunks; a cached response is yielded as a single chunk."""
+        prompt_text = prompt if isinstance(prompt, str) else str(prompt)
+        cached = self.cache.get(self.model_name, prompt_text)
+        if cached is not None:
+            self._cache_hit(prompt_text, cached)
+            yield AIMessageChunk(content=cached, response_metadata={"cache_hit": True})
+            return
+
+        parts = []
+        for chunk in self.llm.stream(prompt, **kwargs):
+            if isinstance(chunk.content, str):
+                parts.append(chunk.content)
+            yield chunk
+        self.cache.set(self.model_name, prompt_text, "".join(parts))
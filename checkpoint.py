@@ -0,0 +1,65 @@
+# ----------------- Checkpoints -----------------
+import asyncio
+import os
+import sqlite3
+import threading
+import uuid
+from typing import Optional
+
+from langgraph.checkpoint.sqlite import SqliteSaver
+
+import cache
+
+
+def checkpoint_path() -> str:
+    """SQLite file holding the LangGraph checkpoints of every graph (CHECKPOINT_DB or the cache directory)."""
+    return os.getenv("CHECKPOINT_DB") or os.path.join(cache.CACHE_DIR, "checkpoints.sqlite")
+
+
+def new_thread_id() -> str:
+    return uuid.uuid4().hex
+
+
+def thread_config(thread_id: str, **configurable) -> dict:
+    """Returns the RunnableConfig that ties a graph invocation to a checkpoint thread."""
+    return {"configurable": {"thread_id": thread_id, **configurable}}
+
+
+class ThreadedSqliteSaver(SqliteSaver):
+    """
+    SqliteSaver that also serves async graphs (ainvoke/astream) by running its synchronous
+    methods in a worker thread, so sync and async graphs share one connection and one file.
+    """
+
+    async def aget_tuple(self, config):
+        return await asyncio.to_thread(self.get_tuple, config)
+
+    async def alist(self, config, *, filter=None, before=None, limit=None):
+        items = await asyncio.to_thread(lambda: list(self.list(config, filter=filter, before=before, limit=limit)))
+        for item in items:
+            yield item
+
+    async def aput(self, config, checkpoint, metadata, new_versions):
+        return await asyncio.to_thread(self.put, config, checkpoint, metadata, new_versions)
+
+    async def aput_writes(self, config, writes, task_id, task_path=""):
+        return await asyncio.to_thread(self.put_writes, config, writes, task_id, task_path)
+
+    async def adelete_thread(self, thread_id):
+        return await asyncio.to_thread(self.delete_thread, thread_id)
+
+
+_checkpointer: Optional[ThreadedSqliteSaver] = None
+_checkpointer_lock = threading.Lock()
+
+
+def get_checkpointer() -> ThreadedSqliteSaver:
+    """Returns the shared on-disk checkpointer, creating it on first use."""
+    global _checkpointer
+    with _checkpointer_lock:
+        if _checkpointer is None:
+            path = checkpoint_path()
+            if os.path.dirname(path):
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+            _checkpointer = ThreadedSqliteSaver(sqlite3.connect(path, check_same_thread=False))
+        return _checkpointer
@@ -0,0 +1,235 @@
+# ----------------- Near-duplicate Detection -----------------
+import functools
+import hashlib
+import os
+import re
+import threading
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Callable, Dict, List, Optional, Set, Tuple
+
+from cache import cached_tool
+from source_store import ingesting, split_passages
+
+# Collapse near-duplicate search queries and result passages within a run (DEDUP_ENABLED=0 turns it off)
+DEDUP_ENABLED = os.getenv("DEDUP_ENABLED", "1") != "0"
+# Jaccard similarity of the query words above which a query is answered with an earlier query's result
+DEDUP_QUERY_THRESHOLD = float(os.getenv("DEDUP_QUERY_THRESHOLD", "0.8"))
+# Estimated Jaccard similarity of the word shingles above which a passage counts as a duplicate
+DEDUP_PASSAGE_THRESHOLD = float(os.getenv("DEDUP_PASSAGE_THRESHOLD", "0.7"))
+
+NUM_PERM = 64
+BANDS = 16  # LSH bands of NUM_PERM // BANDS rows; pairs above ~0.5 similarity share a band with high probability
+SHINGLE_WORDS = 3
+_MERSENNE = (1 << 61) - 1
+
+QUERY_STOPWORDS = set("a an and the of in on at to for by with from about during what who when where how why".split())
+
+
+def _seeds(n: int) -> List[Tuple[int, int]]:
+    seeds = []
+    for i in range(n):
+        digest = hashlib.blake2b(f"minhash-{i}".encode(), digest_size=16).digest()
+        seeds.append((int.from_bytes(digest[:8], "big") % _MERSENNE | 1, int.from_bytes(digest[8:], "big") % _MERSENNE))
+    return seeds
+
+
+_PERMUTATIONS = _seeds(NUM_PERM)
+
+
+def query_words(query: str) -> Set[str]:
+    """Word set of a query without stopwords and plural s, so word order and inflection do not matter."""
+    words = re.findall(r"[a-z0-9]+", str(query).lower())
+    return {w[:-1] if len(w) > 3 and w.endswith("s") else w for w in words if w not in QUERY_STOPWORDS}
+
+
+def jaccard(a: Set[str], b: Set[str]) -> float:
+    return len(a & b) / len(a | b) if a or b else 1.0
+
+
+def shingles(text: str, size: int = SHINGLE_WORDS) -> Set[str]:
+    words = re.findall(r"[a-z0-9]+", text.lower())
+    if len(words) <= size:
+        return {" ".join(words)} if words else set()
+    return {" ".join(words[i:i + size]) for i in range(len(words) - size + 1)}
+
+
+def minhash(features: Set[str]) -> Tuple[int, ...]:
+    """MinHash signature of a feature set: NUM_PERM minima of universal hashes of the features."""
+    if not features:
+        return tuple([_MERSENNE] * NUM_PERM)
+    hashes = [int.from_bytes(hashlib.blake2b(f.encode(), digest_size=8).digest(), "big") for f in features]
+    return tuple(min((a * h + b) % _MERSENNE for h in hashes) for a, b in _PERMUTATIONS)
+
+
+def similarity(sig_a: Tuple[int, ...], sig_b: Tuple[int, ...]) -> float:
+    """Estimated Jaccard similarity of the sets behind two MinHash signatures."""
+    return sum(x == y for x, y in zip(sig_a, sig_b)) / len(sig_a)
+
+
+class PassageIndex:
+    """MinHash LSH index of passages: finds an earlier passage that is a near-duplicate of a new one."""
+
+    def __init__(self, threshold: float = DEDUP_PASSAGE_THRESHOLD):
+        self.threshold = threshold
+        self.signatures: List[Tuple[int, ...]] = []
+        self.buckets: Dict[Tuple[int, Tuple[int, ...]], List[int]] = {}
+
+    def _bands(self, signature: Tuple[int, ...]):
+        rows = NUM_PERM // BANDS
+        return [(band, signature[band * rows:(band + 1) * rows]) for band in range(BANDS)]
+
+    def find(self, signature: Tuple[int, ...]) -> Optional[int]:
+        candidates = {index for key in self._bands(signature) for index in self.buckets.get(key, ())}
+        for index in sorted(candidates):
+            if similarity(signature, self.signatures[index]) >= self.threshold:
+                return index
+        return None
+
+    def add(self, signature: Tuple[int, ...]) -> int:
+        index = len(self.signatures)
+        self.signatures.append(signature)
+        for key in self._bands(signature):
+            self.buckets.setdefault(key, []).append(index)
+        return index
+
+
+class RunDeduplicator:
+    """
+    Near-duplicate detection for one pipeline run.
+
+    Queries: a search whose query words are (almost) the same as those of a query already answered
+    in this run by the same tool (e.g. the same keywords in another order) gets the earlier result
+    instead of a new tool call.
+
+    Passages: each researcher agent (scope) sees a result passage only once. Passages that are
+    near-duplicates (MinHash over word shingles) of a passage already shown in the same scope, or of
+    an earlier passage of the same result, are dropped before the result reaches the LLM.
+    """
+
+    def __init__(self, query_threshold: float = DEDUP_QUERY_THRESHOLD, passage_threshold: float = DEDUP_PASSAGE_THRESHOLD):
+        self.query_threshold = query_threshold
+        self.passage_threshold = passage_threshold
+        self.queries: Dict[str, List[Tuple[Set[str], str, str]]] = {}  # tool -> (words, query, result)
+        self.queries_short_circuited = 0
+        self.passages_seen = 0
+        self.passages_dropped = 0
+        self.chars_dropped = 0
+        self._lock = threading.Lock()
+
+    def answered(self, tool_name: str, query: str) -> Optional[Tuple[str, str]]:
+        """The (query, result) of an earlier near-identical query to the same tool, if any."""
+        words = query_words(query)
+        if not words:
+            return None
+        with self._lock:
+            for earlier_words, earlier_query, result in self.queries.get(tool_name, []):
+                if jaccard(words, earlier_words) >= self.query_threshold:
+                    self.queries_short_circuited += 1
+                    return earlier_query, result
+        return None
+
+    def record(self, tool_name: str, query: str, result: str) -> None:
+        with self._lock:
+            self.queries.setdefault(tool_name, []).append((query_words(query), query, result))
+
+    def collapse(self, tool_name: str, text: str, index: PassageIndex) -> str:
+        """Drops the passages of a tool result that are near-duplicates of passages already in index."""
+        passages = split_passages(tool_name, text)
+        if len(passages) == 0:
+            return text
+        kept, dropped = [], 0
+        for passage in passages:
+            signature = minhash(shingles(passage))
+            if index.find(signature) is None:
+                index.add(signature)
+                kept.append(passage)
+            else:
+                dropped += 1
+        with self._lock:
+            self.passages_seen += len(passages)
+            self.passages_dropped += dropped
+            self.chars_dropped += len(text) - sum(len(p) for p in kept) if dropped else 0
+        if not dropped:
+            return text
+        note = f"[{dropped} passage(s) omitted: near-duplicates of results already shown]"
+        if not kept:
+            return f"{note} Try a different query for new information."
+        separator = "\n---\n" if tool_name.startswith("dpla") else "\n\n"
+        return separator.join(kept) + ("\n---" if tool_name.startswith("dpla") else "") + f"\n{note}"
+
+    def report(self) -> str:
+        with self._lock:
+            return (f"dedup short-circuited {self.queries_short_circuited} queries, dropped {self.passages_dropped} of "
+                    f"{self.passages_seen} passages ({self.chars_dropped} chars)")
+
+
+# Deduplicator of the current run and passage index of the current researcher agent (see dedup_run, dedup_scope)
+_run: ContextVar[Optional[RunDeduplicator]] = ContextVar("dedup_run", default=None)
+_scope: ContextVar[Optional[PassageIndex]] = ContextVar("dedup_scope", default=None)
+
+
+def current_run() -> Optional[RunDeduplicator]:
+    return _run.get()
+
+
+@contextmanager
+def dedup_run():
+    """Starts near-duplicate detection for a run in the current context; nested calls reuse the outer run."""
+    if not DEDUP_ENABLED or _run.get() is not None:
+        yield _run.get()
+        return
+    token = _run.set(RunDeduplicator())
+    try:
+        yield _run.get()
+    finally:
+        _run.reset(token)
+
+
+@contextmanager
+def dedup_scope():
+    """Passages shown to one researcher agent are collapsed against each other (see RunDeduplicator)."""
+    token = _scope.set(PassageIndex() if _run.get() is not None else None)
+    try:
+        yield
+    finally:
+        _scope.reset(token)
+
+
+def collapse_passages(tool_name: str, text: str) -> str:
+    """Collapses near-duplicate passages of a result within the current scope (unchanged outside a run)."""
+    run, index = _run.get(), _scope.get()
+    if run is None or index is None or not isinstance(text, str):
+        return text
+    return run.collapse(tool_name, text, index)
+
+
+def deduplicated(tool_name: str, func: Callable[[str], str]) -> Callable[[str], str]:
+    """
+    Wraps a single-query tool function: near-identical queries within a run are answered from the
+    earlier result, and every result is collapsed against the passages already shown in the scope.
+    """
+    @functools.wraps(func)
+    def wrapper(query: str) -> str:
+        run = _run.get()
+        if run is None:
+            return func(query)
+        earlier = run.answered(tool_name, query)
+        if earlier is not None:
+            print(f"--- DEDUP: '{query[:60]}' ANSWERED WITH '{earlier[0][:60]}' ---")
+            result = earlier[1]
+        else:
+            result = func(query)
+            if isinstance(result, str):
+                run.record(tool_name, query, result)
+        return collapse_passages(tool_name, result)
+
+    return wrapper
+
+
+def search_tool(tool_name: str, func: Callable[[str], str]) -> Callable[[str], str]:
+    """
+    The wrapper chain of a single-query search tool: near-duplicate handling, then the tool cache,
+    then indexing of the fresh results in the source store.
+    """
+    return deduplicated(tool_name, cached_tool(tool_name, ingesting(tool_name, func)))
@@ -0,0 +1,124 @@
+# ----------------- DPLA Client -----------------
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+DPLA_ITEMS_URL = "https://api.dp.la/v2/items"
+
+# (connect, read) timeouts in seconds, retries on 429/5xx, and pages fetched per query
+DPLA_TIMEOUT = (float(os.getenv("DPLA_CONNECT_TIMEOUT", "3.05")), float(os.getenv("DPLA_READ_TIMEOUT", "15")))
+DPLA_MAX_RETRIES = int(os.getenv("DPLA_MAX_RETRIES", "3"))
+DPLA_PAGE_SIZE = int(os.getenv("DPLA_PAGE_SIZE", "5"))
+DPLA_PAGES = int(os.getenv("DPLA_PAGES", "1"))
+DPLA_MAX_WORKERS = int(os.getenv("DPLA_MAX_WORKERS", "10"))
+
+
+def _first(value):
+    return value[0] if isinstance(value, list) and value else value
+
+
+def slim_item(doc: dict) -> Dict[str, str]:
+    """Keeps only the fields of a DPLA item that the agents use."""
+    source = doc.get("sourceResource", {})
+    date = _first(source.get("date", ""))
+    return {
+        "id": doc.get("id", ""),
+        "title": _first(source.get("title", "No Title")),
+        "provider": doc.get("provider", {}).get("name", "Unknown Provider"),
+        "link": doc.get("isShownAt", "No Link"),
+        "date": date.get("displayDate", "") if isinstance(date, dict) else str(date or ""),
+        "description": _first(source.get("description", "")),
+    }
+
+
+def format_items(items: List[dict]) -> str:
+    """Formats DPLA items the way the dpla_search tool has always returned them."""
+    if not items:
+        return "No primary sources found in the DPLA for that query."
+    return "\n".join(f"Title: {item['title']}\nProvider: {item['provider']}\nLink: {item['link']}\n---"
+                     for item in items)
+
+
+def search_concurrently(queries: List[str], search: Callable[[str], List[dict]],
+                        max_workers: int = DPLA_MAX_WORKERS) -> List[dict]:
+    """
+    Runs one search per query in parallel and merges the results.
+
+    Items are de-duplicated by their DPLA id and keep the order of the queries. A failing query
+    does not fail the others.
+    """
+    unique_queries = list(dict.fromkeys(q.strip() for q in queries if q and q.strip()))
+    if not unique_queries:
+        return []
+
+    def safe_search(query: str) -> List[dict]:
+        try:
+            return search(query)
+        except requests.exceptions.RequestException:
+            return []
+
+    with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(unique_queries)))) as pool:
+        result_lists = list(pool.map(safe_search, unique_queries))
+
+    seen, merged = set(), []
+    for items in result_lists:
+        for item in items:
+            key = item.get("id") or item.get("link")
+            if key not in seen:
+                seen.add(key)
+                merged.append(item)
+    return merged
+
+
+class DPLAClient:
+    """
+    Client for the DPLA items API with a pooled keep-alive session.
+
+    Requests use connect/read timeouts and are retried with exponential backoff on
+    rate-limit (429) and server errors, honouring Retry-After. With a rate_limiter, every
+    page request first takes a token from it.
+    """
+
+    def __init__(self, api_key: str, timeout=DPLA_TIMEOUT, max_retries: int = DPLA_MAX_RETRIES,
+                 page_size: int = DPLA_PAGE_SIZE, pool_size: int = DPLA_MAX_WORKERS, rate_limiter=None):
+        self.api_key = api_key
+        self.rate_limiter = rate_limiter
+        self.timeout = timeout
+        self.page_size = page_size
+        self.session = requests.Session()
+        retry = Retry(total=max_retries, backoff_factor=0.5, status_forcelist=(429, 500, 502, 503, 504),
+                      allowed_methods=("GET",), respect_retry_after_header=True)
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+    def fetch_page(self, query: str, page: int = 1, page_size: Optional[int] = None) -> dict:
+        if self.rate_limiter is not None:
+            self.rate_limiter.acquire()
+        params = {"q": query, "api_key": self.api_key, "page_size": page_size or self.page_size, "page": page}
+        response = self.session.get(DPLA_ITEMS_URL, params=params, timeout=self.timeout)
+        response.raise_for_status()
+        return response.json()
+
+    def search(self, query: str, pages: int = 1, page_size: Optional[int] = None) -> List[dict]:
+        """
+        Returns the slimmed items for a query. With pages > 1 the first page is fetched, then the
+        remaining pages (up to the result count) are fetched in parallel.
+        """
+        page_size = page_size or self.page_size
+        first = self.fetch_page(query, 1, page_size)
+        docs = list(first.get("docs", []))
+        last_page = min(pages, -(-int(first.get("count", 0)) // page_size))
+        if last_page > 1:
+            with ThreadPoolExecutor(max_workers=last_page - 1) as pool:
+                for data in pool.map(lambda p: self.fetch_page(query, p, page_size), range(2, last_page + 1)):
+                    docs.extend(data.get("docs", []))
+        return [slim_item(doc) for doc in docs]
+
+    def search_many(self, queries: List[str], pages: int = 1) -> List[dict]:
+        """Searches several keyword queries concurrently and de-duplicates the items by id."""
+        return search_concurrently(queries, lambda q: self.search(q, pages=pages))
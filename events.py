@@ -0,0 +1,149 @@
+# ----------------- Progress Events -----------------
+import asyncio
+import queue
+import threading
+from dataclasses import dataclass, field
+from typing import Any, AsyncIterator, Callable, Dict, Iterator, List, Optional
+
+from langgraph.config import get_stream_writer
+
+
+@dataclass
+class PipelineEvent:
+    """Base class of the typed progress events the graphs emit on their "custom" stream."""
+
+
+@dataclass
+class PlanReady(PipelineEvent):
+    query: str
+    research_plan: str
+    research_questions: List[str]
+
+
+@dataclass
+class QuestionResearched(PipelineEvent):
+    index: int
+    question: Optional[str]
+    section: str
+
+
+@dataclass
+class SectionChecked(PipelineEvent):
+    index: int
+    question: Optional[str]
+    verdict: str
+    overall_score: Optional[float]
+    check_result: str
+    rewritten_output: str
+
+
+@dataclass
+class PageWritten(PipelineEvent):
+    pdf_path: str
+    page: int
+
+
+@dataclass
+class ReportReady(PipelineEvent):
+    pdf_path: Optional[str]
+    output_paths: Dict[str, str] = field(default_factory=dict)
+
+
+@dataclass
+class RunFinished(PipelineEvent):
+    result: Any  # main.PipelineResult
+
+
+def emit(event: PipelineEvent) -> None:
+    """
+    Sends event to the caller streaming the graph this is called from (its nodes, subgraphs and the
+    threads they start with a copied context). Does nothing outside a graph run or when the graph is
+    not streamed.
+    """
+    try:
+        writer = get_stream_writer()
+    except (RuntimeError, KeyError):
+        # RuntimeError outside any runnable, KeyError in a runnable that is not part of a graph run
+        return
+    writer(event)
+
+
+def page_emitter(pdf_path: str) -> Callable[[int], None]:
+    """on_page callback that emits a PageWritten event for every finished page of pdf_path."""
+    return lambda page: emit(PageWritten(pdf_path=pdf_path, page=page))
+
+
+async def astream_graph(graph, graph_input, config: Optional[dict] = None, final: Optional[dict] = None) -> AsyncIterator[PipelineEvent]:
+    """
+    Runs a compiled graph and yields the PipelineEvents its nodes (and their subgraphs) emit as they happen.
+    If final is given, it is updated with the graph's final state.
+    """
+    async for namespace, mode, chunk in graph.astream(graph_input, config, stream_mode=["custom", "values"], subgraphs=True):
+        if mode == "custom" and isinstance(chunk, PipelineEvent):
+            yield chunk
+        elif mode == "values" and not namespace and final is not None:
+            final.update(chunk)
+
+
+def stream_graph(graph, graph_input, config: Optional[dict] = None, final: Optional[dict] = None) -> Iterator[PipelineEvent]:
+    """Sync version of astream_graph."""
+    for namespace, mode, chunk in graph.stream(graph_input, config, stream_mode=["custom", "values"], subgraphs=True):
+        if mode == "custom" and isinstance(chunk, PipelineEvent):
+            yield chunk
+        elif mode == "values" and not namespace and final is not None:
+            final.update(chunk)
+
+
+_DONE = object()
+
+
+def iterate(make_stream: Callable[[], AsyncIterator[PipelineEvent]]) -> Iterator[PipelineEvent]:
+    """
+    Iterates an async event stream from sync code: the stream runs on its own event loop in a
+    background thread and its events are handed over as they arrive. Errors are raised in the caller.
+    Closing the iterator early (break, del) cancels the stream and waits for its thread to finish.
+    """
+    events: "queue.Queue" = queue.Queue()
+    running: Dict[str, Any] = {}
+    started = threading.Event()
+
+    async def pump():
+        running["loop"], running["task"] = asyncio.get_running_loop(), asyncio.current_task()
+        started.set()
+        stream = make_stream()
+        try:
+            async for event in stream:
+                events.put(event)
+        finally:
+            await stream.aclose()
+
+    def run():
+        try:
+            asyncio.run(pump())
+            events.put(_DONE)
+        except asyncio.CancelledError:
+            events.put(_DONE)
+        except BaseException as e:
+            events.put(e)
+        finally:
+            started.set()
+
+    thread = threading.Thread(target=run, name="event-stream", daemon=True)
+    thread.start()
+    try:
+        while True:
+            event = events.get()
+            if event is _DONE:
+                break
+            if isinstance(event, BaseException):
+                raise event
+            yield event
+    finally:
+        if thread.is_alive():
+            # The consumer stopped early: cancel the run instead of leaving it going in the background
+            started.wait()
+            try:
+                running["loop"].call_soon_threadsafe(running["task"].cancel)
+            except (KeyError, RuntimeError):
+                pass  # the loop has already finished
+        thread.join()
@@ -0,0 +1,204 @@
+# ----------------- Instrumentation -----------------
+import atexit
+import json
+import os
+import threading
+import time
+from collections import defaultdict, deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Dict, List, Optional
+from uuid import UUID
+
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.outputs import LLMResult
+from langchain_core.tracers.context import register_configure_hook
+
+# JSON lines file every LLM and tool call is appended to, and Prometheus text file written at exit
+INSTRUMENTATION_LOG = os.getenv("INSTRUMENTATION_LOG")
+INSTRUMENTATION_PROMETHEUS = os.getenv("INSTRUMENTATION_PROMETHEUS")
+# Latencies kept per call or node for the p95 (the most recent ones); counters and totals cover every call
+LATENCY_SAMPLES = int(os.getenv("INSTRUMENTATION_LATENCY_SAMPLES", "1000"))
+
+
+def _percentile(values: List[float], fraction: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))]
+
+
+def _label(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"')
+
+
+class InstrumentationHandler(BaseCallbackHandler):
+    """
+    Callback handler that records one event per LLM or tool call: latency, prompt and completion
+    tokens, cache status, errors, and the graph node the call was made from.
+
+    Events are appended to log_path as JSON lines when one is given. In memory only their totals per
+    call and per node are kept, with the last LATENCY_SAMPLES latencies for the p95, so a long-lived
+    handler does not grow with every call.
+    """
+
+    def __init__(self, log_path: Optional[str] = None):
+        self.log_path = log_path
+        self._totals = {"calls": {}, "nodes": {}}
+        self._latencies: Dict[tuple, deque] = defaultdict(lambda: deque(maxlen=LATENCY_SAMPLES))
+        self._started: Dict[UUID, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+
+    def _start(self, run_id: UUID, kind: str, name: str, metadata: Optional[dict]) -> None:
+        with self._lock:
+            self._started[run_id] = {"kind": kind, "name": name, "node": (metadata or {}).get("langgraph_node"),
+                                     "started": time.time(), "perf": time.perf_counter()}
+
+    def _end(self, run_id: UUID, parent_run_id: Optional[UUID], **fields) -> None:
+        with self._lock:
+            start = self._started.pop(run_id, None)
+        if start is None:
+            return
+        event = {"ts": start["started"], "run_id": str(run_id), "parent_run_id": str(parent_run_id) if parent_run_id else None,
+                 "kind": start["kind"], "name": start["name"], "node": start["node"],
+                 "latency_s": time.perf_counter() - start["perf"], "input_tokens": 0, "output_tokens": 0,
+                 "cache_hit": False, "error": None}
+        event.update(fields)
+        with self._lock:
+            for group, key in (("calls", f"{event['kind']}:{event['name']}"), ("nodes", event["node"] or "-")):
+                row = self._totals[group].setdefault(key, {"calls": 0, "errors": 0, "cache_hits": 0, "input_tokens": 0,
+                                                            "output_tokens": 0, "latency_total_s": 0.0})
+                row["calls"] += 1
+                row["errors"] += event["error"] is not None
+                row["cache_hits"] += event["cache_hit"]
+                row["input_tokens"] += event["input_tokens"]
+                row["output_tokens"] += event["output_tokens"]
+                row["latency_total_s"] += event["latency_s"]
+                self._latencies[group, key].append(event["latency_s"])
+            if self.log_path:
+                with open(self.log_path, "a") as f:
+                    f.write(json.dumps(event) + "\n")
+
+    @staticmethod
+    def _model_name(serialized: Optional[dict], metadata: Optional[dict], kwargs: dict) -> str:
+        params = kwargs.get("invocation_params") or {}
+        return ((metadata or {}).get("ls_model_name") or params.get("model_name") or params.get("model")
+                or (serialized or {}).get("name") or "llm")
+
+    def on_chat_model_start(self, serialized, messages, *, run_id, parent_run_id=None, metadata=None, **kwargs):
+        self._start(run_id, "llm", self._model_name(serialized, metadata, kwargs), metadata)
+
+    def on_llm_start(self, serialized, prompts, *, run_id, parent_run_id=None, metadata=None, **kwargs):
+        self._start(run_id, "llm", self._model_name(serialized, metadata, kwargs), metadata)
+
+    def on_llm_end(self, response: LLMResult, *, run_id, parent_run_id=None, **kwargs):
+        input_tokens = output_tokens = 0
+        cache_hit = bool((response.llm_output or {}).get("cache_hit"))
+        for generation in (g for gens in response.generations for g in gens):
+            message = getattr(generation, "message", None)
+            usage = getattr(message, "usage_metadata", None) or {}
+            input_tokens += usage.get("input_tokens", 0)
+            output_tokens += usage.get("output_tokens", 0)
+            cache_hit = cache_hit or bool(getattr(message, "response_metadata", {}).get("cache_hit"))
+        if not input_tokens and not output_tokens:
+            token_usage = (response.llm_output or {}).get("token_usage") or {}
+            input_tokens = token_usage.get("prompt_tokens", 0)
+            output_tokens = token_usage.get("completion_tokens", 0)
+        self._end(run_id, parent_run_id, input_tokens=input_tokens, output_tokens=output_tokens, cache_hit=cache_hit)
+
+    def on_llm_error(self, error, *, run_id, parent_run_id=None, **kwargs):
+        self._end(run_id, parent_run_id, error=f"{type(error).__name__}: {error}")
+
+    def on_tool_start(self, serialized, input_str, *, run_id, parent_run_id=None, metadata=None, **kwargs):
+        self._start(run_id, "tool", (serialized or {}).get("name") or kwargs.get("name") or "tool", metadata)
+
+    def on_tool_end(self, output, *, run_id, parent_run_id=None, **kwargs):
+        self._end(run_id, parent_run_id)
+
+    def on_tool_error(self, error, *, run_id, parent_run_id=None, **kwargs):
+        self._end(run_id, parent_run_id, error=f"{type(error).__name__}: {error}")
+
+    def summary(self) -> Dict[str, Dict[str, Dict[str, float]]]:
+        """Totals per call ("llm:<model>", "tool:<name>") and per graph node."""
+        result = {}
+        with self._lock:
+            for group, totals in self._totals.items():
+                rows = {name: {**row, "latency_p95_s": _percentile(list(self._latencies[group, name]), 0.95)}
+                        for name, row in totals.items()}
+                result[group] = dict(sorted(rows.items(), key=lambda item: -item[1]["latency_total_s"]))
+        return result
+
+    def summary_table(self) -> str:
+        lines = []
+        for group, rows in self.summary().items():
+            lines.append(f"{group:40s} {'calls':>6s} {'errors':>6s} {'cached':>6s} {'in tok':>8s} {'out tok':>8s} {'total s':>8s} {'p95 s':>7s}")
+            for name, r in rows.items():
+                lines.append(f"{name[:40]:40s} {r['calls']:6d} {r['errors']:6d} {r['cache_hits']:6d} {r['input_tokens']:8d} "
+                             f"{r['output_tokens']:8d} {r['latency_total_s']:8.2f} {r['latency_p95_s']:7.2f}")
+            lines.append("")
+        return "\n".join(lines).rstrip()
+
+    def prometheus(self, prefix: str = "history_report") -> str:
+        """Renders the recorded calls as Prometheus text-format counters."""
+        lines = [f"# TYPE {prefix}_calls_total counter", f"# TYPE {prefix}_call_errors_total counter",
+                 f"# TYPE {prefix}_cache_hits_total counter", f"# TYPE {prefix}_call_latency_seconds summary",
+                 f"# TYPE {prefix}_tokens_total counter"]
+        for name, r in self.summary()["calls"].items():
+            kind, call = name.split(":", 1)
+            labels = f'kind="{kind}",name="{_label(call)}"'
+            lines += [f"{prefix}_calls_total{{{labels}}} {r['calls']}",
+                      f"{prefix}_call_errors_total{{{labels}}} {r['errors']}",
+                      f"{prefix}_cache_hits_total{{{labels}}} {r['cache_hits']}",
+                      f"{prefix}_call_latency_seconds_sum{{{labels}}} {r['latency_total_s']:.6f}",
+                      f"{prefix}_call_latency_seconds_count{{{labels}}} {r['calls']}",
+                      f'{prefix}_call_latency_seconds{{{labels},quantile="0.95"}} {r["latency_p95_s"]:.6f}',
+                      f'{prefix}_tokens_total{{{labels},direction="input"}} {r["input_tokens"]}',
+                      f'{prefix}_tokens_total{{{labels},direction="output"}} {r["output_tokens"]}']
+        return "\n".join(lines) + "\n"
+
+
+# Handler of the current run (see track_calls)
+_run_handler: ContextVar[Optional[InstrumentationHandler]] = ContextVar("instrumentation_run_handler", default=None)
+register_configure_hook(_run_handler, inheritable=True)
+
+# Process-wide handler (see install)
+_global_handler: Optional[InstrumentationHandler] = None
+_install_lock = threading.Lock()
+
+
+def install() -> Optional[InstrumentationHandler]:
+    """
+    Attaches the process-wide handler to every chat model and tool call when INSTRUMENTATION_LOG or
+    INSTRUMENTATION_PROMETHEUS is set. Called by the entry points (main.Pipeline); only the first call
+    registers the handler, later calls return it.
+    """
+    global _global_handler
+    with _install_lock:
+        if _global_handler is None and (INSTRUMENTATION_LOG or INSTRUMENTATION_PROMETHEUS):
+            _global_handler = InstrumentationHandler(INSTRUMENTATION_LOG)
+            register_configure_hook(ContextVar("instrumentation_global_handler", default=_global_handler),
+                                    inheritable=True)
+            atexit.register(_write_prometheus)
+        return _global_handler
+
+
+def get_global_handler() -> Optional[InstrumentationHandler]:
+    return _global_handler
+
+
+@contextmanager
+def track_calls(log_path: Optional[str] = None):
+    """Records every LLM and tool call made in the current context (thread or asyncio task) for a per-run summary."""
+    handler = InstrumentationHandler(log_path)
+    token = _run_handler.set(handler)
+    try:
+        yield handler
+    finally:
+        _run_handler.reset(token)
+
+
+def _write_prometheus() -> None:
+    handler = get_global_handler()
+    if handler is not None and INSTRUMENTATION_PROMETHEUS:
+        with open(INSTRUMENTATION_PROMETHEUS, "w") as f:
+            f.write(handler.prometheus())
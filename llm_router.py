@@ -0,0 +1,298 @@
+# ----------------- LLM Router -----------------
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, as_completed, wait
+from contextvars import copy_context
+from functools import lru_cache
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
+
+from langchain_core.messages import BaseMessage
+from langchain_core.runnables import Runnable, RunnableConfig
+
+from cache import CachedChatModel
+from rate_limits import get_rate_limiter, GROQ_MAX_RETRIES
+
+# Models of each tier in order of preference, as "groq:<model>" or "local:<model>" (see LOCAL_LLM_BASE_URL)
+LLM_TIERS = {
+    "small": os.getenv("LLM_SMALL_MODELS", "groq:llama-3.1-8b-instant,groq:llama-3.3-70b-versatile"),
+    "large": os.getenv("LLM_LARGE_MODELS",
+                       "groq:meta-llama/llama-4-scout-17b-16e-instruct,groq:llama-3.3-70b-versatile"),
+}
+
+# Tier of each call site; LLM_ROUTES overrides single sites, e.g. "rewriter=small,formatter=large"
+CALL_SITE_TIERS = {
+    "extract_info": "small",
+    "generate_plan": "large",
+    "planner": "large",
+    "researcher": "large",
+    "checker": "large",
+    "rewriter": "large",
+    "formatter": "small",
+}
+CALL_SITE_TIERS.update(dict(route.strip().split("=", 1) for route in os.getenv("LLM_ROUTES", "").split(",") if "=" in route))
+
+# OpenAI-compatible endpoint (vLLM, llama.cpp, Ollama or benchmarks/stub_llm_server.py) tried after the Groq models of every tier
+LOCAL_LLM_BASE_URL = os.getenv("LOCAL_LLM_BASE_URL")
+LOCAL_LLM_MODEL = os.getenv("LOCAL_LLM_MODEL", "local")
+LOCAL_LLM_API_KEY = os.getenv("LOCAL_LLM_API_KEY", "not-needed")
+
+# A model is degraded when the p95 latency of its recent calls (the last LLM_ROUTER_WINDOW calls within
+# LLM_ROUTER_WINDOW_SECONDS) is above LLM_ROUTER_P95_SECONDS, or more than LLM_ROUTER_MAX_ERROR_RATE of them
+# failed. Degraded models are only tried after the healthy ones, and recover once their bad calls age out
+LLM_ROUTER_WINDOW = int(os.getenv("LLM_ROUTER_WINDOW", "50"))
+LLM_ROUTER_WINDOW_SECONDS = float(os.getenv("LLM_ROUTER_WINDOW_SECONDS", "300"))
+LLM_ROUTER_P95_SECONDS = float(os.getenv("LLM_ROUTER_P95_SECONDS", "20"))
+LLM_ROUTER_MAX_ERROR_RATE = float(os.getenv("LLM_ROUTER_MAX_ERROR_RATE", "0.5"))
+# Seconds a model is skipped after a rate-limit error
+LLM_ROUTER_COOLDOWN_SECONDS = float(os.getenv("LLM_ROUTER_COOLDOWN_SECONDS", "30"))
+# Retries a model makes before the router falls back to the next one (the last model uses GROQ_MAX_RETRIES)
+LLM_ROUTER_RETRIES = int(os.getenv("LLM_ROUTER_RETRIES", "1"))
+# Also send a request to the next model when the first has not answered within its p95 latency
+LLM_ROUTER_HEDGE = os.getenv("LLM_ROUTER_HEDGE", "0") != "0"
+
+# Calls needed before a model's p95 latency is trusted
+MIN_SAMPLES = 5
+
+
+def is_rate_limit(error: BaseException) -> bool:
+    return getattr(error, "status_code", None) == 429 or "RateLimit" in type(error).__name__
+
+
+class ModelStats:
+    """Latency and outcome of the recent calls to one model."""
+
+    def __init__(self, window: int = LLM_ROUTER_WINDOW, window_seconds: float = LLM_ROUTER_WINDOW_SECONDS):
+        self.window_seconds = window_seconds
+        self.latencies: deque = deque(maxlen=window)  # (time, seconds) of the successful calls
+        self.outcomes: deque = deque(maxlen=window)  # (time, failed) of every call
+        self.calls = self.errors = 0
+        self.cooldown_until = 0.0
+        self._lock = threading.Lock()
+
+    def record(self, latency: float, error: Optional[BaseException] = None) -> None:
+        now = time.time()
+        with self._lock:
+            self.calls += 1
+            self.outcomes.append((now, error is not None))
+            if error is None:
+                self.latencies.append((now, latency))
+            else:
+                self.errors += 1
+                if is_rate_limit(error):
+                    self.cooldown_until = now + LLM_ROUTER_COOLDOWN_SECONDS
+
+    def _recent(self, samples: deque) -> list:
+        since = time.time() - self.window_seconds
+        with self._lock:
+            return [value for at, value in samples if at >= since]
+
+    def p95(self) -> Optional[float]:
+        latencies = sorted(self._recent(self.latencies))
+        if len(latencies) < MIN_SAMPLES:
+            return None
+        return latencies[min(len(latencies) - 1, int(round(0.95 * (len(latencies) - 1))))]
+
+    def error_rate(self) -> float:
+        failures = self._recent(self.outcomes)
+        return sum(failures) / len(failures) if len(failures) >= MIN_SAMPLES else 0.0
+
+    def degraded(self) -> bool:
+        p95 = self.p95()
+        return (time.time() < self.cooldown_until or self.error_rate() > LLM_ROUTER_MAX_ERROR_RATE
+                or (p95 is not None and p95 > LLM_ROUTER_P95_SECONDS))
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {"calls": self.calls, "errors": self.errors, "p95_s": self.p95(), "error_rate": self.error_rate(),
+                "degraded": self.degraded()}
+
+
+_stats: Dict[str, ModelStats] = {}
+_stats_lock = threading.Lock()
+
+
+def get_model_stats(model_name: str) -> ModelStats:
+    """Stats shared by every router that uses the model."""
+    with _stats_lock:
+        if model_name not in _stats:
+            _stats[model_name] = ModelStats()
+        return _stats[model_name]
+
+
+def model_health() -> Dict[str, Dict[str, Any]]:
+    with _stats_lock:
+        names = list(_stats)
+    return {name: get_model_stats(name).snapshot() for name in names}
+
+
+@lru_cache(maxsize=None)
+def get_hedge_executor() -> ThreadPoolExecutor:
+    return ThreadPoolExecutor(max_workers=8, thread_name_prefix="llm-hedge")
+
+
+class RoutedChatModel(Runnable[Any, BaseMessage]):
+    """
+    Chat model that sends each call to the first healthy model of a tier and falls back to the next
+    one when the call fails.
+
+    Latency and errors of every call are recorded per model (ModelStats); models whose p95 latency or
+    error rate degrades, or that hit a rate limit, move behind the healthy ones until they recover.
+    With hedging, a call still running after the first model's p95 latency is also sent to the next
+    model and the first answer wins. bind_tools and with_structured_output are applied to every model,
+    so the router can stand in for a chat model in agents and structured calls.
+    """
+
+    def __init__(self, models: Sequence[Tuple[str, Runnable]], hedge: bool = LLM_ROUTER_HEDGE):
+        if not models:
+            raise ValueError("RoutedChatModel needs at least one model.")
+        self.models = list(models)
+        self.hedge = hedge
+
+    @property
+    def model_name(self) -> str:
+        # Responses are cached under the preferred model, whichever model served them
+        return self.models[0][0]
+
+    def _derive(self, method: str, *args, **kwargs) -> "RoutedChatModel":
+        return RoutedChatModel([(name, getattr(model, method)(*args, **kwargs)) for name, model in self.models], self.hedge)
+
+    def bind_tools(self, tools, **kwargs) -> "RoutedChatModel":
+        return self._derive("bind_tools", tools, **kwargs)
+
+    def with_structured_output(self, schema, **kwargs) -> "RoutedChatModel":
+        return self._derive("with_structured_output", schema, **kwargs)
+
+    def ordered(self) -> List[Tuple[str, Runnable]]:
+        """The models in order of preference, healthy ones first."""
+        healthy = [m for m in self.models if not get_model_stats(m[0]).degraded()]
+        return healthy + [m for m in self.models if m not in healthy]
+
+    @staticmethod
+    def _call(name: str, model: Runnable, input: Any, config: Optional[RunnableConfig], **kwargs) -> Any:
+        started = time.perf_counter()
+        try:
+            result = model.invoke(input, config, **kwargs)
+        except Exception as e:
+            get_model_stats(name).record(time.perf_counter() - started, e)
+            raise
+        get_model_stats(name).record(time.perf_counter() - started)
+        return result
+
+    def _hedged(self, first: Tuple[str, Runnable], second: Tuple[str, Runnable], input: Any,
+                config: Optional[RunnableConfig], **kwargs) -> Any:
+        delay = get_model_stats(first[0]).p95() or LLM_ROUTER_P95_SECONDS
+        pool = get_hedge_executor()
+
+        def submit(name, model):
+            return pool.submit(copy_context().run, self._call, name, model, input, config, **kwargs)
+
+        primary = submit(*first)
+        wait([primary], timeout=delay)
+        if primary.done() and primary.exception() is None:
+            return primary.result()
+        if not primary.done():
+            print(f"--- {first[0]} SLOWER THAN {delay:.1f}s, HEDGING WITH {second[0]} ---")
+        error = None
+        # The slower call keeps running in the background; its latency still counts towards the stats
+        for future in as_completed([primary, submit(*second)]):
+            if future.exception() is None:
+                return future.result()
+            error = future.exception()
+        raise error
+
+    def invoke(self, input: Any, config: Optional[RunnableConfig] = None, **kwargs) -> Any:
+        models = self.ordered()
+        error, start = None, 0
+        if self.hedge and len(models) > 1:
+            try:
+                return self._hedged(models[0], models[1], input, config, **kwargs)
+            except Exception as e:
+                error, start = e, 2
+        for name, model in models[start:]:
+            try:
+                return self._call(name, model, input, config, **kwargs)
+            except Exception as e:
+                error = e
+                print(f"--- {name} FAILED ({type(e).__name__}), FALLING BACK ---")
+        raise error
+
+    def stream(self, input: Any, config: Optional[RunnableConfig] = None, **kwargs) -> Iterator[Any]:
+        """Streams from the first model that answers; a model that fails before its first chunk falls back."""
+        error = None
+        for name, model in self.ordered():
+            started = time.perf_counter()
+            streamed = False
+            try:
+                for chunk in model.stream(input, config, **kwargs):
+                    streamed = True
+                    yield chunk
+            except Exception as e:
+                get_model_stats(name).record(time.perf_counter() - started, e)
+                if streamed:
+                    raise
+                error = e
+                print(f"--- {name} FAILED ({type(e).__name__}), FALLING BACK ---")
+                continue
+            get_model_stats(name).record(time.perf_counter() - started)
+            return
+        raise error
+
+
+def get_groq_api_key() -> str:
+    """Reads GROQ_API_KEY from the environment, falling back to the colab secrets when running in colab."""
+    GROQ_API_KEY = os.getenv('GROQ_API_KEY')
+    if not GROQ_API_KEY:
+        try:
+            from google.colab import userdata
+            GROQ_API_KEY = userdata.get('GROQ_API_KEY')
+            os.environ['GROQ_API_KEY'] = GROQ_API_KEY
+        except Exception:
+            GROQ_API_KEY = None
+    if not GROQ_API_KEY:
+        raise ValueError("GROQ_API_KEY key not found in the environment or colab secrets. Please add it or give access.")
+    return GROQ_API_KEY
+
+
+def tier_models(tier: str) -> List[str]:
+    """Model specs of a tier, with the local endpoint last when LOCAL_LLM_BASE_URL is set."""
+    if tier not in LLM_TIERS:
+        raise ValueError(f"Unknown LLM tier: {tier} (use one of {', '.join(LLM_TIERS)})")
+    specs = [spec.strip() for spec in LLM_TIERS[tier].split(",") if spec.strip()]
+    if LOCAL_LLM_BASE_URL:
+        specs.append(f"local:{LOCAL_LLM_MODEL}")
+    return specs
+
+
+# Clients are created on first use so importing this module has no side effects
+@lru_cache(maxsize=None)
+def build_model(spec: str, max_retries: int):
+    provider, _, model = spec.partition(":")
+    if provider == "groq":
+        from langchain_groq import ChatGroq
+
+        # Every Groq model shares one rate limiter so concurrent calls stay under the per-minute quota
+        return ChatGroq(model_name=model, groq_api_key=get_groq_api_key(),
+                        rate_limiter=get_rate_limiter("groq"), max_retries=max_retries)
+    if provider == "local":
+        from langchain_openai import ChatOpenAI
+
+        if not LOCAL_LLM_BASE_URL:
+            raise ValueError("LOCAL_LLM_BASE_URL is not set in the environment.")
+        return ChatOpenAI(model=model, base_url=LOCAL_LLM_BASE_URL, api_key=LOCAL_LLM_API_KEY, max_retries=max_retries)
+    raise ValueError(f"Unknown model provider in {spec!r} (use groq:<model> or local:<model>)")
+
+
+@lru_cache(maxsize=None)
+def get_routed_llm(call_site: str) -> RoutedChatModel:
+    """The router for a call site (see CALL_SITE_TIERS); unknown call sites use the large tier."""
+    specs = tier_models(CALL_SITE_TIERS.get(call_site, "large"))
+    return RoutedChatModel([
+        (spec.partition(":")[2], build_model(spec, GROQ_MAX_RETRIES if i == len(specs) - 1 else LLM_ROUTER_RETRIES))
+        for i, spec in enumerate(specs)])
+
+
+@lru_cache(maxsize=None)
+def get_cached_llm(call_site: str) -> CachedChatModel:
+    """The router for a call site behind the shared response cache, for direct prompt calls."""
+    return CachedChatModel(get_routed_llm(call_site))
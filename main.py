@@ -2,15 +2,34 @@
 
 import os
 import json
+import time
+import asyncio
+import operator
+from contextlib import contextmanager
+from contextvars import ContextVar
 from dotenv import load_dotenv
-from dataclasses import asdict
+from dataclasses import dataclass, field, asdict
+from typing import TypedDict, AsyncIterator, Dict, Iterator, List, Optional, Annotated
+
+from langgraph.graph import StateGraph, END
+from langchain_core.runnables import RunnableConfig
+from langchain_core.callbacks import UsageMetadataCallbackHandler
+from langchain_core.tracers.context import register_configure_hook
 
 
 #load_dotenv(dotenv_path=os.path.join(os.getcwd(), ".env"))
 load_dotenv(dotenv_path=os.path.join(os.path.dirname(__file__), ".env"))
 
-from Checker_Agent import CheckerAgent
+from Checker_Agent import CheckerAgent, CHECK_MAX_CONCURRENCY, CHECK_MODE
 from report_agent import report_workflow
+import Researcher_Agent
+from cache import content_key
+from checkpoint import get_checkpointer, new_thread_id, thread_config
+from instrumentation import install, track_calls
+from dedup import current_run, dedup_run
+from scratchpad import current_savings, scratchpad_run
+from events import (PipelineEvent, QuestionResearched, SectionChecked, ReportReady, RunFinished,
+                    astream_graph, emit, iterate)
 
 generator_input = ("Create a short history paragraph about 'Saint Lloyd Presbyterian Church Cemetery, Charlotte NC'. "
                     "Use only publicly available sources and state any uncertain dates.")
@@ -19,45 +38,346 @@ generator_output = (
     "By 1720 it held burials of several Revolutionary War veterans and a notable leader, James MacCulloch. "
     "Records show expanded grounds in 1950. (Charlotte Observer, 1890)."
 )
-checker = CheckerAgent()
-res = checker.evaluate(generator_input, generator_output)
-print(json.dumps(asdict(res), indent=2))
+
+# Every chat model call made while a handler is set here is counted towards it
+_usage_handler: ContextVar[Optional[UsageMetadataCallbackHandler]] = ContextVar("pipeline_usage_handler", default=None)
+register_configure_hook(_usage_handler, inheritable=True)
+
+
+@contextmanager
+def track_usage():
+    """Counts the tokens of every chat model call made in the current context (thread or asyncio task)."""
+    handler = UsageMetadataCallbackHandler()
+    token = _usage_handler.set(handler)
+    try:
+        yield handler
+    finally:
+        _usage_handler.reset(token)
+
+
+def keep_heading(section: str, rewritten: str) -> str:
+    """Puts the question heading of a researched section back on its rewrite if the rewriter dropped it."""
+    heading = section.splitlines()[0] if section.startswith("#") else None
+    if heading and not rewritten.lstrip().startswith("#"):
+        return f"{heading}\n\n{rewritten.strip()}"
+    return rewritten
+
+
+def usage_totals(*handlers: UsageMetadataCallbackHandler) -> dict:
+    totals = {"input_tokens": 0, "output_tokens": 0, "total_tokens": 0}
+    for handler in handlers:
+        for usage in handler.usage_metadata.values():
+            for key in totals:
+                totals[key] += usage.get(key, 0)
+    return totals
 
 
+@dataclass
+class StageReport:
+    stage: str
+    started_at: float  # seconds since the start of the run
+    seconds: float
+    input_tokens: int = 0
+    output_tokens: int = 0
+    total_tokens: int = 0
 
 
+@dataclass
+class PipelineResult:
+    query: str
+    research_plan: str
+    research_findings: str
+    rewritten_output: str
+    check_results: List[str]
+    pdf_path: Optional[str]
+    final_response: Optional[str]
+    total_seconds: float
+    output_paths: Dict[str, str] = field(default_factory=dict)
+    stages: List[StageReport] = field(default_factory=list)
+    thread_id: Optional[str] = None
+    # Per-call and per-node latency, tokens, cache hits and errors of this run (InstrumentationHandler.summary_table)
+    call_summary: str = ""
+
+    def stage_report(self) -> str:
+        lines = [f"{'stage':10s} {'start':>8s} {'seconds':>8s} {'in tok':>8s} {'out tok':>8s}"]
+        for s in self.stages:
+            lines.append(f"{s.stage:10s} {s.started_at:8.2f} {s.seconds:8.2f} {s.input_tokens:8d} {s.output_tokens:8d}")
+        lines.append(f"{'total':10s} {0:8.2f} {self.total_seconds:8.2f}")
+        return "\n".join(lines)
+
+
+class PipelineState(TypedDict):
+    query: str
+    run_started: float
+    research_plan: str
+    research_questions: List[str]
+    background: str  # Wikipedia and DPLA results prefetched while planning
+    research_findings: str
+    check_results: List[str]
+    rewritten_output: str
+    formatted_text: Optional[str]
+    report_filename: Optional[str]
+    pdf_path: Optional[str]
+    output_paths: Dict[str, str]
+    final_response: Optional[str]
+    stages: Annotated[List[dict], operator.add]
 
 
 class Pipeline:
-    def __init__(self):
+    """
+    Runs planning, research, checking and report generation as one async LangGraph.
+
+    Research questions are researched concurrently and each section is checked as soon as its
+    research finishes, so checking overlaps with the research of the remaining questions.
+    Every run returns a PipelineResult with per-stage latency and token usage.
+
+    With checkpoint=True (the default) each run is stored on disk under a thread id after every
+    node: a failed or interrupted run resumes from the last completed node when it is run again
+    with the same thread id, every checked section is stored on its own, and regenerate_report()
+    renders the PDF again from the stored research and checks.
+    """
+
+    def __init__(self, checkpoint: bool = True):
+        # Process-wide call log and metrics (INSTRUMENTATION_LOG, INSTRUMENTATION_PROMETHEUS)
+        install()
         self.complete = False
+        self.checkpoint = checkpoint
+        checkpointer = get_checkpointer() if checkpoint else None
+        self.checker = CheckerAgent(mode=CHECK_MODE, checkpointer=checkpointer)
+        self.report_graph = report_workflow()
+        self.workflow = StateGraph(PipelineState)
+        self.workflow.add_node("planner", self.plan_stage)
+        self.workflow.add_node("research_and_check", self.research_and_check_stage)
+        self.workflow.add_node("report", self.report_stage)
+        self.workflow.set_entry_point("planner")
+        self.workflow.add_edge("planner", "research_and_check")
+        self.workflow.add_edge("research_and_check", "report")
+        self.workflow.add_edge("report", END)
+        self.compiled_graph = self.workflow.compile(checkpointer=checkpointer)
 
-    def run(self):
-    '''Planner Agent'''
+    @staticmethod
+    def _stage(name: str, state: PipelineState, started: float, ended: float, *handlers) -> dict:
+        return {"stage": name, "started_at": started - state["run_started"], "seconds": ended - started,
+                **usage_totals(*handlers)}
 
-    '''Checker Agent'''
-        checker = CheckerAgent()
-        res = checker.evaluate(generator_input, generator_output)
-        print(json.dumps(asdict(res), indent=2))
-    '''Search Agent'''
+    async def plan_stage(self, state: PipelineState) -> dict:
+        print("--- 💬 EXECUTING PLANNING STAGE ---")
+        started = time.time()
+        with track_usage() as usage:
+            plan = await asyncio.to_thread(Researcher_Agent.planning_node, {"query": state["query"]})
+        questions = plan.get("research_questions") or Researcher_Agent.parse_research_questions(plan["research_plan"])
+        return {"research_plan": plan["research_plan"], "research_questions": questions,
+                "background": plan.get("background", ""),
+                "stages": [self._stage("plan", state, started, time.time(), usage)]}
 
-    '''Report Agent'''
-        workflow = report_workflow()
-    result = workflow.invoke(sample_input)
+    async def research_and_check_stage(self, state: PipelineState, config: RunnableConfig) -> dict:
+        print("--- EXECUTING RESEARCH AND CHECK STAGE ---")
+        thread_id = config.get("configurable", {}).get("thread_id")
+        plan = state["research_plan"]
+        questions = state["research_questions"] or [None]
+        research_slots = asyncio.Semaphore(Researcher_Agent.RESEARCH_MAX_CONCURRENCY)
+        check_slots = asyncio.Semaphore(CHECK_MAX_CONCURRENCY)
+        research_usage, check_usage = [], []
+        research_times, check_times = [], []
 
-    print("\n=== FINAL REPORT ===")
-    print(result["final_response"])
-    print(f"\nPDF saved at: {result['pdf_path']}")
+        async def research_and_check(index, question):
+            async with research_slots:
+                started = time.time()
+                with track_usage() as usage:
+                    if question is None:
+                        # The plan could not be split, research it as a whole
+                        response = await Researcher_Agent.get_researcher_executor().ainvoke({"input": plan})
+                        section = response["output"].strip()
+                    else:
+                        answer = await Researcher_Agent.aresearch_question(plan, question, state.get("background", ""))
+                        section = Researcher_Agent.format_research_section(question, answer)
+                research_usage.append(usage)
+                research_times.append((started, time.time()))
+            emit(QuestionResearched(index=index, question=question, section=section))
 
-    try:
-        files.download(result["pdf_path"])
-        print("✅ PDF download initiated.")
-    except Exception as e:
-        print(f"⚠️ Could not download PDF automatically: {e}")
-    '''Checker Agent'''
+            # Check this section right away while other questions are still being researched
+            async with check_slots:
+                started = time.time()
+                with track_usage() as usage:
+                    # Checks are stored per section, so a resumed run does not check the same section twice
+                    check_thread = f"{thread_id}:check:{content_key('section', section)}" if thread_id else None
+                    checked = await asyncio.to_thread(self.checker.evaluate, state["query"], section,
+                                                      thread_id=check_thread)
+                check_usage.append(usage)
+                check_times.append((started, time.time()))
+            try:
+                parsed = json.loads(checked.check_result)
+            except ValueError:
+                parsed = {}
+            emit(SectionChecked(index=index, question=question, verdict=parsed.get("verdict", "questionable"),
+                                overall_score=parsed.get("overall_score"), check_result=checked.check_result,
+                                rewritten_output=checked.rewritten_output))
+            return section, checked
+
+        results = await asyncio.gather(*(research_and_check(i, q) for i, q in enumerate(questions)))
+        if Researcher_Agent.get_scratchpad_trimmer() is not None and current_savings() is not None:
+            print(f"--- {current_savings().report()} ---")
+        if current_run() is not None:
+            print(f"--- {current_run().report()} ---")
+
+        stages = []
+        for name, times, usage in (("research", research_times, research_usage), ("check", check_times, check_usage)):
+            if times:
+                stages.append(self._stage(name, state, min(t[0] for t in times), max(t[1] for t in times), *usage))
+        return {
+            "research_findings": "\n\n".join(section for section, _ in results),
+            "check_results": [checked.check_result for _, checked in results],
+            "rewritten_output": "\n\n".join(keep_heading(section, checked.rewritten_output)
+                                              for section, checked in results),
+            "stages": stages,
+        }
+
+    async def report_stage(self, state: PipelineState) -> dict:
+        print("--- EXECUTING REPORT STAGE ---")
+        started = time.time()
+        with track_usage() as usage:
+            report = await self.report_graph.ainvoke({"rewritten_output": state["rewritten_output"],
+                                                      "formatted_text": state.get("formatted_text"),
+                                                      "filename": state.get("report_filename"),
+                                                      "title": state["query"],
+                                                      "check_results": state["check_results"]})
+        emit(ReportReady(pdf_path=report["pdf_path"], output_paths=report.get("output_paths") or {}))
+        return {"formatted_text": report["formatted_text"], "pdf_path": report["pdf_path"],
+                "output_paths": report.get("output_paths") or {},
+                "final_response": report["final_response"],
+                "stages": [self._stage("report", state, started, time.time(), usage)]}
+
+    def _result(self, final_state: dict, started: float, thread_id: Optional[str], calls) -> PipelineResult:
+        return PipelineResult(
+            query=final_state["query"],
+            research_plan=final_state["research_plan"],
+            research_findings=final_state["research_findings"],
+            rewritten_output=final_state["rewritten_output"],
+            check_results=final_state["check_results"],
+            pdf_path=final_state.get("pdf_path"),
+            final_response=final_state.get("final_response"),
+            total_seconds=time.time() - started,
+            output_paths=final_state.get("output_paths") or {},
+            stages=[StageReport(**s) for s in final_state["stages"]],
+            thread_id=thread_id,
+            call_summary=calls.summary_table(),
+        )
+
+    async def arun(self, query: Optional[str] = None, thread_id: Optional[str] = None,
+                   report_filename: Optional[str] = None) -> PipelineResult:
+        """
+        Runs the pipeline for query. Given the thread id of an earlier run that did not finish, resumes
+        it from its last completed node instead (query may then be omitted); a finished run is returned
+        as stored. report_filename names the PDF inside REPORT_OUTPUT_DIR (default Research_report.pdf).
+        """
+        async for event in self.astream(query, thread_id, report_filename):
+            if isinstance(event, RunFinished):
+                return event.result
+
+    async def astream(self, query: Optional[str] = None, thread_id: Optional[str] = None,
+                      report_filename: Optional[str] = None) -> AsyncIterator[PipelineEvent]:
+        """
+        Runs the pipeline like arun and yields its progress as it happens: PlanReady, then a
+        QuestionResearched and a SectionChecked per question (in completion order), a PageWritten per
+        PDF page, ReportReady, and finally RunFinished with the PipelineResult.
+        """
+        started = time.time()
+        initial = {"query": query, "run_started": started, "report_filename": report_filename, "stages": []}
+        final_state: dict = {}
+        # Near-duplicate queries and passages are collapsed across all questions of the run,
+        # and the scratchpad savings are counted for this run only
+        with track_calls() as calls, dedup_run(), scratchpad_run():
+            if not self.checkpoint:
+                thread_id = None
+                async for event in astream_graph(self.compiled_graph, initial, final=final_state):
+                    yield event
+            else:
+                thread_id = thread_id or new_thread_id()
+                config = thread_config(thread_id)
+                snapshot = await self.compiled_graph.aget_state(config)
+                if snapshot.next:
+                    print(f"--- RESUMING RUN {thread_id} AT {', '.join(snapshot.next).upper()} ---")
+                    graph_input = None
+                elif snapshot.values:
+                    final_state, graph_input = snapshot.values, False
+                elif query is None:
+                    raise ValueError(f"No stored run for thread {thread_id}; a query is needed to start one.")
+                else:
+                    graph_input = initial
+                if graph_input is not False:
+                    async for event in astream_graph(self.compiled_graph, graph_input, config, final=final_state):
+                        yield event
+        self.complete = True
+        yield RunFinished(result=self._result(final_state, started, thread_id, calls))
+
+    def stream(self, query: Optional[str] = None, thread_id: Optional[str] = None,
+               report_filename: Optional[str] = None) -> Iterator[PipelineEvent]:
+        """Sync version of astream (the run happens on its own event loop in a background thread)."""
+        return iterate(lambda: self.astream(query, thread_id, report_filename))
+
+    async def aregenerate_report(self, thread_id: str, reformat: bool = False) -> PipelineResult:
+        """
+        Renders the PDF of a stored run again from its checkpointed research and check results.
+        The stored formatted text is reused unless reformat is True, so no LLM call is made.
+        """
+        started = time.time()
+        config = thread_config(thread_id)
+        if not self.checkpoint:
+            raise ValueError("regenerate_report needs a Pipeline created with checkpoint=True.")
+        snapshot = await self.compiled_graph.aget_state(config)
+        if not snapshot.values.get("rewritten_output"):
+            raise ValueError(f"No checked research stored for thread {thread_id}.")
+        # Stage times are relative to this regeneration, not to the original run
+        update = {"run_started": started}
+        if reformat:
+            update["formatted_text"] = None
+        # Continue as if research_and_check had just finished, so only the report node runs
+        await self.compiled_graph.aupdate_state(config, update, as_node="research_and_check")
+        with track_calls() as calls:
+            final_state = await self.compiled_graph.ainvoke(None, config)
+        # "stages" is appended to by its reducer: only report the stage added by this regeneration
+        previous = len(snapshot.values.get("stages", []))
+        return self._result({**final_state, "stages": final_state["stages"][previous:]}, started, thread_id, calls)
+
+    def run(self, query: Optional[str] = None, thread_id: Optional[str] = None,
+            report_filename: Optional[str] = None) -> PipelineResult:
+        return asyncio.run(self.arun(query, thread_id, report_filename))
+
+    def regenerate_report(self, thread_id: str, reformat: bool = False) -> PipelineResult:
+        return asyncio.run(self.aregenerate_report(thread_id, reformat))
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Research a historical topic and write a PDF report.")
+    parser.add_argument("query", nargs="*", help="Research query (omit to check the sample paragraph)")
+    parser.add_argument("--thread-id", help="Checkpoint thread of an earlier run to resume")
+    parser.add_argument("--regenerate-report", action="store_true",
+                        help="Render the PDF of --thread-id again from its stored research and checks")
+    args = parser.parse_args()
+
+    if args.query or args.thread_id:
+        agent_pipeline = Pipeline()
+        if args.regenerate_report:
+            if not args.thread_id:
+                parser.error("--regenerate-report needs --thread-id")
+            result = agent_pipeline.regenerate_report(args.thread_id)
+        else:
+            result = agent_pipeline.run(" ".join(args.query) or None, thread_id=args.thread_id)
+        print("\n=== FINAL REPORT ===")
+        print(result.final_response)
+        print(f"\nPDF saved at: {result.pdf_path}")
+        for fmt, path in result.output_paths.items():
+            if fmt != "pdf":
+                print(f"{fmt.upper()} saved at: {path}")
+        print(f"Thread id: {result.thread_id}")
+        print("\n=== STAGE REPORT ===")
+        print(result.stage_report())
+        print("\n=== CALL SUMMARY ===")
+        print(result.call_summary)
+    else:
+        # Check the sample paragraph only
         checker = CheckerAgent()
         res = checker.evaluate(generator_input, generator_output)
         print(json.dumps(asdict(res), indent=2))
-
-agent_pipeline = Pipeline()
-agent_pipeline.run()
@@ -0,0 +1,133 @@
+# ----------------- Rule-based Pre-check -----------------
+import json
+import re
+import time
+from typing import Dict, List, Optional
+
+# Historical periods an output can be checked against: (name, pattern, first year, last year)
+EVENT_PERIODS = [
+    ("Revolutionary War", r"revolutionary war|american revolution|war of independence", 1775, 1783),
+    ("War of 1812", r"war of 1812", 1812, 1815),
+    ("Civil War", r"civil war", 1861, 1865),
+    ("World War I", r"world war i\b|world war one|first world war|great war", 1914, 1918),
+    ("World War II", r"world war ii\b|world war two|second world war", 1939, 1945),
+    ("Korean War", r"korean war", 1950, 1953),
+    ("Vietnam War", r"vietnam war", 1955, 1975),
+    ("French Revolution", r"french revolution", 1789, 1799),
+]
+
+YEAR = r"\b(1[0-9]{3}|20[0-9]{2})\b"
+# An author or publication, a comma and a year: "(Charlotte Observer, 1890)", "[Smith et al., 1890]".
+# Other parentheticals with a year, such as "(born 1795)", are not citations
+CITATION = re.compile(r"[(\[]((?:[A-Z][\w'.&-]*|et al\.|and|of|the|&)(?:\s+(?:[A-Z][\w'.&-]*|et al\.|and|of|the|&))*),"
+                      r"\s*(1[0-9]{3}|20[0-9]{2})[a-z]?[)\]]")
+# Empty or placeholder source markers
+MALFORMED_CITATION = re.compile(
+    r"\(\s*\)|\[\s*\]|\[(?:citation needed|source\??|\?|\d*\?)\]|\((?:citation needed|source\??|ref\.?)\)", re.I)
+# Words that put a year after the event, e.g. veterans buried by 1720 of a war that began in 1775
+AFTER_EVENT = re.compile(r"veteran|survivor|memorial|monument|aftermath|after the|following the|commemorat", re.I)
+DURING_EVENT = re.compile(r"\b(?:during|amid|in the midst of)\b", re.I)
+
+SEVERITY_PENALTY = {"high": 0.3, "medium": 0.15, "low": 0.05}
+
+
+def split_sentences(text: str) -> List[str]:
+    return [s.strip() for s in re.split(r"(?<=[.!?])\s+(?=[A-Z(\[\"'])", text) if s.strip()]
+
+
+def claim_years(sentence: str) -> List[int]:
+    """Years stated in a sentence, without the years of its citations."""
+    return [int(y) for y in re.findall(YEAR, CITATION.sub("", sentence))]
+
+
+def precheck(agent_output: str, current_year: Optional[int] = None) -> Dict:
+    """
+    Checks dates and citations of an output with local rules and returns a check result in the
+    check_agent_output JSON schema (as a dict).
+
+    Rules: years in the future (high severity, decisive), years that may contradict a known historical
+    period (e.g. Revolutionary War veterans before 1775), citations dated before the event they
+    support, and empty or placeholder source markers (medium: they narrow the LLM check but do not
+    replace it). Outputs that state dates without any source marker get a low severity reason.
+    """
+    current_year = current_year or time.localtime().tm_year
+    reasons, fixes, evidence = [], [], []
+
+    def flag(kind: str, severity: str, message: str, sentence: str, fix: str):
+        reasons.append({"type": kind, "message": message, "severity": severity})
+        evidence.append({"text": sentence, "why": message})
+        fixes.append(fix)
+
+    sentences = split_sentences(agent_output)
+    for index, sentence in enumerate(sentences):
+        years = claim_years(sentence)
+        for year in years:
+            if year > current_year:
+                flag("date", "high", f"{year} is in the future.", sentence, f"Correct or remove the date {year}.")
+
+        for name, pattern, first, last in EVENT_PERIODS:
+            if not years or not re.search(pattern, sentence, re.I):
+                continue
+            if AFTER_EVENT.search(sentence):
+                for year in (y for y in years if y < first):
+                    # Medium: the year and the "after" word only share a sentence, so the LLM check still runs
+                    flag("anachronism", "medium", f"{year} may be before the {name} began ({first}).", sentence,
+                         f"Check the {name} claim dated {year}; the {name} began in {first}.")
+            elif DURING_EVENT.search(sentence):
+                for year in (y for y in years if y < first or y > last):
+                    flag("anachronism", "medium", f"{year} is outside the {name} ({first}-{last}).", sentence,
+                         f"Check the date {year}; the {name} lasted from {first} to {last}.")
+
+        for match in CITATION.finditer(sentence):
+            cited_year = int(match.group(2))
+            # A citation standing alone after a sentence supports the previous sentence
+            claims = claim_years(sentence) or (claim_years(sentences[index - 1]) if index else [])
+            if cited_year > current_year:
+                flag("citation", "high", f"Citation '{match.group(0)}' is dated in the future.", sentence,
+                     f"Correct the year of the citation {match.group(0)}.")
+            elif claims and cited_year < max(claims):
+                context = sentence if claim_years(sentence) else f"{sentences[index - 1]} {sentence}"
+                flag("citation_date", "medium",
+                     f"Citation '{match.group(0)}' may predate the {max(claims)} event it supports.", context,
+                     f"Check that the citation {match.group(0)} can support the {max(claims)} claim.")
+
+        for match in MALFORMED_CITATION.finditer(sentence):
+            flag("malformed_citation", "medium", f"Source marker '{match.group(0)}' is empty or a placeholder.",
+                 sentence, f"Replace '{match.group(0)}' with a real source or remove the claim.")
+
+    has_markers = CITATION.search(agent_output) or re.search(r"\[\d+\]|https?://", agent_output)
+    if len(re.findall(YEAR, agent_output)) >= 2 and not has_markers:
+        flag("missing_citation", "low", "Dated claims are made without any source markers.", agent_output[:200],
+             "Cite a source for each dated claim.")
+
+    score = max(0.05, 1.0 - sum(SEVERITY_PENALTY[r["severity"]] for r in reasons))
+    severities = {r["severity"] for r in reasons}
+    verdict = "unreliable" if "high" in severities else "questionable" if "medium" in severities else "reliable"
+    return {"overall_score": round(score, 2), "verdict": verdict, "reasons": reasons,
+            "suggested_fixes": list(dict.fromkeys(fixes)), "evidence_snippets": evidence,
+            "checks_performed": ["rule_based_dates", "rule_based_citations"]}
+
+
+def is_decisive(result: Dict) -> bool:
+    """A pre-check result is decisive (no LLM check needed) when it found a high severity problem."""
+    return any(reason.get("severity") == "high" for reason in result.get("reasons", []))
+
+
+def combine_checks(local: Dict, check_json: str) -> str:
+    """Adds the pre-check findings to an LLM check result (JSON string) and returns the combined JSON."""
+    if not local["reasons"]:
+        return check_json
+    try:
+        checked = json.loads(check_json)
+    except ValueError:
+        return json.dumps(local)
+    severity_rank = {"reliable": 0, "questionable": 1, "unreliable": 2}
+    verdicts = [checked.get("verdict", "questionable"), local["verdict"]]
+    return json.dumps({
+        "overall_score": min(float(checked.get("overall_score", 0.5)), local["overall_score"]),
+        "verdict": max(verdicts, key=lambda v: severity_rank.get(v, 1)),
+        "reasons": local["reasons"] + checked.get("reasons", []),
+        "suggested_fixes": list(dict.fromkeys(local["suggested_fixes"] + checked.get("suggested_fixes", []))),
+        "evidence_snippets": local["evidence_snippets"] + checked.get("evidence_snippets", []),
+        "checks_performed": list(dict.fromkeys(local["checks_performed"] + checked.get("checks_performed", []))),
+    })
@@ -0,0 +1,52 @@
+# ----------------- Rate Limits -----------------
+import functools
+import os
+import threading
+from typing import Callable, Dict
+
+from langchain_core.rate_limiters import InMemoryRateLimiter
+
+# Requests per minute allowed for each external service (free-tier defaults)
+REQUESTS_PER_MINUTE = {
+    "groq": float(os.getenv("GROQ_REQUESTS_PER_MINUTE", "30")),
+    "serpapi": float(os.getenv("SERPAPI_REQUESTS_PER_MINUTE", "30")),
+    "dpla": float(os.getenv("DPLA_REQUESTS_PER_MINUTE", "60")),
+}
+
+# Number of retries the Groq client makes (with backoff) on rate-limit and server errors
+GROQ_MAX_RETRIES = int(os.getenv("GROQ_MAX_RETRIES", "4"))
+
+_limiters: Dict[str, InMemoryRateLimiter] = {}
+_limiters_lock = threading.Lock()
+
+
+def get_rate_limiter(service: str) -> InMemoryRateLimiter:
+    """
+    Returns the token-bucket rate limiter shared by every caller of an external service.
+
+    Parameters:
+        str: The service name, one of REQUESTS_PER_MINUTE.
+
+    Returns:
+        InMemoryRateLimiter: A limiter that can be passed to a chat model or acquired directly.
+    """
+    with _limiters_lock:
+        if service not in _limiters:
+            requests_per_minute = REQUESTS_PER_MINUTE[service]
+            _limiters[service] = InMemoryRateLimiter(
+                requests_per_second=requests_per_minute / 60,
+                check_every_n_seconds=0.1,
+                # Allow a short burst so a batch does not start fully serialized
+                max_bucket_size=max(1, int(requests_per_minute / 10)),
+            )
+        return _limiters[service]
+
+
+def rate_limited(service: str, func: Callable) -> Callable:
+    """Wraps func so every call first takes a token from the service's shared rate limiter."""
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        get_rate_limiter(service).acquire()
+        return func(*args, **kwargs)
+
+    return wrapper
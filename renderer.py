@@ -0,0 +1,288 @@
+# ----------------- Report Renderer -----------------
+import multiprocessing
+import os
+import re
+import shutil
+import tempfile
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+from xml.sax.saxutils import escape
+
+from reportlab.lib.pagesizes import letter
+from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
+from reportlab.lib.units import inch
+from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, ListFlowable, ListItem
+
+# Output formats written for every report (comma separated: pdf, html, md); the pipeline always writes the PDF
+REPORT_FORMATS = [f.strip() for f in os.getenv("REPORT_FORMATS", "pdf").split(",") if f.strip()]
+
+# Worker processes for PDF rendering; 0 renders in the calling process. With workers, the sections
+# of a report (top-level headings) are rendered in parallel and merged when pypdf is installed
+RENDER_WORKERS = int(os.getenv("RENDER_WORKERS", "0"))
+
+DEFAULT_TITLE = "Research Report"
+
+Block = Tuple[str, int, str]  # (kind, heading level, text) with kind "heading", "bullet" or "paragraph"
+
+HEADING = re.compile(r"^(#{1,6})\s+(.*?)\s*#*$")
+BOLD_LINE = re.compile(r"^\*\*([^*]+)\*\*:?$")
+BULLET = re.compile(r"^(?:[-*+•]|\d+[.)])\s+(.*)$")
+
+
+@lru_cache(maxsize=None)
+def get_styles() -> Dict[str, ParagraphStyle]:
+    """Paragraph styles of the report, built once per process."""
+    sample = getSampleStyleSheet()
+    return {
+        "title": ParagraphStyle("ReportTitle", parent=sample["Heading1"], spaceAfter=30, alignment=1),
+        "h1": ParagraphStyle("ReportH1", parent=sample["Heading1"], spaceBefore=12, spaceAfter=8),
+        "h2": ParagraphStyle("ReportH2", parent=sample["Heading2"], spaceBefore=10, spaceAfter=6),
+        "h3": ParagraphStyle("ReportH3", parent=sample["Heading3"], spaceBefore=8, spaceAfter=4),
+        "body": sample["BodyText"],
+        "bullet": ParagraphStyle("ReportBullet", parent=sample["BodyText"], leftIndent=6, spaceBefore=0),
+    }
+
+
+def unique_path(filename: str, directory: str) -> str:
+    """
+    Reserves a path for filename in directory that no other run uses: report.pdf, then report_1.pdf,
+    report_2.pdf, ... The file is created empty so concurrent runs never pick the same name.
+    """
+    os.makedirs(directory, exist_ok=True)
+    stem, ext = os.path.splitext(filename)
+    for n in range(100000):
+        path = os.path.join(directory, f"{stem}_{n}{ext}" if n else filename)
+        try:
+            os.close(os.open(path, os.O_CREAT | os.O_EXCL | os.O_WRONLY))
+            return path
+        except FileExistsError:
+            continue
+    raise FileExistsError(f"No free file name for {filename} in {directory}")
+
+
+def inline_markup(text: str) -> str:
+    """Escapes text for reportlab/HTML and converts Markdown bold, italics, code and links."""
+    text = escape(text, {'"': "&quot;"})
+    text = re.sub(r"\*\*(.+?)\*\*|__(.+?)__", lambda m: f"<b>{m.group(1) or m.group(2)}</b>", text)
+    text = re.sub(r"(?<![\w*])\*(?!\s)(.+?)(?<!\s)\*(?![\w*])", r"<i>\1</i>", text)
+    text = re.sub(r"`([^`]+)`", r'<font face="Courier">\1</font>', text)
+    text = re.sub(r"\[([^\]]+)\]\((https?://[^)\s]+)\)", r'<link href="\2">\1</link>', text)
+    return text
+
+
+def parse_blocks(text: str) -> List[Block]:
+    """Splits Markdown-ish report text into headings, bullet items and paragraphs (one per line)."""
+    blocks: List[Block] = []
+    for raw_line in text.splitlines():
+        line = raw_line.strip()
+        heading = HEADING.match(line) or BOLD_LINE.match(line)
+        bullet = BULLET.match(line)
+        if not line:
+            continue
+        elif heading:
+            level = len(heading.group(1)) if heading.re is HEADING else 3
+            blocks.append(("heading", level, heading.group(2 if heading.re is HEADING else 1).strip()))
+        elif bullet:
+            blocks.append(("bullet", 0, bullet.group(1)))
+        else:
+            blocks.append(("paragraph", 0, line))
+    return blocks
+
+
+def split_title(blocks: Sequence[Block], title: Optional[str]) -> Tuple[Optional[str], List[Block]]:
+    """
+    A report that starts with a level-1 heading ("# Letters of 1776") has its own title: it replaces
+    the given title so the report has one title only. Without a given title the blocks are unchanged.
+    """
+    if title and blocks and blocks[0][0] == "heading" and blocks[0][1] == 1:
+        return blocks[0][2], list(blocks[1:])
+    return title, list(blocks)
+
+
+def split_sections(blocks: Sequence[Block]) -> List[List[Block]]:
+    """Splits blocks at their top-level headings; each section can be laid out independently."""
+    levels = [level for kind, level, _ in blocks if kind == "heading"]
+    if not levels:
+        return [list(blocks)]
+    top = min(levels)
+    sections: List[List[Block]] = [[]]
+    for block in blocks:
+        if block[0] == "heading" and block[1] == top and sections[-1]:
+            sections.append([])
+        sections[-1].append(block)
+    return sections
+
+
+def pdf_story(blocks: Sequence[Block], title: Optional[str]) -> list:
+    styles = get_styles()
+    story = [Paragraph(escape(title), styles["title"])] if title else []
+    bullets: List[Paragraph] = []
+
+    def flush_bullets():
+        if bullets:
+            story.append(ListFlowable([ListItem(p, leftIndent=12) for p in bullets], bulletType="bullet", start="•"))
+            bullets.clear()
+
+    for kind, level, text in blocks:
+        if kind == "bullet":
+            bullets.append(Paragraph(inline_markup(text), styles["bullet"]))
+            continue
+        flush_bullets()
+        if kind == "heading":
+            story.append(Paragraph(inline_markup(text), styles[f"h{min(level, 3)}"]))
+        else:
+            story.append(Paragraph(inline_markup(text), styles["body"]))
+    flush_bullets()
+    return story or [Spacer(1, 1)]
+
+
+def _render_pdf_blocks(blocks: Sequence[Block], path: str, title: Optional[str],
+                       on_page: Optional[Callable[[int], None]] = None) -> int:
+    """Lays out blocks as a PDF at path, calling on_page(n) as each page is finished. Returns the page count."""
+    doc = SimpleDocTemplate(path, pagesize=letter, leftMargin=1*inch, bottomMargin=1*inch,
+                            topMargin=1*inch, rightMargin=1*inch, title=title or "")
+    if on_page is not None:
+        doc.afterPage = lambda: on_page(doc.page)
+    doc.build(pdf_story(blocks, title))
+    return doc.page
+
+
+_pool: Optional[ProcessPoolExecutor] = None
+_pool_lock = threading.Lock()
+
+
+def get_render_pool() -> Optional[ProcessPoolExecutor]:
+    """Shared pool of RENDER_WORKERS processes (spawned, so they do not inherit threads or open connections)."""
+    global _pool
+    if RENDER_WORKERS <= 0:
+        return None
+    with _pool_lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(max_workers=RENDER_WORKERS, mp_context=multiprocessing.get_context("spawn"))
+        return _pool
+
+
+def _merge_pdfs(paths: Iterable[str], path: str) -> None:
+    from pypdf import PdfWriter
+
+    writer = PdfWriter()
+    for part in paths:
+        writer.append(part)
+    with open(path, "wb") as f:
+        writer.write(f)
+
+
+def render_pdf(text: str, path: str, title: Optional[str] = DEFAULT_TITLE, parallel: bool = True,
+               on_page: Optional[Callable[[int], None]] = None) -> str:
+    """
+    Renders report text to a PDF at path. With a render pool (and parallel), each top-level section is
+    laid out in its own process (starting on a new page) and the parts are merged; without pypdf the
+    whole report is rendered in one worker instead. on_page(n) is called for every finished page, as it
+    is laid out or, with a render pool, once the file is written.
+    """
+    title, blocks = split_title(parse_blocks(text), title)
+    pool = get_render_pool() if parallel else None
+    if pool is None:
+        _render_pdf_blocks(blocks, path, title, on_page)
+        return path
+
+    sections = split_sections(blocks)
+    try:
+        import pypdf  # noqa: F401
+    except ImportError:
+        sections = [blocks]
+    if len(sections) == 1:
+        pages = pool.submit(_render_pdf_blocks, blocks, path, title).result()
+    else:
+        workdir = tempfile.mkdtemp(prefix="report_parts_")
+        try:
+            parts = [os.path.join(workdir, f"part_{i:04d}.pdf") for i in range(len(sections))]
+            futures = [pool.submit(_render_pdf_blocks, section, part, title if i == 0 else None)
+                       for i, (section, part) in enumerate(zip(sections, parts))]
+            pages = sum(future.result() for future in futures)
+            _merge_pdfs(parts, path)
+        finally:
+            shutil.rmtree(workdir, ignore_errors=True)
+    for page in range(1, pages + 1) if on_page is not None else ():
+        on_page(page)
+    return path
+
+
+def render_html(text: str, path: str, title: Optional[str] = DEFAULT_TITLE) -> str:
+    body, in_list = [], False
+    title, blocks = split_title(parse_blocks(text), title)
+    for kind, level, content in blocks:
+        if kind == "bullet" and not in_list:
+            body.append("<ul>")
+            in_list = True
+        elif kind != "bullet" and in_list:
+            body.append("</ul>")
+            in_list = False
+        if kind == "heading":
+            tag = f"h{min(level + 1, 6)}"
+            body.append(f"<{tag}>{inline_markup(content)}</{tag}>")
+        elif kind == "bullet":
+            body.append(f"<li>{inline_markup(content)}</li>")
+        else:
+            body.append(f"<p>{inline_markup(content)}</p>")
+    if in_list:
+        body.append("</ul>")
+    # reportlab markup that has no HTML equivalent
+    html_body = "\n".join(body).replace('<font face="Courier">', "<code>").replace("</font>", "</code>")
+    html_body = html_body.replace("<link href=", "<a href=").replace("</link>", "</a>")
+    heading = f"<h1>{escape(title)}</h1>\n" if title else ""
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(f"<!DOCTYPE html>\n<html><head><meta charset=\"utf-8\"><title>{escape(title or '')}</title>"
+                f"<style>body{{font-family:serif;max-width:46em;margin:2em auto;line-height:1.5}}h1{{text-align:center}}</style>"
+                f"</head><body>\n{heading}{html_body}\n</body></html>\n")
+    return path
+
+
+def render_markdown(text: str, path: str, title: Optional[str] = DEFAULT_TITLE) -> str:
+    title, blocks = split_title(parse_blocks(text), title)
+    lines = [f"# {title}", ""] if title else []
+    for kind, level, content in blocks:
+        if kind == "heading":
+            lines += [f"{'#' * min(level + 1, 6)} {content}", ""]
+        elif kind == "bullet":
+            lines.append(f"- {content}")
+        else:
+            if lines and lines[-1].startswith("- "):
+                lines.append("")
+            lines += [content, ""]
+    with open(path, "w", encoding="utf-8") as f:
+        f.write("\n".join(lines).rstrip() + "\n")
+    return path
+
+
+RENDERERS = {"pdf": render_pdf, "html": render_html, "md": render_markdown}
+
+
+def render(text: str, filename: str, directory: str, formats: Optional[Sequence[str]] = None,
+           title: Optional[str] = DEFAULT_TITLE, parallel: bool = True) -> Dict[str, str]:
+    """Renders a report in each format (default REPORT_FORMATS) to unique paths and returns {format: path}."""
+    stem = os.path.splitext(filename)[0]
+    paths = {}
+    for fmt in formats or REPORT_FORMATS:
+        if fmt not in RENDERERS:
+            raise ValueError(f"Unknown report format: {fmt}")
+        path = unique_path(f"{stem}.{fmt}", directory)
+        paths[fmt] = render_pdf(text, path, title, parallel) if fmt == "pdf" else RENDERERS[fmt](text, path, title)
+    return paths
+
+
+def render_many(reports: Sequence[Tuple[str, str]], directory: str, formats: Optional[Sequence[str]] = None,
+                workers: Optional[int] = None) -> List[Dict[str, str]]:
+    """
+    Renders many (text, filename) reports across worker processes (default: one per CPU) and
+    returns their {format: path} dicts in order.
+    """
+    if not reports:
+        return []
+    with ProcessPoolExecutor(max_workers=workers or os.cpu_count(), mp_context=multiprocessing.get_context("spawn")) as pool:
+        # Each report is one task, so the workers do not split sections any further
+        futures = [pool.submit(render, text, filename, directory, formats, DEFAULT_TITLE, False)
+                   for text, filename in reports]
+        return [future.result() for future in futures]
@@ -10,88 +10,258 @@ Original file is located at
 #!pip install langgraph langchain_openai reportlab langchain-groq
 
 
-import os, re
+import os, re, json
 from typing import Dict, TypedDict, Optional, List, Any, Annotated
 from langgraph.graph import START, StateGraph, END
-from langchain_core.prompts import ChatPromptTemplate
-from langgraph.prebuilt import ToolNode, tools_condition, create_react_agent
-from langchain_core.tools import tool
-from langgraph.checkpoint.memory import MemorySaver
-from google.colab import userdata
-from langchain_groq import ChatGroq
-from groq import Groq
-from typing import TypedDict, List
-from reportlab.pdfgen import canvas
 from reportlab.lib.pagesizes import letter
-from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer
+from reportlab.platypus import BaseDocTemplate, PageTemplate, Frame, Paragraph
 from reportlab.lib.units import inch
-from google.colab import files
+import renderer
+from precheck import CITATION
+from events import page_emitter
+from llm_router import get_cached_llm
 
+# Directory the PDF reports are written to (colab's working directory by default)
+REPORT_OUTPUT_DIR = os.getenv("REPORT_OUTPUT_DIR", "/content")
 
-GROQ_API_KEY = userdata.get('GROQ_API_KEY')
-os.environ['GROQ_API_KEY'] = GROQ_API_KEY
+# Stream the formatter output straight into the PDF unless REPORT_STREAMING=0
+REPORT_STREAMING = os.getenv("REPORT_STREAMING", "1") != "0"
 
-llm = "llama-3.1-8b-instant"
-chat_groq_llm = ChatGroq(model_name=llm, groq_api_key=GROQ_API_KEY)
-if not GROQ_API_KEY:
-  raise ValueError("GROQ_API_KEY key not found in colab secrets. Please add it or give access.")
+# "local" lays the checked text out without any LLM call; "llm" asks the model to reformat it first
+REPORT_FORMATTER = os.getenv("REPORT_FORMATTER", "local")
 
 class ReportState(TypedDict):
     rewritten_output: str
     formatted_text: Optional[str]
     pdf_path: Optional[str]
     final_response: Optional[str]
-    
+    streaming: Optional[bool]
+    filename: Optional[str]
+    output_paths: Optional[Dict[str, str]]
+    title: Optional[str]
+    check_results: Optional[List[str]]
+    formatter: Optional[str]
+
+def report_styles():
+  # Styles are built once per process by the renderer
+  styles = renderer.get_styles()
+  return styles["title"], styles["body"]
+
 class report_agent:
   def formatted_report(content:str, filename: str) -> str:
-    file_path = f"/content/{filename}"
-
-    doc = SimpleDocTemplate(file_path, pagesize=letter,
-                            leftMargin= 1*inch, bottomMargin= 1*inch,
-                            topMargin = 1*inch, rightMargin = 1*inch)
-
-    styles = getSampleStyleSheet()
-    title_style = ParagraphStyle(
-        'CustomTitle',
-        parent=styles['Heading1'],
-        spaceAfter = 30,
-        alignment = 1
-    )
-    body_style = styles['BodyText']
+    file_path = renderer.unique_path(filename, REPORT_OUTPUT_DIR)
+    # Every finished page is reported to a caller streaming the graph (see events.py)
+    return renderer.render_pdf(content, file_path, on_page=page_emitter(file_path))
 
-    story = []
+def formatted_pdf(content: str, filename: str) -> str:
+  return report_agent.formatted_report(content, filename)
 
-    title = Paragraph("Research Report", title_style)
-    story.append(title)
-
-    lines = content.split('\n')
-    for line in lines:
-      line = line.strip()
-      if not line:
-        continue
-      story.append(Paragraph(line, body_style))
+class StreamingPDFWriter:
+  """
+  Lays out a PDF one flowable at a time instead of building the whole story at the end.
 
-    doc.build(story)
-    return file_path
+  Each finished page is emitted to the canvas as soon as its flowables are placed, so the
+  report text does not have to be held in memory as a complete story. Call close() to
+  finish the last page and save the file.
+  """
 
-def report_workflow():
+  def __init__(self, filename: str, on_page=None):
+    self.file_path = renderer.unique_path(filename, REPORT_OUTPUT_DIR)
+    self.pages_written = 0
+    self.on_page = on_page
+    self.styles = renderer.get_styles()
+    self.title_style, self.body_style = report_styles()
+
+    self.doc = BaseDocTemplate(self.file_path, pagesize=letter,
+                               leftMargin= 1*inch, bottomMargin= 1*inch,
+                               topMargin = 1*inch, rightMargin = 1*inch)
+    frame = Frame(self.doc.leftMargin, self.doc.bottomMargin, self.doc.width, self.doc.height, id='normal')
+    self.doc.addPageTemplates([PageTemplate(id='Page', frames=frame, onPageEnd=self._page_done,
+                                            pagesize=self.doc.pagesize)])
+    # Drive BaseDocTemplate.build() step by step so flowables can be added while the LLM is still writing
+    self.doc._startBuild(self.file_path)
+    self.doc.canv._doctemplate = self.doc
+    # The title is laid out with the first line: a leading "# ..." heading replaces the default title
+    self.titled = False
+
+  def _page_done(self, canvas, doc):
+    self.pages_written += 1
+    if self.on_page:
+      self.on_page(self.pages_written)
+
+  def add(self, flowable):
+    flowables = [flowable]
+    while flowables:
+      self.doc.clean_hanging()
+      self.doc.handle_flowable(flowables)
+
+  def add_line(self, line: str):
+    # Lines are laid out as they arrive, so each one is a block of its own (heading, bullet or paragraph)
+    for kind, level, text in renderer.parse_blocks(line):
+      if not self.titled:
+        self.titled = True
+        if kind == "heading" and level == 1:
+          self.add(Paragraph(renderer.inline_markup(text), self.title_style))
+          continue
+        self.add(Paragraph(renderer.DEFAULT_TITLE, self.title_style))
+      if kind == "heading":
+        self.add(Paragraph(renderer.inline_markup(text), self.styles[f"h{min(level, 3)}"]))
+      elif kind == "bullet":
+        self.add(Paragraph("• " + renderer.inline_markup(text), self.styles["bullet"]))
+      else:
+        self.add(Paragraph(renderer.inline_markup(text), self.body_style))
+
+  def close(self) -> str:
+    if not self.titled:
+      self.titled = True
+      self.add(Paragraph(renderer.DEFAULT_TITLE, self.title_style))
+    del self.doc.canv._doctemplate
+    self.doc._endBuild()
+    return self.file_path
+
+def report_workflow(checkpointer=None):
+  """Compiles the report graph; pass a checkpointer (see checkpoint.py) to keep its state per thread_id."""
   graph = StateGraph(ReportState)
   graph.add_node("report_generator", generator_node)
   graph.set_entry_point("report_generator")
   graph.add_edge("report_generator",END)
-  return graph.compile()
+  return graph.compile(checkpointer=checkpointer)
 
 def download_pdf(pdf_path:str):
   try:
+    from google.colab import files
     files.download_pdf(pdf_path)
     print("PDF download started")
   except Exception as e:
     print(f"error downloading PDF: {e} ")
 
 
+def stream_report(prompt: str, filename: str):
+  """Streams the formatter response and writes each line to the PDF as soon as it is complete."""
+  writer = StreamingPDFWriter(filename)
+  writer.on_page = page_emitter(writer.file_path)
+  parts = []
+  pending = ""
+  for chunk in get_cached_llm("formatter").stream(prompt):
+    text = chunk.content if isinstance(chunk.content, str) else ""
+    parts.append(text)
+    pending += text
+    *complete, pending = pending.split("\n")
+    for line in complete:
+      writer.add_line(line)
+  writer.add_line(pending)
+  pdf_path = writer.close()
+  return "".join(parts).strip(), pdf_path
+
+URL = re.compile(r"https?://[^\s<>\]\)\"']+")
+
+def split_report_sections(text: str):
+  """
+  Splits checked research text into (heading, body) pairs at its "## question" headings. Text
+  before the first heading comes back with heading None; a leading "Title: ..." line is returned
+  separately as the title.
+  """
+  title, sections = None, [[None, []]]
+  for line in text.strip().splitlines():
+    stripped = line.strip()
+    heading = re.match(r"^#{1,3}\s+(.*?)\s*#*$", stripped)
+    if title is None and not heading and not any(body for _, body in sections) and stripped.lower().startswith("title:"):
+      title = stripped[len("title:"):].strip()
+    elif heading:
+      sections.append([heading.group(1), []])
+    else:
+      sections[-1][1].append(stripped)
+  pairs = [(heading, re.sub(r"\n{3,}", "\n\n", "\n".join(body)).strip()) for heading, body in sections]
+  return title, [(heading, body) for heading, body in pairs if heading or body]
+
+def check_note(check_json: str) -> Optional[str]:
+  """One line summary of a check result: verdict, score and the most severe problems found."""
+  try:
+    check = json.loads(check_json)
+  except (TypeError, ValueError):
+    return None
+  if not isinstance(check, dict) or "verdict" not in check:
+    return None
+  rank = {"high": 0, "medium": 1, "low": 2}
+  reasons = sorted(check.get("reasons") or [], key=lambda r: rank.get(r.get("severity"), 3))
+  note = f"*Fact-check: {check['verdict']} (score {float(check.get('overall_score', 0)):.2f}).*"
+  issues = [r.get("message", "") for r in reasons[:3] if r.get("message")]
+  return note + (" Open issues: " + "; ".join(issues) if issues else "")
+
+def collect_sources(text: str) -> List[str]:
+  """Links and (Author, year) citations found in the report text, in order of first use."""
+  sources = [url.rstrip(".,;:") for url in URL.findall(text)]
+  sources += [match.group(0).strip("()[]") for match in CITATION.finditer(URL.sub("", text))]
+  return list(dict.fromkeys(sources))
+
+def local_report(rewritten_output: str, check_results: Optional[List[str]] = None, title: Optional[str] = None) -> str:
+  """
+  Formats checked research into report text without an LLM call: a title, one section per
+  research question (with its fact-check verdict when the check results line up with the
+  sections) and a list of the sources cited.
+  """
+  text_title, sections = split_report_sections(rewritten_output)
+  title = title or text_title
+  notes = [check_note(result) for result in check_results or []]
+  questions = [(heading, body) for heading, body in sections if heading]
+  per_section = len(notes) == len(questions) and bool(questions)
+
+  lines = [f"# {title.strip()}", ""] if title else []
+  question_index = 0
+  for heading, body in sections:
+    if heading:
+      lines += [f"## {heading}", ""]
+    if body:
+      lines += [body, ""]
+    if heading and per_section:
+      if notes[question_index]:
+        lines += [notes[question_index], ""]
+      question_index += 1
+
+  if not per_section and any(notes):
+    lines += ["## Fact-check", ""]
+    lines += [f"- {note}" for note in notes if note]
+    lines.append("")
+
+  sources = collect_sources(rewritten_output)
+  if sources:
+    lines += ["## Sources", ""]
+    lines += [f"- {source}" for source in sources]
+  return "\n".join(lines).strip()
+
+def extra_outputs(text: str, pdf_path: str) -> Dict[str, str]:
+  """
+  Writes the report in the other REPORT_FORMATS (html, md) next to the PDF, named after the PDF's
+  reserved path (e.g. report_2.pdf -> report_2.html) so they match the PDF of this run.
+  """
+  formats = [fmt for fmt in renderer.REPORT_FORMATS if fmt != "pdf"]
+  if not formats:
+    return {}
+  return renderer.render(text, os.path.basename(pdf_path), os.path.dirname(pdf_path) or REPORT_OUTPUT_DIR, formats)
+
 def generator_node(state: ReportState) -> ReportState:
   rewritten_output = state["rewritten_output"]
+  filename = state.get("filename") or "Research_report.pdf"
+
+  # Already formatted (e.g. restored from a checkpoint): only render the PDF again
+  if state.get("formatted_text"):
+    pdf_path = formatted_pdf(state["formatted_text"], filename)
+    print(f"PDF report Generated {pdf_path}")
+    return {"rewritten_output": rewritten_output, "formatted_text": state["formatted_text"],
+            "pdf_path": pdf_path, "final_response": state["formatted_text"],
+            "output_paths": {"pdf": pdf_path, **extra_outputs(state["formatted_text"], pdf_path)}}
+
+  formatter = state.get("formatter") or REPORT_FORMATTER
+  if formatter == "local":
+    final_response = local_report(rewritten_output, state.get("check_results"), state.get("title"))
+    pdf_path = formatted_pdf(final_response, filename)
+    print(f"PDF report Generated {pdf_path}")
+    return {"rewritten_output": rewritten_output, "formatted_text": final_response,
+            "pdf_path": pdf_path, "final_response": final_response,
+            "output_paths": {"pdf": pdf_path, **extra_outputs(final_response, pdf_path)}}
+  if formatter != "llm":
+    raise ValueError(f"Unknown REPORT_FORMATTER: {formatter} (use 'local' or 'llm')")
+
   prompt = f"""
   You are a report formatter. You take responses that include
   - A structured research plan, potentially including:
@@ -103,19 +273,26 @@ def generator_node(state: ReportState) -> ReportState:
   {rewritten_output}
   """
 
-  response = chat_groq_llm.invoke(prompt)
-  final_response = response.content.strip()
+  streaming = state.get("streaming")
+  if streaming is None:
+    streaming = REPORT_STREAMING
+
+  if streaming:
+    final_response, pdf_path = stream_report(prompt, filename)
+  else:
+    response = get_cached_llm("formatter").invoke(prompt)
+    final_response = response.content.strip()
 
-  pdf_path = formatted_pdf(final_response,"Research_report.pdf")
+    pdf_path = formatted_pdf(final_response, filename)
 
   print(f"PDF report Generated {pdf_path}")
 
   return {
       "rewritten_output": state["rewritten_output"],
-      "formatted_text":state.get("formatted_text"),
+      "formatted_text": final_response,
       "pdf_path": pdf_path,
-      "final_response": final_response
-
+      "final_response": final_response,
+      "output_paths": {"pdf": pdf_path, **extra_outputs(final_response, pdf_path)}
   }
 
 if __name__ == "__main__":
@@ -137,14 +314,17 @@ if __name__ == "__main__":
         """
     }
 
-    workflow = report_workflow()
-    result = workflow.invoke(sample_input)
+    from checkpoint import get_checkpointer, new_thread_id, thread_config
+
+    workflow = report_workflow(get_checkpointer())
+    result = workflow.invoke(sample_input, config=thread_config(new_thread_id()))
 
     print("\n=== FINAL REPORT ===")
     print(result["final_response"])
     print(f"\nPDF saved at: {result['pdf_path']}")
 
     try:
+        from google.colab import files
         files.download(result["pdf_path"])
         print("✅ PDF download initiated.")
     except Exception as e:
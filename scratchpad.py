@@ -0,0 +1,114 @@
+# ----------------- Scratchpad -----------------
+import re
+import threading
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, List, Optional, Tuple
+
+# Tool results kept per compacted step: source titles and links, capped at this many characters
+CITATION_MAX_CHARS = 300
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count (about four characters per token) used for the scratchpad budget."""
+    return len(text) // 4 + 1
+
+
+def compact_observation(observation: str) -> str:
+    """Replaces a raw tool result by compact citations: the titles and links it contained."""
+    titles = re.findall(r"^(?:Title|Page): (.+)$", observation, re.M)
+    links = list(dict.fromkeys(link.rstrip(").,") for link in re.findall(r"https?://\S+", observation)))
+    citations = "; ".join(titles[:5] + links[:5]) or observation[:CITATION_MAX_CHARS // 2]
+    return f"[result compacted, sources: {citations[:CITATION_MAX_CHARS]}]"
+
+
+def _step_tokens(step: Tuple) -> int:
+    action, observation = step
+    return estimate_tokens(str(action.tool_input)) + estimate_tokens(str(observation))
+
+
+class ScratchpadSavings:
+    """Scratchpad tokens sent to the LLM, against what the unbounded scratchpad would have sent."""
+
+    def __init__(self):
+        self.steps = 0
+        self.tokens_unbounded = 0
+        self.tokens_sent = 0
+        self._lock = threading.Lock()
+
+    def record(self, unbounded: int, sent: int) -> None:
+        with self._lock:
+            self.steps += 1
+            self.tokens_unbounded += unbounded
+            self.tokens_sent += sent
+
+    def savings(self) -> Dict[str, float]:
+        """Scratchpad tokens sent to the LLM so far, against what the unbounded scratchpad would have sent."""
+        with self._lock:
+            saved = self.tokens_unbounded - self.tokens_sent
+            return {"llm_steps": self.steps, "tokens_unbounded": self.tokens_unbounded, "tokens_sent": self.tokens_sent,
+                    "tokens_saved": saved, "saved_fraction": saved / self.tokens_unbounded if self.tokens_unbounded else 0.0}
+
+    def report(self) -> str:
+        s = self.savings()
+        return (f"scratchpad sent {s['tokens_sent']} of {s['tokens_unbounded']} tokens over {s['llm_steps']} "
+                f"LLM steps (saved {s['tokens_saved']}, {s['saved_fraction']:.0%})")
+
+
+# Savings of the current run (see scratchpad_run)
+_run: ContextVar[Optional[ScratchpadSavings]] = ContextVar("scratchpad_run", default=None)
+
+
+def current_savings() -> Optional[ScratchpadSavings]:
+    return _run.get()
+
+
+@contextmanager
+def scratchpad_run():
+    """Counts the scratchpad savings of a run in the current context; nested calls reuse the outer run."""
+    if _run.get() is not None:
+        yield _run.get()
+        return
+    token = _run.set(ScratchpadSavings())
+    try:
+        yield _run.get()
+    finally:
+        _run.reset(token)
+
+
+class ScratchpadTrimmer(ScratchpadSavings):
+    """
+    AgentExecutor trim_intermediate_steps callable that keeps the agent scratchpad within a token budget.
+
+    Before every LLM step the newest tool result is kept in full; older results are replaced by
+    compact citations, oldest first, until the scratchpad fits the budget. If it still does not fit,
+    the newest result is truncated. Steps are never dropped, so the agent still sees every tool call
+    it made and does not repeat it. Token counts with and without trimming are accumulated over the
+    trimmer's lifetime and, inside scratchpad_run, for the current run.
+    """
+
+    def __init__(self, budget_tokens: int):
+        super().__init__()
+        self.budget_tokens = budget_tokens
+
+    def __call__(self, intermediate_steps: List[Tuple]) -> List[Tuple]:
+        kept = list(intermediate_steps)
+        sizes = [_step_tokens(step) for step in kept]
+        unbounded = sum(sizes)
+
+        index = 0
+        while sum(sizes) > self.budget_tokens and index < len(kept) - 1:
+            action, observation = kept[index]
+            kept[index] = (action, compact_observation(str(observation)))
+            sizes[index] = _step_tokens(kept[index])
+            index += 1
+        if kept and sum(sizes) > self.budget_tokens:
+            action, observation = kept[-1]
+            room = max(self.budget_tokens - sum(sizes[:-1]) - estimate_tokens(str(action.tool_input)), 0) * 4
+            kept[-1] = (action, str(observation)[:max(room, CITATION_MAX_CHARS)] + " [truncated]")
+            sizes[-1] = _step_tokens(kept[-1])
+
+        self.record(unbounded, sum(sizes))
+        if _run.get() is not None:
+            _run.get().record(unbounded, sum(sizes))
+        return kept
@@ -0,0 +1,355 @@
+'''Runs the pipeline as a long-running local HTTP service with warm agents
+
+    python service.py --port 8080 --workers 4
+
+The agents, executors, clients and graphs are built once at startup, so a report does not pay
+for imports and agent construction. Jobs are submitted and followed over HTTP (needs aiohttp):
+
+    POST /jobs                  {"query": "...", "id": "..."} (id optional) -> 202 with the job id
+    GET  /jobs                  all jobs with their status
+    GET  /jobs/{id}             status, per-node progress events, stages and report paths
+    GET  /jobs/{id}/events      progress as server-sent events until the job finishes (node starts and
+                                ends, tool calls, and the typed events of events.py with partial results)
+    GET  /jobs/{id}/report      the PDF (?format=html or md for the other REPORT_FORMATS)
+    GET  /health                workers, running and queued jobs, warm-up time
+
+At most --workers reports are in progress at once and at most --max-queued wait for a worker;
+further submissions get 429 with a Retry-After header. A failed job submitted again with the
+same id resumes from its checkpoint.
+'''
+
+import os
+import re
+import time
+import uuid
+import json
+import asyncio
+import argparse
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field, asdict
+from typing import Any, Dict, List, Optional
+from uuid import UUID
+
+from aiohttp import web
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.tracers.context import register_configure_hook
+
+import renderer
+import Checker_Agent
+import Researcher_Agent
+from cache import get_llm_cache, get_tool_cache
+from llm_router import get_cached_llm
+from source_store import get_source_store
+from events import PipelineEvent, RunFinished
+from main import Pipeline
+
+SERVICE_HOST = os.getenv("SERVICE_HOST", "127.0.0.1")
+SERVICE_PORT = int(os.getenv("SERVICE_PORT", "8080"))
+# Reports in progress at once, and jobs that may wait for a worker before submissions are refused
+SERVICE_WORKERS = int(os.getenv("SERVICE_WORKERS", "4"))
+SERVICE_MAX_QUEUED = int(os.getenv("SERVICE_MAX_QUEUED", "16"))
+# Finished jobs kept in memory for status queries (the oldest are forgotten first)
+SERVICE_KEEP_JOBS = int(os.getenv("SERVICE_KEEP_JOBS", "500"))
+
+PIPELINE_NODES = ("planner", "research_and_check", "report")
+
+
+def event_name(event: PipelineEvent) -> str:
+    """plan_ready for PlanReady, section_checked for SectionChecked, ..."""
+    return re.sub(r"(?<!^)(?=[A-Z])", "_", type(event).__name__).lower()
+
+
+@dataclass
+class ServiceJob:
+    id: str
+    query: str
+    status: str = "queued"  # queued, running, ok or failed
+    submitted_at: float = field(default_factory=time.time)
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+    events: List[Dict[str, Any]] = field(default_factory=list)
+    stages: List[dict] = field(default_factory=list)
+    output_paths: Dict[str, str] = field(default_factory=dict)
+    final_response: Optional[str] = None
+    error: Optional[str] = None
+
+    @property
+    def finished(self) -> bool:
+        return self.status in ("ok", "failed")
+
+    def summary(self) -> dict:
+        return {"id": self.id, "query": self.query, "status": self.status, "submitted_at": self.submitted_at,
+                "started_at": self.started_at, "finished_at": self.finished_at, "error": self.error}
+
+
+class ProgressHandler(BaseCallbackHandler):
+    """Reports the start and end of every pipeline node and every tool call made inside them."""
+
+    run_inline = True
+
+    def __init__(self, publish):
+        self.publish = publish
+        self.graph_run: Optional[UUID] = None
+        self.nodes: Dict[UUID, Dict[str, Any]] = {}
+
+    def on_chain_start(self, serialized, inputs, *, run_id, parent_run_id=None, metadata=None, **kwargs):
+        if parent_run_id is None and self.graph_run is None:
+            self.graph_run = run_id
+        node = (metadata or {}).get("langgraph_node")
+        if parent_run_id == self.graph_run and node in PIPELINE_NODES:
+            self.nodes[run_id] = {"node": node, "started": time.time()}
+            self.publish({"event": "node_start", "node": node})
+
+    def on_chain_end(self, outputs, *, run_id, **kwargs):
+        node = self.nodes.pop(run_id, None)
+        if node is not None:
+            self.publish({"event": "node_end", "node": node["node"], "seconds": round(time.time() - node["started"], 3)})
+
+    def on_chain_error(self, error, *, run_id, **kwargs):
+        node = self.nodes.pop(run_id, None)
+        if node is not None:
+            self.publish({"event": "node_error", "node": node["node"], "error": f"{type(error).__name__}: {error}"})
+
+    def on_tool_start(self, serialized, input_str, *, metadata=None, **kwargs):
+        self.publish({"event": "tool", "name": (serialized or {}).get("name"), "node": (metadata or {}).get("langgraph_node")})
+
+
+# Progress handler of the job running in the current context (see following)
+_progress_handler: ContextVar[Optional[ProgressHandler]] = ContextVar("service_progress_handler", default=None)
+register_configure_hook(_progress_handler, inheritable=True)
+
+
+@contextmanager
+def following(handler: ProgressHandler):
+    token = _progress_handler.set(handler)
+    try:
+        yield handler
+    finally:
+        _progress_handler.reset(token)
+
+
+def warm_up() -> float:
+    """Builds every agent, executor, client, cache and style up front. Returns the seconds it took."""
+    started = time.time()
+    Researcher_Agent.get_planning_agent_executor()
+    Researcher_Agent.get_researcher_executor()
+    for call_site in ("extract_info", "generate_plan", "rewriter", "formatter"):
+        get_cached_llm(call_site)
+    Researcher_Agent.get_dpla_client()
+    Checker_Agent.get_checker_executor()
+    get_tool_cache()
+    get_llm_cache()
+    get_source_store()
+    renderer.get_styles()
+    renderer.get_render_pool()
+    return time.time() - started
+
+
+class ReportService:
+    """
+    Runs pipeline jobs submitted over HTTP on one warm, shared Pipeline.
+
+    Jobs wait for one of workers slots and are refused (429) once max_queued are already waiting.
+    Every job keeps its progress events, which /jobs/{id}/events streams to any number of clients.
+    """
+
+    def __init__(self, pipeline: Optional[Pipeline] = None, workers: int = SERVICE_WORKERS,
+                 max_queued: int = SERVICE_MAX_QUEUED, keep_jobs: int = SERVICE_KEEP_JOBS):
+        self.pipeline = pipeline or Pipeline()
+        self.workers = max(1, workers)
+        self.max_queued = max_queued
+        self.keep_jobs = keep_jobs
+        self.jobs: Dict[str, ServiceJob] = {}
+        self.tasks: Dict[str, asyncio.Task] = {}
+        self.warm_seconds = 0.0
+        self._slots: Optional[asyncio.Semaphore] = None
+        self._listeners: Dict[str, List[asyncio.Queue]] = {}
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    @property
+    def running(self) -> int:
+        return sum(job.status == "running" for job in self.jobs.values())
+
+    @property
+    def queued(self) -> int:
+        return sum(job.status == "queued" for job in self.jobs.values())
+
+    async def start(self, app: Optional[web.Application] = None) -> None:
+        self._loop = asyncio.get_running_loop()
+        self._slots = asyncio.Semaphore(self.workers)
+        self.warm_seconds = await asyncio.to_thread(warm_up)
+        print(f"--- SERVICE WARM IN {self.warm_seconds:.2f}s, {self.workers} WORKERS ---")
+
+    async def stop(self, app: Optional[web.Application] = None) -> None:
+        tasks = list(self.tasks.values())
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    def publish(self, job: ServiceJob, event: dict) -> None:
+        """Records a progress event of job and hands it to the job's listeners (from any thread)."""
+        event = {"ts": time.time(), **event}
+        try:
+            in_loop = asyncio.get_running_loop() is self._loop
+        except RuntimeError:
+            in_loop = False
+        if in_loop or self._loop is None:
+            self._deliver(job, event)
+        else:
+            self._loop.call_soon_threadsafe(self._deliver, job, event)
+
+    def _deliver(self, job: ServiceJob, event: dict) -> None:
+        job.events.append(event)
+        for listener in self._listeners.get(job.id, []):
+            listener.put_nowait(event)
+
+    def submit(self, query: str, job_id: Optional[str] = None) -> ServiceJob:
+        """Queues a job. Raises KeyError if job_id is already queued or running, OverflowError if the queue is full."""
+        existing = self.jobs.get(job_id) if job_id else None
+        if existing is not None and not existing.finished:
+            raise KeyError(job_id)
+        if self.queued >= self.max_queued:
+            raise OverflowError(f"{self.queued} jobs are already waiting for a worker")
+        job = ServiceJob(id=job_id or uuid.uuid4().hex[:12], query=query)
+        self.jobs[job.id] = job
+        self._forget_old_jobs()
+        self.publish(job, {"event": "queued"})
+        self.tasks[job.id] = asyncio.create_task(self.run_job(job))
+        self.tasks[job.id].add_done_callback(lambda _: self.tasks.pop(job.id, None))
+        return job
+
+    def _forget_old_jobs(self) -> None:
+        finished = [job for job in self.jobs.values() if job.finished]
+        for job in sorted(finished, key=lambda j: j.finished_at)[:max(0, len(finished) - self.keep_jobs)]:
+            del self.jobs[job.id]
+
+    async def run_job(self, job: ServiceJob) -> None:
+        async with self._slots:
+            job.status, job.started_at = "running", time.time()
+            self.publish(job, {"event": "started"})
+            try:
+                # The thread id follows the job id, so a failed job submitted again resumes from its checkpoint
+                with following(ProgressHandler(lambda event: self.publish(job, event))):
+                    async for event in self.pipeline.astream(job.query, thread_id=f"service-{job.id}",
+                                                             report_filename=f"{job.id}.pdf"):
+                        if isinstance(event, RunFinished):
+                            result = event.result
+                        else:
+                            # Typed pipeline events (plan ready, question researched, section checked, PDF page written, ...)
+                            self.publish(job, {"event": event_name(event), **asdict(event)})
+                job.stages = [asdict(stage) for stage in result.stages]
+                job.output_paths = result.output_paths or ({"pdf": result.pdf_path} if result.pdf_path else {})
+                job.final_response = result.final_response
+                job.status = "ok"
+            except asyncio.CancelledError:
+                job.status, job.error = "failed", "cancelled"
+                raise
+            except Exception as e:
+                job.status, job.error = "failed", f"{type(e).__name__}: {e}"
+            finally:
+                job.finished_at = time.time()
+                self.publish(job, {"event": "done" if job.status == "ok" else "failed", "error": job.error,
+                                   "seconds": round(job.finished_at - job.started_at, 3)})
+
+    async def events(self, job: ServiceJob):
+        """Yields the events of job recorded so far, then the new ones until the job has finished."""
+        # Events are delivered on the event loop, so none can slip between the snapshot and the listener
+        listener: asyncio.Queue = asyncio.Queue()
+        self._listeners.setdefault(job.id, []).append(listener)
+        try:
+            for event in list(job.events):
+                yield event
+            while not job.finished or not listener.empty():
+                event = await listener.get()
+                yield event
+                if event["event"] in ("done", "failed"):
+                    break
+        finally:
+            self._listeners[job.id].remove(listener)
+            if not self._listeners[job.id]:
+                del self._listeners[job.id]
+
+    # ----------------- HTTP handlers -----------------
+
+    def _job(self, request: web.Request) -> ServiceJob:
+        job = self.jobs.get(request.match_info["job_id"])
+        if job is None:
+            raise web.HTTPNotFound(text=json.dumps({"error": "unknown job"}), content_type="application/json")
+        return job
+
+    async def handle_submit(self, request: web.Request) -> web.Response:
+        try:
+            body = await request.json()
+        except json.JSONDecodeError:
+            body = None
+        if isinstance(body, str):
+            body = {"query": body}
+        query = body.get("query") if isinstance(body, dict) else None
+        query = query.strip() if isinstance(query, str) else ""
+        if not query:
+            return web.json_response({"error": 'expected {"query": "..."}'}, status=400)
+        try:
+            job = self.submit(query, str(body["id"]) if body.get("id") else None)
+        except KeyError:
+            return web.json_response({"error": "a job with this id is already queued or running"}, status=409)
+        except OverflowError as e:
+            # Backpressure: ask the client to come back once a worker may be free
+            return web.json_response({"error": str(e)}, status=429, headers={"Retry-After": "30"})
+        return web.json_response({**job.summary(), "links": {"status": f"/jobs/{job.id}", "events": f"/jobs/{job.id}/events",
+                                                             "report": f"/jobs/{job.id}/report"}}, status=202)
+
+    async def handle_list(self, request: web.Request) -> web.Response:
+        return web.json_response([job.summary() for job in self.jobs.values()])
+
+    async def handle_status(self, request: web.Request) -> web.Response:
+        job = self._job(request)
+        return web.json_response({**job.summary(), "events": job.events, "stages": job.stages,
+                                  "output_paths": job.output_paths, "final_response": job.final_response})
+
+    async def handle_events(self, request: web.Request) -> web.StreamResponse:
+        job = self._job(request)
+        response = web.StreamResponse(headers={"Content-Type": "text/event-stream", "Cache-Control": "no-cache"})
+        await response.prepare(request)
+        async for event in self.events(job):
+            await response.write(f"event: {event['event']}\ndata: {json.dumps(event)}\n\n".encode())
+        await response.write_eof()
+        return response
+
+    async def handle_report(self, request: web.Request) -> web.StreamResponse:
+        job = self._job(request)
+        if not job.finished:
+            return web.json_response({"error": f"job is {job.status}"}, status=409)
+        path = job.output_paths.get(request.query.get("format", "pdf"))
+        if job.status != "ok" or not path or not os.path.exists(path):
+            return web.json_response({"error": "no report in this format", "formats": sorted(job.output_paths)}, status=404)
+        return web.FileResponse(path)
+
+    async def handle_health(self, request: web.Request) -> web.Response:
+        return web.json_response({"workers": self.workers, "running": self.running, "queued": self.queued,
+                                  "max_queued": self.max_queued, "warm_seconds": self.warm_seconds})
+
+    def app(self) -> web.Application:
+        app = web.Application()
+        app.router.add_post("/jobs", self.handle_submit)
+        app.router.add_get("/jobs", self.handle_list)
+        app.router.add_get("/jobs/{job_id}", self.handle_status)
+        app.router.add_get("/jobs/{job_id}/events", self.handle_events)
+        app.router.add_get("/jobs/{job_id}/report", self.handle_report)
+        app.router.add_get("/health", self.handle_health)
+        app.on_startup.append(self.start)
+        app.on_cleanup.append(self.stop)
+        return app
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default=SERVICE_HOST)
+    parser.add_argument("--port", type=int, default=SERVICE_PORT)
+    parser.add_argument("--workers", type=int, default=SERVICE_WORKERS, help="Reports in progress at once")
+    parser.add_argument("--max-queued", type=int, default=SERVICE_MAX_QUEUED,
+                        help="Jobs that may wait for a worker; further submissions get 429")
+    args = parser.parse_args()
+
+    service = ReportService(workers=args.workers, max_queued=args.max_queued)
+    web.run_app(service.app(), host=args.host, port=args.port)
@@ -0,0 +1,170 @@
+# ----------------- Source Store -----------------
+import functools
+import hashlib
+import os
+import re
+import sqlite3
+import threading
+import time
+from typing import Callable, Dict, List, Optional
+
+import cache
+
+# A question is answered from the local store when at least SOURCE_STORE_MIN_PASSAGES passages match
+# and together they contain SOURCE_STORE_MIN_COVERAGE of the question's content words. Questions with
+# fewer than SOURCE_STORE_MIN_WORDS content words are too vague to trust local recall
+SOURCE_STORE_ENABLED = os.getenv("SOURCE_STORE_ENABLED", "1") != "0"
+SOURCE_STORE_MIN_PASSAGES = int(os.getenv("SOURCE_STORE_MIN_PASSAGES", "3"))
+SOURCE_STORE_MIN_COVERAGE = float(os.getenv("SOURCE_STORE_MIN_COVERAGE", "0.7"))
+SOURCE_STORE_MIN_WORDS = int(os.getenv("SOURCE_STORE_MIN_WORDS", "4"))
+
+# Passages longer than this are split on sentence boundaries
+PASSAGE_MAX_CHARS = 1200
+
+# "No result" answers of the search tools (Wikipedia, SerpAPI, DPLA); they are not indexed as passages
+NO_RESULT = re.compile(r"^\s*(?:No good (?:Wikipedia )?Search Result was found|No good search result found"
+                       r"|No primary sources found\b.*)\s*$", re.I | re.S)
+
+STOPWORDS = set("""
+a an and are as at be been by did do does for from had has have how in into is it its of on or that the their
+them there these they this to was were what when where which who whom why will with about during after before
+between research question questions find related
+""".split())
+
+
+def content_words(text: str) -> List[str]:
+    """Lower-cased words of a text without stopwords and very short words."""
+    return [w for w in re.findall(r"[a-z0-9]+", text.lower()) if len(w) > 2 and w not in STOPWORDS]
+
+
+def split_passages(tool_name: str, text: str) -> List[str]:
+    """Splits a tool result into passages: one per DPLA record, otherwise one per paragraph."""
+    if tool_name.startswith("dpla"):
+        parts = text.split("\n---")
+    else:
+        parts = re.split(r"\n\s*\n|(?=\nPage: )", text)
+    passages = []
+    for part in (p.strip() for p in parts):
+        while len(part) > PASSAGE_MAX_CHARS:
+            cut = part.rfind(". ", 0, PASSAGE_MAX_CHARS)
+            cut = cut + 1 if cut > PASSAGE_MAX_CHARS // 2 else PASSAGE_MAX_CHARS
+            passages.append(part[:cut].strip())
+            part = part[cut:].strip()
+        if len(part) > 20:
+            passages.append(part)
+    return passages
+
+
+class SourceStore:
+    """
+    Local full-text index (SQLite FTS5) of every passage retrieved by the search tools.
+
+    Each passage keeps its provenance: the tool, the query that retrieved it, the source link
+    (when known) and the retrieval time. Identical passages are stored once.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE VIRTUAL TABLE IF NOT EXISTS passages USING fts5("
+            "text, tool UNINDEXED, query UNINDEXED, source UNINDEXED, retrieved_at UNINDEXED, digest UNINDEXED)"
+        )
+        self._conn.execute("CREATE TABLE IF NOT EXISTS digests (digest TEXT PRIMARY KEY)")
+        self._conn.commit()
+
+    def ingest(self, tool_name: str, query: str, text: str, source: str = "") -> int:
+        """Indexes a tool result and returns the number of new passages. "No result" answers are skipped."""
+        if is_no_result(text):
+            return 0
+        added = 0
+        now = time.time()
+        with self._lock:
+            for passage in split_passages(tool_name, text):
+                digest = hashlib.sha256(passage.encode("utf-8")).hexdigest()
+                if self._conn.execute("INSERT OR IGNORE INTO digests (digest) VALUES (?)", (digest,)).rowcount:
+                    link = source or _first_link(passage)
+                    self._conn.execute(
+                        "INSERT INTO passages (text, tool, query, source, retrieved_at, digest) VALUES (?, ?, ?, ?, ?, ?)",
+                        (passage, tool_name, query, link, now, digest))
+                    added += 1
+            self._conn.commit()
+        return added
+
+    def search(self, question: str, k: int = 8) -> List[Dict[str, str]]:
+        """Returns the k best matching passages (BM25) with their provenance."""
+        words = list(dict.fromkeys(content_words(question)))
+        if not words:
+            return []
+        match = " OR ".join(f'"{w}"' for w in words)
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT text, tool, query, source, bm25(passages) AS score FROM passages "
+                "WHERE passages MATCH ? ORDER BY score LIMIT ?", (match, k)).fetchall()
+        return [{"text": r[0], "tool": r[1], "query": r[2], "source": r[3], "score": r[4]} for r in rows]
+
+    def count(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM digests").fetchone()[0]
+
+
+def _first_link(text: str) -> str:
+    match = re.search(r"https?://\S+", text)
+    return match.group(0).rstrip(").,") if match else ""
+
+
+def recall_is_good(question: str, passages: List[Dict[str, str]], min_passages: int = None,
+                   min_coverage: float = None, min_words: int = None) -> bool:
+    """
+    True if the question has enough content words to be specific, and the passages are numerous
+    enough and cover enough of those words.
+    """
+    min_passages = SOURCE_STORE_MIN_PASSAGES if min_passages is None else min_passages
+    min_coverage = SOURCE_STORE_MIN_COVERAGE if min_coverage is None else min_coverage
+    min_words = SOURCE_STORE_MIN_WORDS if min_words is None else min_words
+    words = set(content_words(question))
+    if len(passages) < min_passages or not words or len(words) < min_words:
+        return False
+    found = set(content_words(" ".join(p["text"] for p in passages)))
+    return len(words & found) / len(words) >= min_coverage
+
+
+_store: Optional[SourceStore] = None
+_store_lock = threading.Lock()
+
+
+def get_source_store() -> Optional[SourceStore]:
+    """Returns the shared source store, or None if it is disabled or SQLite lacks FTS5."""
+    global _store
+    if not SOURCE_STORE_ENABLED:
+        return None
+    with _store_lock:
+        if _store is None:
+            try:
+                _store = SourceStore(os.path.join(cache.CACHE_DIR, "sources.sqlite"))
+            except sqlite3.OperationalError:
+                # SQLite was built without FTS5: run without the local store
+                return None
+        return _store
+
+
+def is_no_result(text: str) -> bool:
+    """True for an empty tool result or a "no result" placeholder."""
+    return not text.strip() or bool(NO_RESULT.match(text))
+
+
+def ingesting(tool_name: str, func: Callable[[str], str]) -> Callable[[str], str]:
+    """Wraps a single-query tool function so every result it returns is indexed in the source store."""
+    @functools.wraps(func)
+    def wrapper(query: str) -> str:
+        result = func(query)
+        store = get_source_store()
+        if store is not None and isinstance(result, str):
+            store.ingest(tool_name, query, result)
+        return result
+
+    return wrapper
@@ -0,0 +1,22 @@
+import os
+import sys
+
+import pytest
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_DIR)
+sys.path.insert(0, os.path.join(REPO_DIR, "benchmarks"))
+
+for key in ("GROQ_API_KEY", "SERP_API_KEY", "DPLA_API_KEY"):
+    os.environ.setdefault(key, "offline-test")
+
+
+@pytest.fixture
+def offline():
+    """Runs the agents against the scripted fake LLM and fake search tools (see benchmarks/offline.py)."""
+    from fakes import FakeChatModel, fake_search_tools
+    from offline import offline_agents
+
+    llm = FakeChatModel(latency=0.0)
+    with offline_agents(llm, fake_search_tools(0.0)) as workdir:
+        yield llm, workdir
@@ -0,0 +1,15 @@
+import json
+
+from batch import read_jobs
+
+
+def test_repeated_queries_get_their_own_job_ids(tmp_path):
+    path = tmp_path / "queries.jsonl"
+    lines = ["Letters of 1776", {"query": "Letters of 1776"}, {"query": "Other", "id": "x"}, "Letters of 1776"]
+    path.write_text("\n".join(json.dumps(line) for line in lines) + "\n")
+    jobs = read_jobs(str(path))
+    assert len({job.id for job in jobs}) == 4
+    assert jobs[2].id == "x"
+    # Ids are stable, so a restarted batch skips and resumes the same jobs
+    assert [job.id for job in read_jobs(str(path))] == [job.id for job in jobs]
+    assert jobs[1].id == f"{jobs[0].id}-2"
@@ -0,0 +1,44 @@
+import threading
+
+from langchain_core.messages import AIMessage
+
+from cache import CachedChatModel, DiskCache
+
+
+class CountingModel:
+    model_name = "counting"
+
+    def __init__(self):
+        self.calls = 0
+
+    def invoke(self, prompt, **kwargs):
+        self.calls += 1
+        return AIMessage(content=f"answer to {prompt}")
+
+
+def test_responses_are_cached(tmp_path):
+    llm = CountingModel()
+    model = CachedChatModel(llm, DiskCache(str(tmp_path / "llm.sqlite"), 3600, 10**7))
+    assert model.invoke("q").content == "answer to q"
+    assert model.invoke("q").response_metadata.get("cache_hit")
+    assert llm.calls == 1
+
+
+def test_call_finishing_between_lookups_is_not_repeated(tmp_path):
+    # The first cache lookup misses; the owner finishes (caches and leaves the in-flight map) before
+    # the second lookup, which must then see the cached response instead of calling the model again
+    cache = DiskCache(str(tmp_path / "llm.sqlite"), 3600, 10**7)
+    llm = CountingModel()
+    model = CachedChatModel(llm, cache)
+    real_get, misses = cache.get, threading.local()
+
+    def get_after_owner(namespace, prompt):
+        if not getattr(misses, "done", False):
+            misses.done = True
+            CachedChatModel(llm, cache).invoke(prompt)
+            return None
+        return real_get(namespace, prompt)
+
+    cache.get = get_after_owner
+    assert model.invoke("q").content == "answer to q"
+    assert llm.calls == 1
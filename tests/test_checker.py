@@ -0,0 +1,32 @@
+import json
+
+from Checker_Agent import CheckerAgent, confine_to_body, split_chunks
+from instrumentation import track_calls
+
+
+def test_evaluate_many_calls_are_tracked_for_the_caller(offline):
+    pairs = [("q", f"Section {i}: the delegates met in Philadelphia in 1776 and debated.") for i in range(4)]
+    with track_calls() as calls:
+        results = CheckerAgent().evaluate_many(pairs, max_concurrency=4)
+    assert len(results) == 4
+    llm_calls = sum(row["calls"] for name, row in calls.summary()["calls"].items() if name.startswith("llm:"))
+    assert llm_calls >= len(pairs)
+
+
+def test_chunks_keep_the_whole_text():
+    text = "\n\n".join(f"Paragraph {i}. " + "word " * 200 for i in range(12))
+    chunks = split_chunks(text)
+    assert len(chunks) > 1
+    assert "".join(body for _, body in chunks) == text
+
+
+def test_findings_about_the_context_are_dropped():
+    context = "The assembly met in Philadelphia in 1776. Delegates debated."
+    body = "John Adams wrote letters to Abigail in 1777."
+    check = json.dumps({"suggested_fixes": ["Replace 'met in Philadelphia in 1776' with a sourced date",
+                                            "Cite the Adams letters"],
+                        "evidence_snippets": [{"text": "The assembly met in Philadelphia in 1776.", "why": "x"},
+                                              {"text": "letters to Abigail in 1777", "why": "y"}]})
+    confined = json.loads(confine_to_body(check, context, body))
+    assert confined["suggested_fixes"] == ["Cite the Adams letters"]
+    assert [e["text"] for e in confined["evidence_snippets"]] == ["letters to Abigail in 1777"]
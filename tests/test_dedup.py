@@ -0,0 +1,39 @@
+from dedup import dedup_run, dedup_scope, jaccard, query_words, search_tool
+
+
+def counting_tool(results):
+    calls = []
+
+    def search(query: str) -> str:
+        calls.append(query)
+        return results(query)
+
+    return calls, search
+
+
+def test_query_words_ignore_order_and_plurals():
+    assert jaccard(query_words("letters of the delegates 1776"), query_words("1776 delegate letter")) == 1.0
+
+
+def test_near_identical_queries_reuse_the_earlier_result(offline):
+    calls, search = counting_tool(lambda query: f"Page: {query}\nSummary: delegates signed the declaration.")
+    tool = search_tool("wikipedia", search)
+    with dedup_run():
+        with dedup_scope():
+            first = tool("Declaration of Independence signers")
+        with dedup_scope():
+            second = tool("signers Declaration Independence")
+    assert calls == ["Declaration of Independence signers"]
+    assert second == first
+
+
+def test_repeated_passages_are_shown_once_per_scope(offline):
+    passage = "Page: Letters\nSummary: " + " ".join(f"word{i}" for i in range(60))
+    calls, search = counting_tool(lambda query: passage)
+    tool = search_tool("wikipedia", search)
+    with dedup_run() as run, dedup_scope():
+        assert tool("first query about letters") == passage
+        assert "omitted" in tool("completely different subject matter")
+    assert run.passages_dropped == 1
+    # Outside a run the tool is not deduplicated
+    assert tool("completely different subject matter") == passage
@@ -0,0 +1,55 @@
+import os
+import threading
+from unittest import mock
+
+import pytest
+
+import main
+import report_agent
+from events import PlanReady, QuestionResearched, ReportReady, RunFinished, SectionChecked
+
+QUERY = "Find letters related to the signing of the US Declaration of Independence."
+
+
+def test_stream_yields_progress_then_the_result(offline):
+    events = list(main.Pipeline(checkpoint=False).stream(QUERY))
+    assert isinstance(events[0], PlanReady)
+    assert isinstance(events[-1], RunFinished)
+    questions = len(events[0].research_questions)
+    assert questions > 0
+    assert sum(isinstance(e, QuestionResearched) for e in events) == questions
+    assert sum(isinstance(e, SectionChecked) for e in events) == questions
+    assert sum(isinstance(e, ReportReady) for e in events) == 1
+
+    result = events[-1].result
+    assert [stage.stage for stage in result.stages] == ["plan", "research", "check", "report"]
+    assert os.path.exists(result.pdf_path)
+    assert len(result.check_results) == questions
+
+
+def test_closing_the_stream_early_stops_the_run(offline):
+    stream = main.Pipeline(checkpoint=False).stream(QUERY)
+    assert isinstance(next(stream), PlanReady)
+    stream.close()
+    assert not any(thread.name == "event-stream" for thread in threading.enumerate())
+
+
+def test_failed_run_resumes_from_its_checkpoint(offline):
+    pipeline = main.Pipeline()
+    with mock.patch.object(report_agent, "formatted_pdf", side_effect=RuntimeError("pdf failed")):
+        with pytest.raises(RuntimeError):
+            pipeline.run(QUERY, thread_id="resume")
+    with mock.patch.object(main.Researcher_Agent, "planning_node", side_effect=AssertionError("planned again")), \
+         mock.patch.object(main.Researcher_Agent, "aresearch_question", side_effect=AssertionError("researched again")):
+        result = pipeline.run(thread_id="resume")
+    assert os.path.exists(result.pdf_path)
+    assert [stage.stage for stage in result.stages] == ["plan", "research", "check", "report"]
+
+
+def test_regenerated_report_reports_only_its_own_stage(offline):
+    pipeline = main.Pipeline()
+    pipeline.run(QUERY, thread_id="regenerate")
+    for _ in range(2):
+        result = pipeline.regenerate_report("regenerate")
+        assert [stage.stage for stage in result.stages] == ["report"]
+        assert result.stages[0].started_at < 5
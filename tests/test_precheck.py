@@ -0,0 +1,18 @@
+from precheck import CITATION, is_decisive, precheck
+
+
+def test_future_years_are_decisive():
+    result = precheck("The treaty was signed in 2090.", current_year=2026)
+    assert result["verdict"] == "unreliable" and is_decisive(result)
+
+
+def test_only_author_comma_year_is_a_citation():
+    assert CITATION.search("(Charlotte Observer, 1890)")
+    assert CITATION.search("[Smith et al., 1890]")
+    assert not CITATION.search("James Madison (born 1751) wrote letters.")
+
+
+def test_anachronisms_narrow_the_llm_check_without_replacing_it():
+    result = precheck("By 1720 the cemetery held Revolutionary War veterans.", current_year=2026)
+    assert [r["severity"] for r in result["reasons"] if r["type"] == "anachronism"] == ["medium"]
+    assert not is_decisive(result)
@@ -0,0 +1,19 @@
+import renderer
+from report_agent import local_report
+
+
+def test_local_report_has_one_title(tmp_path):
+    text = local_report("## Who signed it?\n\nThe delegates signed it in 1776.", ['{"verdict": "reliable"}'],
+                        title="Letters of 1776")
+    paths = renderer.render(text, "report.pdf", str(tmp_path), ["md", "html"])
+    markdown = open(paths["md"]).read()
+    assert markdown.count("\n# ") + markdown.startswith("# ") == 1
+    assert markdown.startswith("# Letters of 1776")
+    assert renderer.DEFAULT_TITLE not in markdown
+    html = open(paths["html"]).read()
+    assert html.count("<h1>") == 1 and "<h1>Letters of 1776</h1>" in html
+
+
+def test_untitled_text_gets_the_default_title(tmp_path):
+    path = renderer.render_markdown("## Section\n\nText.", str(tmp_path / "r.md"))
+    assert open(path).read().startswith(f"# {renderer.DEFAULT_TITLE}\n")
@@ -0,0 +1,66 @@
+from Researcher_Agent import format_research_section, parse_research_questions
+
+TEMPLATE_PLAN = """Topic: Declaration of Independence | Time Period: 1776 | Location: Philadelphia | Group of People involved: Delegates
+
+Research Questions:
+  Who drafted the Declaration of Independence?
+  The role of the Committee of Five in the drafting
+  How was the Declaration received in the colonies?
+  Letters exchanged between delegates during the debate
+  What happened to the original signed copy?
+
+Suggested Keywords:
+  Declaration of Independence
+  Continental Congress
+"""
+
+NUMBERED_PLAN = """**Research Questions:**
+1. **Who drafted the Declaration of Independence?**
+   - Focus on Thomas Jefferson
+   - The Committee of Five
+2. The role of the Continental Congress
+3) How was the Declaration received?
+
+**Suggested Keywords:**
+- Jefferson
+"""
+
+
+def test_unmarked_template_layout_keeps_every_question():
+    assert parse_research_questions(TEMPLATE_PLAN) == [
+        "Who drafted the Declaration of Independence?",
+        "The role of the Committee of Five in the drafting",
+        "How was the Declaration received in the colonies?",
+        "Letters exchanged between delegates during the debate",
+        "What happened to the original signed copy?",
+    ]
+
+
+def test_numbered_layout_skips_sub_points_and_emphasis():
+    assert parse_research_questions(NUMBERED_PLAN) == [
+        "Who drafted the Declaration of Independence?",
+        "The role of the Continental Congress",
+        "How was the Declaration received?",
+    ]
+
+
+def test_bulleted_layout():
+    plan = "Research Questions:\n- First question?\n  * detail\n- Second question\n\nSuggested Keywords:\n- a\n"
+    assert parse_research_questions(plan) == ["First question?", "Second question"]
+
+
+def test_fallback_to_question_lines():
+    assert parse_research_questions("Some intro.\n1. Why did it happen?\nNot a question.") == ["Why did it happen?"]
+
+
+def test_research_section_has_one_heading():
+    section = format_research_section("Who drafted it?", "## Who drafted it?\n\nThomas Jefferson drafted it.")
+    assert section == "## Who drafted it?\n\nThomas Jefferson drafted it."
+    assert format_research_section("Q", "Plain answer.") == "## Q\n\nPlain answer."
+
+
+def test_standalone_app_runs_without_a_thread_id(offline):
+    from Researcher_Agent import get_app
+
+    state = get_app().invoke({"query": "Find letters about the signing of the Declaration of Independence."})
+    assert state["research_findings"].startswith("## ")
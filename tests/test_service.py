@@ -0,0 +1,27 @@
+import asyncio
+
+import pytest
+
+web = pytest.importorskip("aiohttp.web")
+from aiohttp.test_utils import TestClient, TestServer
+
+from service import ReportService
+
+
+def post_jobs(data: str):
+    """POSTs data to /jobs of a service that is not warmed up, and returns (status, JSON body)."""
+    async def post():
+        app = ReportService(pipeline=object()).app()
+        app.on_startup.clear()
+        async with TestClient(TestServer(app)) as client:
+            response = await client.post("/jobs", data=data, headers={"Content-Type": "application/json"})
+            return response.status, await response.json()
+
+    return asyncio.run(post())
+
+
+@pytest.mark.parametrize("data", ['{"query": 5}', '{"query": ["a"]}', '{"query": "   "}', '{}', '[]', '7', 'not json'])
+def test_submit_rejects_invalid_queries(data):
+    status, body = post_jobs(data)
+    assert status == 400
+    assert "query" in body["error"]
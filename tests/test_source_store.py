@@ -0,0 +1,26 @@
+from source_store import SourceStore, recall_is_good
+
+
+def test_no_result_answers_are_not_indexed(tmp_path):
+    store = SourceStore(str(tmp_path / "sources.sqlite"))
+    assert store.ingest("wikipedia", "q", "No good Wikipedia Search Result was found") == 0
+    assert store.ingest("google_search", "q", "No good search result found") == 0
+    assert store.ingest("dpla_search", "q", "No primary sources found in the DPLA for that query.") == 0
+    assert store.ingest("wikipedia", "q", "   ") == 0
+    assert store.count() == 0
+
+
+def test_passages_are_indexed_once_and_searchable(tmp_path):
+    store = SourceStore(str(tmp_path / "sources.sqlite"))
+    text = "Page: Declaration of Independence\nSummary: The delegates signed the declaration in Philadelphia in 1776."
+    assert store.ingest("wikipedia", "declaration", text) == 1
+    assert store.ingest("wikipedia", "declaration again", text) == 0
+    passages = store.search("Who signed the declaration in Philadelphia?")
+    assert len(passages) == 1 and passages[0]["tool"] == "wikipedia"
+
+
+def test_recall_needs_specific_questions():
+    passages = [{"text": "delegates signed the declaration in philadelphia letters"}] * 3
+    assert recall_is_good("Which delegates signed the declaration in Philadelphia?", passages)
+    assert not recall_is_good("Which delegates signed?", passages)
+    assert not recall_is_good("Which delegates signed the declaration in Philadelphia?", passages[:1])